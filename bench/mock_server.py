@@ -0,0 +1,232 @@
+"""
+本地的OpenAI兼容模拟服务，离线压测用
+支持 /chat/completions 的JSON模式、tool_calls和SSE流式输出；首包延迟、输出速率和回复内容均可配置。
+
+单独运行：
+    python -m bench.mock_server --rules rules.json --port 8000 --latency 0.3 --tps 40
+rules.json为规则列表，按顺序匹配第一条：
+    [{"match": "安全检察员", "field": "system", "response": {"json": {"safety": "Safe"}}},
+     {"match": ".*", "response": "默认回复"}]
+response可以是字符串、{"json": 对象} 或 {"tool_calls": [{"name": 工具名, "arguments": 参数对象}]}
+"""
+import argparse
+import json
+import math
+import random
+import re
+import threading
+import time
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Callable, List
+
+
+def _text(message) -> str:
+    content = message.get("content") if isinstance(message, dict) else None
+    return content if isinstance(content, str) else ""
+
+
+class RuleResponder:
+    """按正则规则给出回复，field为匹配的字段：system、user（最后一条消息）或any"""
+    def __init__(self, rules: List[dict], default="OK"):
+        self.rules = [(re.compile(rule["match"], re.S), rule.get("field", "any"), rule["response"]) for rule in rules]
+        self.default = default
+
+    @classmethod
+    def from_file(cls, path):
+        with open(path, "r", encoding="utf-8") as f:
+            return cls(json.load(f))
+
+    def __call__(self, request: dict):
+        messages = request.get("messages", [])
+        fields = {
+            "system": _text(messages[0]) if messages else "",
+            "user": _text(messages[-1]) if messages else "",
+        }
+        fields["any"] = "\n".join(_text(m) for m in messages)
+        for pattern, field, response in self.rules:
+            if pattern.search(fields[field]):
+                return response
+        return self.default
+
+
+class MockLLMServer:
+    """
+    OpenAI chat-completions协议的模拟服务
+    latency: 首包前的固定延迟(秒)；tokens_per_second: 输出速率，非流式请求按总token数计算等待时间；
+    chunk_chars: 每个流式片段（也按一个token计）的字符数；
+    error_rate: 按此比例随机返回429（带Retry-After），用于测试重试和熔断
+    """
+    def __init__(self, responder: Callable[[dict], object], host="127.0.0.1", port=0,
+                 latency=0.2, tokens_per_second=50.0, chunk_chars=4, error_rate=0.0):
+        self.responder = responder
+        self.latency = latency
+        self.error_rate = error_rate
+        self.errors = 0
+        self.tokens_per_second = tokens_per_second
+        self.chunk_chars = chunk_chars
+        self.requests = 0
+        self._lock = threading.Lock()
+        self._server = ThreadingHTTPServer((host, port), self._handler())
+        self._server.daemon_threads = True
+        self._thread = None
+
+    @property
+    def base_url(self):
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def start(self):
+        self._thread = threading.Thread(target=self._server.serve_forever, name="mock-llm", daemon=True)
+        self._thread.start()
+        return self.base_url
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+    def _tokens(self, text: str) -> int:
+        return max(1, math.ceil(len(text) / self.chunk_chars))
+
+    def _reply(self, request: dict):
+        """把responder的结果整理为(content, tool_calls)"""
+        out = self.responder(request)
+        if isinstance(out, dict) and "tool_calls" in out:
+            calls = [{
+                "id": f"call_{uuid.uuid4().hex[:8]}",
+                "type": "function",
+                "function": {
+                    "name": call["name"],
+                    "arguments": call["arguments"] if isinstance(call["arguments"], str)
+                    else json.dumps(call["arguments"], ensure_ascii=False),
+                },
+            } for call in out["tool_calls"]]
+            return None, calls
+        if isinstance(out, dict) and "json" in out:
+            return json.dumps(out["json"], ensure_ascii=False), None
+        return str(out), None
+
+    def _usage(self, request, content, tool_calls):
+        prompt = sum(self._tokens(json.dumps(m, ensure_ascii=False)) for m in request.get("messages", []))
+        completion = self._tokens(content or json.dumps(tool_calls or "", ensure_ascii=False))
+        return {"prompt_tokens": prompt, "completion_tokens": completion, "total_tokens": prompt + completion}
+
+    def _handler(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def log_message(self, format, *args):
+                pass
+
+            def do_POST(self):
+                if not self.path.rstrip("/").endswith("/chat/completions"):
+                    self.send_error(404)
+                    return
+                request = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))) or b"{}")
+                with server._lock:
+                    server.requests += 1
+                    failed = random.random() < server.error_rate
+                    server.errors += failed
+                if failed:
+                    data = json.dumps({"error": {"message": "rate limited", "type": "rate_limit_error"}}).encode("utf-8")
+                    self.send_response(429)
+                    self.send_header("Content-Type", "application/json")
+                    self.send_header("Retry-After", "0.1")
+                    self.send_header("Content-Length", str(len(data)))
+                    self.end_headers()
+                    self.wfile.write(data)
+                    return
+                time.sleep(server.latency)
+                content, tool_calls = server._reply(request)
+                usage = server._usage(request, content, tool_calls)
+                if request.get("stream"):
+                    try:
+                        self._stream(request, content, tool_calls, usage)
+                    except (BrokenPipeError, ConnectionResetError):
+                        self.close_connection = True  # 客户端提前结束读取
+                else:
+                    time.sleep(usage["completion_tokens"] / server.tokens_per_second)
+                    message = {"role": "assistant", "content": content}
+                    if tool_calls:
+                        message["tool_calls"] = tool_calls
+                    self._send_json({
+                        "id": f"chatcmpl-{uuid.uuid4().hex[:12]}", "object": "chat.completion",
+                        "created": int(time.time()), "model": request.get("model", "mock"),
+                        "choices": [{"index": 0, "message": message,
+                                     "finish_reason": "tool_calls" if tool_calls else "stop"}],
+                        "usage": usage,
+                    })
+
+            def _send_json(self, body):
+                data = json.dumps(body, ensure_ascii=False).encode("utf-8")
+                self.send_response(200)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            def _stream(self, request, content, tool_calls, usage):
+                self.send_response(200)
+                self.send_header("Content-Type", "text/event-stream")
+                self.send_header("Cache-Control", "no-cache")
+                self.send_header("Transfer-Encoding", "chunked")
+                self.end_headers()
+                chunk_id, created = f"chatcmpl-{uuid.uuid4().hex[:12]}", int(time.time())
+                delay = 1 / server.tokens_per_second
+
+                def event(delta=None, finish=None, with_usage=None):
+                    body = {"id": chunk_id, "object": "chat.completion.chunk", "created": created,
+                            "model": request.get("model", "mock"),
+                            "choices": [] if delta is None else [{"index": 0, "delta": delta, "finish_reason": finish}]}
+                    if with_usage:
+                        body["usage"] = with_usage
+                    self._write_chunk(f"data: {json.dumps(body, ensure_ascii=False)}\n\n".encode("utf-8"))
+
+                event({"role": "assistant", "content": ""})
+                step = server.chunk_chars
+                for text in (content[i:i + step] for i in range(0, len(content or ""), step)):
+                    time.sleep(delay)
+                    event({"content": text})
+                for index, call in enumerate(tool_calls or []):
+                    arguments = call["function"]["arguments"]
+                    event({"tool_calls": [{"index": index, "id": call["id"], "type": "function",
+                                           "function": {"name": call["function"]["name"], "arguments": ""}}]})
+                    for i in range(0, len(arguments), step):
+                        time.sleep(delay)
+                        event({"tool_calls": [{"index": index, "function": {"arguments": arguments[i:i + step]}}]})
+                event({}, "tool_calls" if tool_calls else "stop")
+                if (request.get("stream_options") or {}).get("include_usage"):
+                    event(with_usage=usage)
+                self._write_chunk(b"data: [DONE]\n\n")
+                self.wfile.write(b"0\r\n\r\n")
+                self.wfile.flush()
+
+            def _write_chunk(self, data: bytes):
+                self.wfile.write(f"{len(data):x}\r\n".encode("ascii") + data + b"\r\n")
+                self.wfile.flush()
+
+        return Handler
+
+
+def main():
+    parser = argparse.ArgumentParser(description="本地OpenAI兼容模拟服务")
+    parser.add_argument("--rules", help="规则文件(JSON)")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument("--latency", type=float, default=0.2, help="首包延迟(秒)")
+    parser.add_argument("--tps", type=float, default=50.0, help="输出速率(token/秒)")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="随机返回429的比例")
+    args = parser.parse_args()
+    responder = RuleResponder.from_file(args.rules) if args.rules else RuleResponder([])
+    server = MockLLMServer(responder, args.host, args.port, args.latency, args.tps, error_rate=args.error_rate)
+    print(f"模拟服务已启动: {server.base_url}")
+    try:
+        server._server.serve_forever()
+    except KeyboardInterrupt:
+        server.stop()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,284 @@
+"""
+离线基准测试：启动本地模拟服务，逐个运行任务目录中的任务，统计每个任务的LLM调用次数、耗时、步骤延迟和内存峰值
+
+    python -m bench.run --latency 0.3 --tps 40 --repeat 3
+    python -m bench.run --pipeline --planner graph --json result.json
+    python -m bench.run --fused    # 合并调用模式，每步少两次LLM往返
+    python -m bench.run --record trace.jsonl.gz   # 录制后用 --replay trace.jsonl.gz 单独测量编排代码的开销
+"""
+import argparse
+import json
+import os
+import re
+import shutil
+import statistics
+import sys
+import tempfile
+import time
+import tracemalloc
+from collections import defaultdict
+
+from bench.mock_server import MockLLMServer, _text
+
+try:
+    import resource  # 仅POSIX系统可用
+except ImportError:
+    resource = None
+
+CATALOG = os.path.join(os.path.dirname(os.path.abspath(__file__)), "tasks.json")
+_FILLER = "西湖位于杭州市西部，湖光山色相映成趣。"
+
+
+def _expand(task: dict) -> dict:
+    """把repeat_steps模板展开成具体步骤"""
+    if not task.get("repeat_steps"):
+        return task
+    template = task["steps"][0]
+    steps = []
+    for i in range(1, task["repeat_steps"] + 1):
+        step = dict(template, description=template["description"].format(i=i))
+        step["arguments"] = {
+            key: int(value.format(i=i)) if isinstance(value, str) and value.startswith("{") else value
+            for key, value in template.get("arguments", {}).items()
+        }
+        steps.append(step)
+    return dict(task, steps=steps)
+
+
+def _filler(chars: int) -> str:
+    return (_FILLER * (chars // len(_FILLER) + 1))[:chars]
+
+
+class AgentScript:
+    """
+    按任务目录扮演模型：根据系统提示判断是哪类调用（安全检查、规划、工具分析、工具生成、执行、汇总），
+    再根据提示中出现的主任务或步骤描述给出对应回复
+    """
+    def __init__(self, tasks):
+        self.tasks = {task["task"]: task for task in tasks}
+        self.steps = [step for task in tasks for step in task["steps"]]
+
+    def _task(self, text):
+        match = re.search(r"主任务: ?(.+)", text)
+        return self.tasks.get(match.group(1).strip()) if match else None
+
+    def _step(self, text):
+        found = [step for step in self.steps if step["description"] in text]
+        if not found:
+            found = [step for step in self.steps if step.get("tool") and step["tool"] in text]
+        return max(found, key=lambda step: len(step["description"])) if found else None
+
+    def __call__(self, request):
+        messages = request.get("messages", [])
+        system = _text(messages[0]) if messages else ""
+        last = messages[-1] if messages else {}
+        text = _text(last)
+
+        if "安全检察员" in system:
+            return {"json": {"safety": "Safe", "rationale": "基准测试", "message": ""}}
+        if "任务规划与安全审核专家" in system:
+            planned = self(dict(request, messages=[{"role": "system", "content": "你是任务规划专家"}, last]))["json"]
+            step = self._step(planned["description"]) if planned["step_num"] != "-1" else None
+            if step is None:
+                return {"json": {"step_num": "-1"}}
+            need = {"tool": "No", "self": "self", "new_tool": "Yes"}[step["type"]]
+            return {"json": dict(planned, safety="Safe", message="", need_new_tool=need)}
+        if "找出可以并行的步骤" in system:
+            task = self._task(text)
+            steps = task["steps"] if task else []
+            return {"json": {"steps": [
+                {"id": str(i + 1), "description": step["description"], "depends_on": step.get("depends_on", [])}
+                for i, step in enumerate(steps)
+            ]}}
+        if "任务规划专家" in system:
+            task = self._task(text)
+            match = re.search(r"已下达步骤: (\[.*?\]|无)", text)
+            history = json.loads(match.group(1)) if match and match.group(1) != "无" else []
+            if task is None or len(history) >= len(task["steps"]):
+                return {"json": {"step_num": "-1", "description": "任务已完成", "rationale": "所有步骤均已完成"}}
+            step = task["steps"][len(history)]
+            return {"json": {"step_num": str(len(history) + 1), "description": step["description"], "rationale": "按计划执行"}}
+        if "任务分析器" in system:
+            step = self._step(text) or {"type": "self"}
+            need = {"tool": "No", "self": "self", "new_tool": "Yes"}[step["type"]]
+            return {"json": {"need_new_tool": need, "reason": "基准测试"}}
+        if "工具复用分析器" in system:
+            return {"json": {"reuse": "None", "reason": "基准测试"}}
+        if "工具定义生成器" in system:
+            step = self._step(text)
+            return {"json": step["definition"] if step else {}}
+        if "Python函数生成器" in system:
+            step = self._step(text)
+            return step["code"] if step else "def execute_unknown(args):\n    return ''\n"
+        if "对话摘要助手" in system:
+            return "此前步骤均已完成，" + _filler(100)
+        if "报告生成专家" in system:
+            task = self._task(text) or {}
+            return "## 执行结果\n\n" + _filler(task.get("report_chars", 300))
+        if request.get("tools"):
+            step = self._step(text) if last.get("role") == "user" else None
+            if step and step.get("tool"):
+                return {"tool_calls": [{"name": step["tool"], "arguments": step.get("arguments", {})}]}
+            return "步骤已完成：" + (text[:50] or "工具执行成功")
+        step = self._step(text)
+        if step and step["type"] == "self":
+            return _filler(step.get("response_chars", 200))
+        return "OK"
+
+
+def _prepare_workdir(catalog) -> str:
+    """在临时目录中准备tools.json、工具代码和日志目录"""
+    workdir = tempfile.mkdtemp(prefix="agent-bench-")
+    os.makedirs(os.path.join(workdir, "tools"))
+    os.makedirs(os.path.join(workdir, "blogs"))
+    with open(os.path.join(workdir, "tools.json"), "w", encoding="utf-8") as f:
+        json.dump({"tools": [tool["definition"] for tool in catalog["tools"]]}, f, ensure_ascii=False)
+    for tool in catalog["tools"]:
+        name = tool["definition"]["function"]["name"]
+        with open(os.path.join(workdir, "tools", f"{name}.py"), "w", encoding="utf-8") as f:
+            f.write(tool["code"])
+    return workdir
+
+
+def _percentile(values, q):
+    if not values:
+        return 0.0
+    if len(values) == 1:
+        return values[0]
+    return statistics.quantiles(values, n=100, method="inclusive")[q - 1]
+
+
+def run(args):
+    with open(args.catalog, "r", encoding="utf-8") as f:
+        catalog = json.load(f)
+    tasks = [_expand(task) for task in catalog["tasks"] if not args.only or task["name"] in args.only]
+    server = MockLLMServer(AgentScript(tasks), latency=args.latency, tokens_per_second=args.tps, error_rate=args.error_rate)
+    base_url = server.start()
+
+    # 必须在导入core之前设置：客户端地址和日志路径都在导入时读取
+    os.environ["DEEPSEEK_BASE_URL"] = base_url
+    os.environ.setdefault("DEEPSEEK_API_KEY", "bench")
+    if args.record:
+        os.environ["LLM_RECORD"] = os.path.abspath(args.record)
+    if args.replay:
+        os.environ["LLM_REPLAY"] = os.path.abspath(args.replay)
+    workdir = _prepare_workdir(catalog)
+    cwd = os.getcwd()
+    os.chdir(workdir)
+    sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+    from core.agent import client_maker, transport
+    from core.models import router
+    from core.analyze import TaskAnalyzer
+    from core.trace import tracer
+
+    spans = defaultdict(list)
+    tracer.add_listener(lambda record: spans[record["trace_id"]].append(record))
+    _, client = client_maker()
+
+    tracemalloc.start()
+    results = []
+    started = time.perf_counter()
+    try:
+        for _ in range(args.repeat):
+            for task in tasks:
+                analyzer = TaskAnalyzer(client, pipeline=args.pipeline, planner=args.planner, fused=args.fused)
+                # 在传输层计数，回放模式下不访问模拟服务也能与实测结果对比
+                calls_before = transport.calls
+                seen = set(spans)
+                task_start = time.perf_counter()
+                analyzer.analyze_and_execute(task["task"])
+                wall = time.perf_counter() - task_start
+                trace = next((spans[t] for t in list(spans) if t not in seen), [])
+                results.append({
+                    "name": task["name"],
+                    "wall": wall,
+                    "calls": transport.calls - calls_before,
+                    "steps": [s["duration"] for s in trace if s["name"] == "step"],
+                    "prompt_tokens": sum(s["prompt_tokens"] for s in trace if s["kind"] == "llm"),
+                    "completion_tokens": sum(s["completion_tokens"] for s in trace if s["kind"] == "llm"),
+                })
+    finally:
+        total = time.perf_counter() - started
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        os.chdir(cwd)
+        server.stop()
+        if not args.keep:
+            shutil.rmtree(workdir, ignore_errors=True)
+
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss if resource else 0
+    summary = {
+        "config": {"latency": args.latency, "tps": args.tps, "repeat": args.repeat,
+                   "pipeline": args.pipeline, "planner": args.planner, "fused": args.fused,
+                   "error_rate": args.error_rate},
+        "governor": transport.governor.metrics(),
+        "models": router.metrics(),
+        "total_wall": total,
+        "peak_python_memory_mb": peak / 1024 / 1024,
+        "max_rss_mb": rss / 1024 if sys.platform != "darwin" else rss / 1024 / 1024,
+        "tasks": [],
+    }
+    all_steps = []
+    for name in dict.fromkeys(r["name"] for r in results):
+        runs = [r for r in results if r["name"] == name]
+        steps = [d for r in runs for d in r["steps"]]
+        all_steps += steps
+        summary["tasks"].append({
+            "name": name,
+            "runs": len(runs),
+            "calls": statistics.mean(r["calls"] for r in runs),
+            "wall": statistics.mean(r["wall"] for r in runs),
+            "step_p50": _percentile(steps, 50),
+            "step_p95": _percentile(steps, 95),
+            "prompt_tokens": statistics.mean(r["prompt_tokens"] for r in runs),
+            "completion_tokens": statistics.mean(r["completion_tokens"] for r in runs),
+        })
+    summary["step_p50"] = _percentile(all_steps, 50)
+    summary["step_p95"] = _percentile(all_steps, 95)
+    return summary
+
+
+def report(summary):
+    print(f"{'任务':<10}{'次数':>6}{'调用/任务':>10}{'耗时(s)':>10}{'步骤p50':>10}{'步骤p95':>10}{'输入token':>11}{'输出token':>11}")
+    for task in summary["tasks"]:
+        print(f"{task['name']:<10}{task['runs']:>6}{task['calls']:>10.1f}{task['wall']:>10.2f}"
+              f"{task['step_p50']:>10.2f}{task['step_p95']:>10.2f}{task['prompt_tokens']:>11.0f}{task['completion_tokens']:>11.0f}")
+    print(f"总耗时 {summary['total_wall']:.2f}s，步骤延迟 p50 {summary['step_p50']:.2f}s / p95 {summary['step_p95']:.2f}s，"
+          f"Python内存峰值 {summary['peak_python_memory_mb']:.1f}MB，进程RSS峰值 {summary['max_rss_mb']:.1f}MB")
+    governor = summary["governor"]
+    print(f"请求 {governor['requests']}，重试 {governor['retries']}，放弃 {governor['giveups']}，"
+          f"限速排队 {governor['throttled']}次/共{governor['wait_total']:.2f}s，熔断 {governor['breaker_opens']}次")
+    endpoints = summary["models"]["endpoints"]
+    if len(endpoints) > 1:
+        for name, endpoint in endpoints.items():
+            latency = "-" if endpoint["latency"] is None else f"{endpoint['latency']:.2f}s"
+            print(f"端点 {name}({endpoint['model']})：调用 {endpoint['calls']}，延迟 {latency}，错误率 {endpoint['error_rate']:.2f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="离线端到端基准测试")
+    parser.add_argument("--catalog", default=CATALOG, help="任务目录(JSON)")
+    parser.add_argument("--only", nargs="*", help="只运行指定名称的任务")
+    parser.add_argument("--repeat", type=int, default=1)
+    parser.add_argument("--latency", type=float, default=0.2, help="模拟服务首包延迟(秒)")
+    parser.add_argument("--tps", type=float, default=50.0, help="模拟服务输出速率(token/秒)")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="模拟服务随机返回429的比例")
+    parser.add_argument("--pipeline", action="store_true", help="开启流水线模式")
+    parser.add_argument("--planner", default="step", choices=["step", "graph"])
+    parser.add_argument("--fused", action="store_true", help="开启合并调用模式")
+    parser.add_argument("--json", help="把结果写入JSON文件")
+    parser.add_argument("--keep", action="store_true", help="保留临时工作目录")
+    parser.add_argument("--record", help="把全部请求/响应录制到该文件")
+    parser.add_argument("--replay", help="从录制文件回放响应，不访问模拟服务")
+    args = parser.parse_args()
+
+    summary = run(args)
+    report(summary)
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(summary, f, ensure_ascii=False, indent=2)
+
+
+if __name__ == "__main__":
+    main()
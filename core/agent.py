@@ -1,158 +1,784 @@
-from openai import OpenAI
+from openai import OpenAI, AsyncOpenAI
+from openai.types.chat import ChatCompletionMessage
+import asyncio
+import atexit
+import concurrent.futures
+import contextlib
+import contextvars
+import hashlib
+import sqlite3
+import threading
 import time
-from datetime import datetime
+from collections import OrderedDict
+import httpx
 import json
 import os
+import openai
 from dotenv import load_dotenv
 
-from PyQt5.QtCore import QObject, pyqtSignal
-import json
-from datetime import datetime
+from core.conversation import Conversation
+from core.logger import logger
+from core.trace import tracer
+from core.cassette import cassette_from_env
+from core.cancel import check_cancelled
+from core.rate_limit import CallGovernor, CircuitBreaker
+from core.json_stream import JSONStreamParser
+
+DEFAULT_BASE_URL = "https://api.deepseek.com"
+MAX_CONNECTIONS = int(os.getenv("LLM_MAX_CONNECTIONS", "20"))    # 连接池上限
+MAX_CONCURRENCY = int(os.getenv("LLM_MAX_CONCURRENCY", "8"))     # 同时在途的请求上限
+LLM_RPM = float(os.getenv("LLM_RPM", "0"))                        # 每分钟请求数上限，0为不限
+LLM_TPM = float(os.getenv("LLM_TPM", "0"))                        # 每分钟token数上限，0为不限
+MAX_RETRIES = int(os.getenv("LLM_MAX_RETRIES", "4"))              # 429、超时、连接错误和5xx的重试次数
+BREAKER_THRESHOLD = int(os.getenv("LLM_BREAKER_THRESHOLD", "5"))  # 连续失败多少次后熔断
+BREAKER_COOLDOWN = float(os.getenv("LLM_BREAKER_COOLDOWN", "10")) # 熔断后的冷却时间(秒)
+
+
+def _retryable(exc) -> bool:
+    """限流、超时、连接错误和服务端错误可以重试，其余（参数错误、鉴权失败等）直接抛出"""
+    if isinstance(exc, (openai.APITimeoutError, openai.APIConnectionError, httpx.TransportError)):
+        return True
+    if isinstance(exc, openai.APIStatusError):
+        return exc.status_code in (408, 409, 429) or exc.status_code >= 500
+    return False
+
+
+def _retry_after(exc):
+    """服务端在Retry-After(-ms)响应头中建议的等待秒数"""
+    response = getattr(exc, "response", None)
+    if response is None:
+        return None
+    try:
+        if response.headers.get("retry-after-ms"):
+            return float(response.headers["retry-after-ms"]) / 1000
+        if response.headers.get("retry-after"):
+            return float(response.headers["retry-after"])
+    except ValueError:
+        pass
+    return None
+
+
+def _estimate_tokens(kwargs) -> int:
+    """发送前粗略估计请求的token数（约2字符一个token），收到usage后再按实际用量修正"""
+    chars = sum(
+        len(str((message.get("content") if isinstance(message, dict) else getattr(message, "content", None)) or ""))
+        for message in kwargs.get("messages", [])
+    )
+    if kwargs.get("tools"):
+        chars += len(json.dumps(kwargs["tools"], ensure_ascii=False))
+    return chars // 2 + 1
+
+
+class LLMTransport:
+    """进程级共享的异步传输层
+
+    所有请求都在同一个后台事件循环上执行：同一组凭据只创建一个AsyncOpenAI客户端，
+    底层httpx连接池保持keep-alive，信号量限制在途请求数。同步接口通过run()阻塞等待结果。
+    """
+    def __init__(self, max_connections=MAX_CONNECTIONS, max_concurrency=MAX_CONCURRENCY):
+        self.max_connections = max_connections
+        self.max_concurrency = max_concurrency
+        self._lock = threading.Lock()
+        self._loop = None
+        self._thread = None
+        self._clients = {}
+        self._semaphore = None
+        self.cassette = cassette_from_env()  # 录制/回放，见core/cassette.py
+        self.governor = CallGovernor(
+            LLM_RPM, LLM_TPM, max_retries=MAX_RETRIES,
+            breaker=CircuitBreaker(BREAKER_THRESHOLD, BREAKER_COOLDOWN),
+            retryable=_retryable, retry_after=_retry_after,
+        )
+        self._listeners = []
+        self.calls = 0  # 得到响应的请求数（含回放），不含失败的尝试
+
+    def add_listener(self, listener):
+        """
+        每次请求尝试结束后回调listener(model_name, client, latency, error)，error为None表示成功；
+        latency为发出请求到收到响应（流式为响应头）的秒数，供core/models.py的路由统计各端点的延迟和错误率
+        """
+        self._listeners.append(listener)
+
+    def _observe(self, clients, latency, error=None):
+        for listener in self._listeners:
+            listener(clients[0], clients[1], latency, error)
+
+    @property
+    def loop(self):
+        with self._lock:
+            if self._loop is None:
+                self._loop = asyncio.new_event_loop()
+                self._thread = threading.Thread(target=self._loop.run_forever, name="llm-transport", daemon=True)
+                self._thread.start()
+            return self._loop
+
+    def in_loop(self):
+        """当前是否运行在传输层事件循环中"""
+        try:
+            return asyncio.get_running_loop() is self._loop
+        except RuntimeError:
+            return False
+
+    def async_client(self, client):
+        """根据同步客户端的凭据取得共享的异步客户端，已是异步客户端则直接返回"""
+        if not isinstance(client, OpenAI):
+            return client
+        key = (str(client.base_url), client.api_key)
+        with self._lock:
+            if key not in self._clients:
+                http_client = httpx.AsyncClient(
+                    limits=httpx.Limits(
+                        max_connections=self.max_connections,
+                        max_keepalive_connections=self.max_connections,
+                        keepalive_expiry=60,
+                    ),
+                    timeout=httpx.Timeout(600, connect=10),
+                    event_hooks={"request": [self._count_attempt]},
+                )
+                self._clients[key] = AsyncOpenAI(
+                    api_key=client.api_key,
+                    base_url=client.base_url,
+                    max_retries=0,  # 重试由governor统一负责
+                    http_client=http_client,
+                )
+            return self._clients[key]
+
+    @staticmethod
+    async def _count_attempt(request):
+        # 每个HTTP请求（含客户端自动重试）计入当前span
+        span = tracer.current()
+        if span is not None:
+            span.attempts += 1
+
+    def set_rate_limit(self, rate: float):
+        """全局限速：所有请求每秒最多发出rate个，rate<=0时不限"""
+        self.governor.configure(rpm=rate * 60 if rate and rate > 0 else 0)
+
+    def _slot(self):
+        # 信号量需在事件循环内创建
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(self.max_concurrency)
+        return self._semaphore
+
+    async def _open(self, clients, estimate, request):
+        """
+        经governor排队后发出请求，request(clients)返回请求协程；可重试的错误按退避重试，
+        clients带有reroute()（见core/models.py的Route）时重试换用同角色的其他端点；
+        返回时仍占用一个并发名额，由调用方在读完响应后release
+        """
+        attempt = 0
+        while True:
+            await self.governor.admit(estimate)
+            slot = self._slot()
+            await slot.acquire()
+            start = time.perf_counter()
+            succeeded = False
+            try:
+                result = await request(clients)
+                succeeded = True
+            except Exception as e:
+                error = e
+                self._observe(clients, time.perf_counter() - start, e)
+                delay = self.governor.on_error(e, attempt)
+                if delay is None:
+                    raise
+            except BaseException:
+                self.governor.on_abort()
+                raise
+            finally:
+                if not succeeded:
+                    # 失败或取消的尝试：释放并发名额，退还预占的token
+                    slot.release()
+                    self.governor.settle(estimate, 0)
+            if succeeded:
+                self.governor.on_success()
+                self._observe(clients, time.perf_counter() - start)
+                return result
+            attempt += 1
+            logger.log("error", f"{type(error).__name__}: {error}", model=clients[0], retry=attempt, delay=round(delay, 2))
+            if hasattr(clients, "reroute"):
+                clients = clients.reroute()
+            await asyncio.sleep(delay)
+
+    async def create(self, clients, **kwargs):
+        """非流式请求"""
+        model_name, client = clients
+        if self.cassette and self.cassette.replaying:
+            response = self.cassette.replay(model_name, kwargs)
+            self.calls += 1
+        else:
+            estimate = _estimate_tokens(kwargs)
+            response = await self._open(
+                clients, estimate,
+                lambda clients: self.async_client(clients[1]).chat.completions.create(model=clients[0], **kwargs),
+            )
+            self.calls += 1
+            self._slot().release()
+            usage = getattr(response, "usage", None)
+            self.governor.settle(estimate, usage.total_tokens if usage else estimate)
+            if self.cassette:
+                self.cassette.record(model_name, kwargs, response)
+        span = tracer.current()
+        if span is not None:
+            span.add_usage(getattr(response, "usage", None))
+        return response
+
+    async def stream(self, clients, **kwargs):
+        """
+        流式请求，整个读取过程占用一个并发名额；末尾只含用量的片段计入当前span，不再向外产出
+        建立连接阶段的错误可以重试，开始产出片段后出错则直接抛出；
+        调用方提前结束读取时需关闭生成器（contextlib.aclosing），连接随即释放
+        """
+        model_name, client = clients
+        span = tracer.current()
+        if self.cassette and self.cassette.replaying:
+            chunks = self.cassette.replay_stream(model_name, kwargs)
+            self.calls += 1
+            for chunk in self._filter_chunks(chunks, span):
+                yield chunk
+            return
+        recorded = [] if self.cassette else None
+        estimate, usage = _estimate_tokens(kwargs), None
+        stream = await self._open(
+            clients, estimate,
+            lambda clients: self.async_client(clients[1]).chat.completions.create(
+                model=clients[0], stream=True, stream_options={"include_usage": True}, **kwargs
+            ),
+        )
+        self.calls += 1
+        try:
+            async for chunk in stream:
+                if recorded is not None:
+                    recorded.append(chunk)
+                usage = getattr(chunk, "usage", None) or usage
+                for item in self._filter_chunks((chunk,), span):
+                    yield item
+        except GeneratorExit:
+            # 调用方提前结束：录制已收到的片段，回放时同样在此处结束
+            if recorded is not None:
+                self.cassette.record_stream(model_name, kwargs, recorded)
+                recorded = None
+            raise
+        finally:
+            await stream.close()
+            self._slot().release()
+            self.governor.settle(estimate, usage.total_tokens if usage else estimate)
+        if recorded is not None:
+            self.cassette.record_stream(model_name, kwargs, recorded)
 
-class StreamHandler(QObject):
-    """处理流式输出的信号类"""
-    stream_received = pyqtSignal(str)  # 流式内容信号
-    final_received = pyqtSignal(str)   # 最终结果信号
+    @staticmethod
+    def _filter_chunks(chunks, span):
+        for chunk in chunks:
+            if span is not None:
+                span.add_usage(getattr(chunk, "usage", None))
+            if not chunk.choices:
+                continue
+            if span is not None:
+                span.first_token()
+            yield chunk
 
+    def submit(self, coro):
+        """在传输层事件循环上调度协程，保留调用方的contextvars，返回concurrent.futures.Future"""
+        loop = self.loop
+        context = contextvars.copy_context()
+        future = concurrent.futures.Future()
+
+        def _schedule():
+            if future.cancelled():
+                coro.close()
+                return
+            task = loop.create_task(coro, context=context)
+            future.add_done_callback(lambda f: f.cancelled() and loop.call_soon_threadsafe(task.cancel))
+
+            def _done(t):
+                if future.done():
+                    return
+                if t.cancelled():
+                    future.cancel()
+                elif t.exception() is not None:
+                    future.set_exception(t.exception())
+                else:
+                    future.set_result(t.result())
+            task.add_done_callback(_done)
+
+        loop.call_soon_threadsafe(_schedule)
+        return future
+
+    def run(self, coro):
+        """同步等待协程结果（同步API的薄封装）"""
+        if self.in_loop():
+            coro.close()
+            raise RuntimeError("不能在传输层事件循环内同步等待，请使用 await async_send_message(...)")
+        return self.submit(coro).result()
+
+    def use_cassette(self, cassette):
+        """切换录制/回放（None为关闭），原有录制文件会被关闭"""
+        if self.cassette and self.cassette is not cassette:
+            self.cassette.close()
+        self.cassette = cassette
+
+    def close(self):
+        """关闭连接池并停止事件循环"""
+        if self._loop is None or self._loop.is_closed():
+            if self.cassette:
+                self.cassette.close()
+            return
+
+        async def _close():
+            for client in self._clients.values():
+                await client.close()
+        try:
+            self.submit(_close()).result(timeout=5)
+        except Exception:
+            pass
+        self._loop.call_soon_threadsafe(self._loop.stop)
+        if self.cassette:
+            self.cassette.close()
+
+
+transport = LLMTransport()
+atexit.register(transport.close)
+
+_client_cache = {}
+_client_lock = threading.Lock()
 
 
 def client_maker(model_name="deepseek-chat"):
-    load_dotenv()
-    client = None
-    if model_name == "deepseek-chat":
-        api_key_ = os.getenv("DEEPSEEK_API_KEY")
-        client = OpenAI(api_key=api_key_, base_url="https://api.deepseek.com")
-    return (model_name, client)
-
-def direct_response(clients, messages, blog_file, tools, temperature):
-    model_name, client = clients
-    response = client.chat.completions.create(
-        model=model_name,
-        messages=messages,
+    """返回(model_name, client)，同一模型在进程内只创建一次客户端"""
+    with _client_lock:
+        if model_name not in _client_cache:
+            load_dotenv()
+            client = None
+            if model_name == "deepseek-chat":
+                api_key_ = os.getenv("DEEPSEEK_API_KEY")
+                client = OpenAI(api_key=api_key_, base_url=os.getenv("DEEPSEEK_BASE_URL", DEFAULT_BASE_URL))
+            _client_cache[model_name] = client
+    return (model_name, _client_cache[model_name])
+
+
+CACHE_TTLS = {0: 7 * 24 * 3600, 1: 24 * 3600, 2: 0}  # 各mode的缓存有效期(秒)，0表示不缓存
+
+
+class ResponseCache:
+    """内容寻址的响应缓存
+
+    以(模型, 规范化后的messages, tools, temperature, mode)的哈希为键，
+    内存中保留LRU热数据，sqlite做持久化。默认关闭，设置环境变量LLM_CACHE=1或调用configure开启。
+    """
+    def __init__(self, path="cache/llm_cache.sqlite", max_entries=1024, ttls=None, enabled=False):
+        self.path = path
+        self.max_entries = max_entries
+        self.ttls = dict(CACHE_TTLS, **(ttls or {}))
+        self.enabled = enabled
+        self.hits = 0
+        self.misses = 0
+        self.disk_hits = 0
+        self.evictions = 0
+        self._memory = OrderedDict()
+        self._lock = threading.Lock()
+        self._db = None
+
+    def configure(self, enabled=None, path=None, max_entries=None, ttls=None):
+        with self._lock:
+            if enabled is not None:
+                self.enabled = enabled
+            if path is not None and path != self.path:
+                self.path = path
+                if self._db is not None:
+                    self._db.close()
+                    self._db = None
+            if max_entries is not None:
+                self.max_entries = max_entries
+            if ttls:
+                self.ttls.update(ttls)
+
+    def cacheable(self, mode):
+        return self.enabled and self.ttls.get(mode, 0) > 0
+
+    @staticmethod
+    def key(model_name, messages, tools, temperature, mode):
+        """计算请求的内容哈希"""
+        normalized = []
+        for message in messages:
+            if hasattr(message, "model_dump"):
+                message = message.model_dump(exclude_none=True)
+            message = dict(message)
+            if isinstance(message.get("content"), str):
+                message["content"] = message["content"].strip()
+            normalized.append(message)
+        payload = json.dumps(
+            [model_name, normalized, tools or [], temperature, mode],
+            ensure_ascii=False, sort_keys=True, default=str
+        )
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    def _connect(self):
+        if self._db is None:
+            os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+            self._db = sqlite3.connect(self.path, check_same_thread=False)
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS responses (key TEXT PRIMARY KEY, mode INTEGER, value TEXT, created REAL)"
+            )
+            self._db.commit()
+        return self._db
+
+    def _expired(self, mode, created):
+        return time.time() - created > self.ttls.get(mode, 0)
+
+    def get(self, key, mode):
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry is not None:
+                value, created = entry
+                if not self._expired(mode, created):
+                    self._memory.move_to_end(key)
+                    self.hits += 1
+                    return self._decode(mode, value)
+                del self._memory[key]
+            row = self._connect().execute(
+                "SELECT value, created FROM responses WHERE key = ?", (key,)
+            ).fetchone()
+            if row is None or self._expired(mode, row[1]):
+                self.misses += 1
+                return None
+            self._remember(key, row[0], row[1])
+            self.hits += 1
+            self.disk_hits += 1
+            return self._decode(mode, row[0])
+
+    def put(self, key, mode, response):
+        value = self._encode(mode, response)
+        created = time.time()
+        with self._lock:
+            self._remember(key, value, created)
+            db = self._connect()
+            db.execute("INSERT OR REPLACE INTO responses VALUES (?, ?, ?, ?)", (key, mode, value, created))
+            db.commit()
+
+    def _remember(self, key, value, created):
+        self._memory[key] = (value, created)
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_entries:
+            self._memory.popitem(last=False)
+            self.evictions += 1
+
+    @staticmethod
+    def _encode(mode, response):
+        if mode == 1:
+            response = response.model_dump(exclude_none=True)
+        return json.dumps(response, ensure_ascii=False)
+
+    @staticmethod
+    def _decode(mode, value):
+        data = json.loads(value)
+        if mode == 1:
+            return ChatCompletionMessage.model_validate(data)
+        return data
+
+    def purge_expired(self):
+        """清理磁盘上已过期的条目"""
+        with self._lock:
+            db = self._connect()
+            now = time.time()
+            for mode, ttl in self.ttls.items():
+                db.execute("DELETE FROM responses WHERE mode = ? AND created < ?", (mode, now - ttl))
+            db.commit()
+
+    def clear(self):
+        with self._lock:
+            self._memory.clear()
+            db = self._connect()
+            db.execute("DELETE FROM responses")
+            db.commit()
+
+    def stats(self):
+        total = self.hits + self.misses
+        return {
+            "enabled": self.enabled,
+            "hits": self.hits,
+            "misses": self.misses,
+            "disk_hits": self.disk_hits,
+            "evictions": self.evictions,
+            "memory_entries": len(self._memory),
+            "hit_rate": self.hits / total if total else 0.0,
+        }
+
+
+response_cache = ResponseCache(enabled=os.getenv("LLM_CACHE") == "1")
+
+async def _direct_response(clients, messages, tools, temperature):
+    messages = Conversation.of(messages)
+    response = await transport.create(
+        clients,
+        messages=messages.to_wire(),
         tools=tools if tools else None,
         tool_choice="auto" if tools else None,
         temperature=temperature
     )
     full_response = response.choices[0].message
-    
-    # 添加日志记录功能
-    if hasattr(full_response, 'content') and full_response.content:
-        blog_file.write(f'<assistant><direct mode>({model_name}): {full_response.content}\n')
-    elif hasattr(full_response, 'tool_calls') and full_response.tool_calls:
-        tool_calls_str = json.dumps([{
-            "id": call.id,
-            "type": call.type,
-            "function": {
-                "name": call.function.name,
-                "arguments": call.function.arguments
-            }
-        } for call in full_response.tool_calls], ensure_ascii=False)
-        blog_file.write(f'<assistant><direct mode>({model_name}): [TOOL CALLS] {tool_calls_str}\n')
-    messages.append({"role": "assistant", "content": full_response.content} if hasattr(full_response, 'content') else full_response)
+    messages = messages.append({"role": "assistant", "content": full_response.content} if hasattr(full_response, 'content') else full_response)
     return full_response, messages
 
-def stream_response_past(clients, messages, blog_file, temperature, output):
-    model_name, client = clients
-    stream = client.chat.completions.create(
-        model=model_name,
-        messages=messages,
-        stream=True,
+class ToolCallAssembler:
+    """
+    把流式返回的tool_calls增量拼装成完整调用
+    某个调用的arguments已是完整的JSON对象，或模型已开始输出下一个调用时，立即以ChatCompletionMessageToolCall回调on_complete，
+    不必等待整个回复结束；finish()补齐其余调用（arguments不完整的也照样交出，由执行方报错）。
+    """
+    def __init__(self, on_complete=None):
+        self.on_complete = on_complete
+        self._calls = {}     # index -> {"id", "name", "arguments"}
+        self._done = set()
+
+    def feed(self, deltas):
+        for delta in deltas:
+            entry = self._calls.setdefault(delta.index, {"id": None, "name": "", "arguments": ""})
+            if delta.id:
+                entry["id"] = delta.id
+            if delta.function:
+                entry["name"] += delta.function.name or ""
+                entry["arguments"] += delta.function.arguments or ""
+            # 模型已开始输出后面的调用，前面的调用必然已完整
+            for index in [i for i in self._calls if i < delta.index and i not in self._done]:
+                self._complete(index)
+            arguments = entry["arguments"].rstrip()
+            if delta.index not in self._done and entry["name"] and arguments.endswith("}"):
+                try:
+                    json.loads(arguments)
+                except json.JSONDecodeError:
+                    continue
+                self._complete(delta.index)
+
+    def finish(self):
+        for index in sorted(self._calls):
+            if index not in self._done:
+                self._complete(index)
+
+    def _wire(self, index) -> dict:
+        entry = self._calls[index]
+        return {"id": entry["id"], "type": "function", "function": {"name": entry["name"], "arguments": entry["arguments"]}}
+
+    def _complete(self, index):
+        self._done.add(index)
+        if self.on_complete is not None:
+            message = ChatCompletionMessage.model_validate({"role": "assistant", "tool_calls": [self._wire(index)]})
+            self.on_complete(message.tool_calls[0])
+
+    def tool_calls(self) -> list:
+        return [self._wire(index) for index in sorted(self._calls)]
+
+
+async def _stream_tool_response(clients, messages, tools, temperature, on_tool_call):
+    """
+    流式的function calling：每个工具调用的参数一完整就交给on_tool_call（在传输层线程中执行，需尽快返回），
+    模型仍在输出后续调用时工具即可开始执行。返回值与_direct_response相同。
+    """
+    messages = Conversation.of(messages)
+    content = []
+    assembler = ToolCallAssembler(on_tool_call)
+    async with contextlib.aclosing(transport.stream(
+        clients,
+        messages=messages.to_wire(),
+        tools=tools,
+        tool_choice="auto",
         temperature=temperature
-    )
-        
+    )) as chunks:
+        async for chunk in chunks:
+            check_cancelled()
+            delta = chunk.choices[0].delta
+            if delta is None:
+                continue
+            if delta.content:
+                content.append(delta.content)
+            if delta.tool_calls:
+                assembler.feed(delta.tool_calls)
+    assembler.finish()
+    full_response = ChatCompletionMessage.model_validate({
+        "role": "assistant",
+        "content": "".join(content) or None,
+        "tool_calls": assembler.tool_calls() or None,
+    })
+    return full_response, messages.append({"role": "assistant", "content": full_response.content})
+
+async def _stream_response_past(clients, messages, temperature, output):
     full_response = ""
-    blog_file.write(f"<assistant><stream mode>({model_name}): ")
-    for chunk in stream:
+    messages = Conversation.of(messages)
+    async for chunk in transport.stream(clients, messages=messages.to_wire(), temperature=temperature):
         if chunk.choices[0].delta.content:
             word = chunk.choices[0].delta.content
-            blog_file.write(word)
             if output:
                 print(word, end='', flush=True)
             full_response += word
-            time.sleep(0.03)
     if output:
         print()
-    blog_file.write("\n")
-    messages.append({"role": "assistant", "content": full_response})
 
-    return full_response, messages
+    return full_response, messages.append({"role": "assistant", "content": full_response})
 
-def stream_response(clients, messages, stream_handler, blog_file):
+async def _stream_response(clients, messages, stream_handler):
     """完全实时的流式响应处理"""
-    model_name, client = clients
-    stream = client.chat.completions.create(
-        model=model_name,
-        messages=messages,
-        stream=True
-    )
-    
     full_response = ""
-    blog_file.write(f"<assistant><stream mode>({model_name}): ")
-    
-    for chunk in stream:
-        if chunk.choices[0].delta and chunk.choices[0].delta.content:
-            chunk_text = chunk.choices[0].delta.content
-            full_response += chunk_text
-            # 关键修改：立即发射原始片段（不等待缓冲）
-            stream_handler.stream_received.emit(chunk_text)
-            blog_file.write(chunk_text)
-            blog_file.flush()  # 确保日志实时写入
-            time.sleep(0.03)
-    
-    blog_file.write("\n")
-    return full_response, messages + [{"role": "assistant", "content": full_response}]
-
-def json_response(clients, messages, blog_file, temperature):
-    model_name, client = clients
-    response = client.chat.completions.create(
-        model=model_name,
-        messages=messages,
-        response_format={"type": "json_object"},
-        temperature=temperature
-    )
-    full_response = response.choices[0].message.content
+
+    async with contextlib.aclosing(transport.stream(clients, messages=Conversation.of(messages).to_wire())) as chunks:
+        async for chunk in chunks:
+            if chunk.choices[0].delta and chunk.choices[0].delta.content:
+                check_cancelled()
+                chunk_text = chunk.choices[0].delta.content
+                full_response += chunk_text
+                # 关键修改：立即发射原始片段（不等待缓冲）
+                stream_handler.stream_received.emit(chunk_text)
+
+    return full_response, Conversation.of(messages).append({"role": "assistant", "content": full_response})
+
+async def _json_response(clients, messages, temperature, on_field=None):
+    """
+    JSON模式请求，返回(结果, 是否完整)
+    给定on_field时流式读取并增量解析，顶层字段一完整就回调on_field(key, value)；
+    回调返回True时立即停止生成，返回已解析出的字段，此时结果不完整
+    """
+    messages = Conversation.of(messages).to_wire()
+    if on_field is None:
+        response = await transport.create(
+            clients,
+            messages=messages,
+            response_format={"type": "json_object"},
+            temperature=temperature
+        )
+        full_response = response.choices[0].message.content
+    else:
+        parser = JSONStreamParser(on_field)
+        full_response = ""
+        async with contextlib.aclosing(transport.stream(
+            clients,
+            messages=messages,
+            response_format={"type": "json_object"},
+            temperature=temperature
+        )) as chunks:
+            async for chunk in chunks:
+                if chunk.choices and chunk.choices[0].delta and chunk.choices[0].delta.content:
+                    full_response += chunk.choices[0].delta.content
+                    if parser.feed(chunk.choices[0].delta.content):
+                        return dict(parser.fields), False
     try:
-        json_data = json.loads(full_response)
-        blog_file.write(f'<assistant>({model_name}): {json.dumps(json_data, ensure_ascii=False)}\n')
-        return json_data
+        return json.loads(full_response), True
     except json.JSONDecodeError:
-        blog_file.write(f'<assistant>({model_name}): [INVALID JSON] {full_response}\n')
-        return {"error": "Invalid JSON response"}
+        logger.log("error", full_response, model=clients[0], error="Invalid JSON response")
+        return {"error": "Invalid JSON response"}, True
+
+def direct_response(clients, messages, tools, temperature):
+    return transport.run(_direct_response(clients, messages, tools, temperature))
+
+def stream_response_past(clients, messages, temperature, output):
+    return transport.run(_stream_response_past(clients, messages, temperature, output))
+
+def stream_response(clients, messages, stream_handler):
+    return transport.run(_stream_response(clients, messages, stream_handler))
+
+def json_response(clients, messages, temperature, on_field=None):
+    return transport.run(_json_response(clients, messages, temperature, on_field))[0]
+
+def _log_content(response):
+    """日志中记录的回复内容：文本、JSON或工具调用"""
+    if getattr(response, "tool_calls", None):
+        return [{"id": call.id, "name": call.function.name, "arguments": call.function.arguments} for call in response.tool_calls]
+    return response.content if hasattr(response, "content") else response
+
+def _replay_fields(fields: dict, on_field) -> bool:
+    """按原顺序把缓存的部分字段交给on_field，返回回调是否在这些字段内要求停止（即可以直接复用）"""
+    return any(on_field(key, value) for key, value in fields.items())
 
-def send_message(clients, messages, blog_file=open("blog.txt", "a", encoding='utf-8'), user_input="", tools=None, tool_results=None, temperature=1.3, mode=0, stream_handler=None):
+def _cached_response(messages, mode, stream_handler, cached):
+    """按各mode原本的返回形式给出缓存结果"""
+    if mode == 0:
+        return cached, messages
+    if mode == 1:
+        return cached, messages.append({"role": "assistant", "content": cached.content})
+    stream_handler.stream_received.emit(cached)
+    return cached, messages.append({"role": "assistant", "content": cached})
+
+async def _send(clients, messages, user_input, tools, tool_results, temperature, mode, stream_handler, use_cache=True, on_field=None, on_tool_call=None):
+    if mode not in (0, 1) and not stream_handler:
+        raise ValueError("流式模式需要提供stream_handler")
+    check_cancelled()
+    model_name = clients[0]
+    with tracer.span("send_message", "llm", model=model_name, mode=mode) as span:
+        messages = Conversation.of(messages)
+        if not tool_results:
+            logger.log("user", user_input, model=model_name)
+            messages = messages.append({"role": "user", "content": user_input})
+        else:
+            logger.log("tool", tool_results, model=model_name)
+            messages = messages.extend(
+                {"role": "tool", "tool_call_id": tool_r["tool_call_id"], "content": tool_r["content"]} for tool_r in tool_results
+            )
+
+        cache_key = None
+        if use_cache and response_cache.cacheable(mode):
+            cache_key = response_cache.key(clients[0], messages.to_wire(), tools, temperature, mode)
+            cached = response_cache.get(cache_key, mode)
+            if cached is not None:
+                span.set(cached=True)
+                logger.log("assistant", _log_content(cached), model=model_name, mode=mode, latency=0.0, cached=True)
+                return _cached_response(messages, mode, stream_handler, cached)
+            # 提前结束的结果单独缓存，只有on_field在同样的字段内要求停止时才复用
+            partial = response_cache.get(cache_key + ":partial", mode) if on_field else None
+            if partial is not None and _replay_fields(partial, on_field):
+                span.set(cached=True, short_circuit=True)
+                logger.log("assistant", _log_content(partial), model=model_name, mode=mode, latency=0.0,
+                           cached=True, short_circuit=True)
+                return partial, messages
+
+        start = time.perf_counter()
+        complete = True
+        if mode == 0:
+            response, complete = await _json_response(clients, messages, temperature, on_field)
+            if not complete:
+                span.set(short_circuit=True)
+            if cache_key and "error" not in response:
+                response_cache.put(cache_key if complete else cache_key + ":partial", mode, response)
+        elif mode == 1 and tools and on_tool_call:
+            response, messages = await _stream_tool_response(clients, messages, tools, temperature, on_tool_call)
+            if cache_key:
+                response_cache.put(cache_key, mode, response)
+        elif mode == 1:
+            response, messages = await _direct_response(clients, messages, tools, temperature)
+            if cache_key:
+                response_cache.put(cache_key, mode, response)
+        else:
+            response, messages = await _stream_response(clients, messages, stream_handler)
+            if cache_key:
+                response_cache.put(cache_key, mode, response)
+        extra = {} if complete else {"short_circuit": True}
+        logger.log("assistant", _log_content(response), model=model_name, mode=mode, latency=round(time.perf_counter() - start, 3), **extra)
+        return response, messages
+
+async def async_send_message(clients, messages, user_input="", tools=None, tool_results=None, temperature=1.3, mode=0, stream_handler=None, use_cache=True, on_field=None, on_tool_call=None):
+    """
+    send_message的异步版本，参数与返回值相同。
+    可在任意事件循环中await，实际请求总在传输层的共享事件循环上执行。
+    """
+    coro = _send(clients, messages, user_input, tools, tool_results, temperature, mode, stream_handler, use_cache, on_field, on_tool_call)
+    if transport.in_loop():
+        return await coro
+    return await asyncio.wrap_future(transport.submit(coro))
+
+def send_message(clients, messages, user_input="", tools=None, tool_results=None, temperature=1.3, mode=0, stream_handler=None, use_cache=True, on_field=None, on_tool_call=None):
     """
     发送讯息
     clients: 模型，结构为(model_name, client)
-    messages: 历史信息
-    blog_file: 日志
+    messages: 历史信息，列表或Conversation；返回的messages为追加了本次消息的新Conversation，传入的历史不会被修改
     user_input: 发送的信息
     tools: 工具合集
     tool_result: 工具返回的结果
     temperature=0.3: 温度
     mode=0,1,2: mode=0 json输出, mode=1 直接输出, mode=2 流式输出
+    use_cache: 为False时绕过响应缓存（缓存开启时才有意义）
+    on_field: 仅mode=0，流式接收并增量解析JSON，顶层字段一完整就回调on_field(key, value)（在传输层线程中执行，需尽快返回）；
+        回调返回True时立即停止生成，返回的字典只含已完整的字段；这样的结果单独缓存，
+        命中时把缓存的字段依次交给on_field，只有它在这些字段内同样要求停止才复用
+    on_tool_call: 仅mode=1且带tools时，改为流式请求，每个工具调用的参数一完整就以该调用回调（同样在传输层线程中执行）；
+        命中缓存时不会回调，调用方需自行执行未回调过的调用
     """
-    current_time = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-    blog_file.write("\n" + current_time + ":\n")
-    if not tool_results:
-        blog_file.write("<user> " + user_input + '\n')
-        messages.append({"role": "user", "content": user_input})
-    else:
-        blog_file.write("<tool> " + str(tool_results) + '\n')
-        for tool_r in tool_results:
-            messages.append({"role": "tool", "tool_call_id": tool_r["tool_call_id"], "content": tool_r["content"]})
-    if mode == 0:
-        response = json_response(clients, messages, blog_file, temperature)
-    elif mode == 1:
-        response, messages = direct_response(clients, messages, blog_file, tools, temperature)
-    else:
-        if not stream_handler:
-            raise ValueError("流式模式需要提供stream_handler")
-        return stream_response(clients, messages, stream_handler, blog_file)
-    print("message:---------------------------")
-    print(messages)
-    print("response:-------------------------------")
-    print(response)
-    return response, messages
+    return transport.run(_send(clients, messages, user_input, tools, tool_results, temperature, mode, stream_handler, use_cache, on_field, on_tool_call))
 
 def message_initial(prompt):
     """
@@ -161,5 +787,5 @@ def message_initial(prompt):
     messages = [
             {"role": "system", "content": prompt},
         ]
-    
-    return messages
\ No newline at end of file
+
+    return messages
@@ -1,28 +1,57 @@
 from typing import List, Dict, Tuple
+import contextvars
 import json
+import os
+import queue
+import uuid
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
 from openai import OpenAI
 from core.agent import send_message, message_initial
-from datetime import datetime
+from core.models import router
+from core.logger import logger, task_id_var, step_var
 from core.manager_agent import ManagerAgent
-from core.safe import task_checker
+from core.context import ContextManager, fit_results
+from core.conversation import Conversation
+from core.safe import task_checker, safety_engine
+from core.cancel import CancelToken, cancel_var, check_cancelled
+from core.trace import tracer
+
 
 class TaskAnalyzer:
-    def __init__(self, llm_client: OpenAI, log_callback=None, stream_handler=None):
-        """初始化分析器，复用agent.py的日志系统"""
+    def __init__(self, llm_client: OpenAI, log_callback=None, stream_handler=None, pipeline=None, planner=None, graph_workers=4, fused=None):
+        """
+        初始化分析器，复用agent.py的日志系统
+        pipeline: 流水线模式，规划与安全检查重叠、工具结果返回后预先规划下一步；默认读取环境变量TASK_PIPELINE
+        planner: "step"逐步规划，"graph"一次规划出步骤依赖图并发执行；默认读取环境变量TASK_PLANNER
+        graph_workers: 依赖图模式下并发执行的ManagerAgent数量
+        fused: 合并调用模式，一次调用同时给出下一步、安全判定和是否需要新工具，结果不合法时退回分步调用；默认读取环境变量TASK_FUSED
+        """
         self.llm = llm_client
-        self.blog_file = open("blogs/blog.txt", "a", encoding="utf-8")
         self.task_history = []  # 新增：记录任务执行历史
         self.log_callback = log_callback
         self.trail = 2
         self.stream_handler = stream_handler
+        self.pipeline = os.getenv("TASK_PIPELINE") == "1" if pipeline is None else pipeline
+        self.planner = planner or os.getenv("TASK_PLANNER", "step")
+        self.graph_workers = graph_workers
+        self.fused = os.getenv("TASK_FUSED") == "1" if fused is None else fused
 
     def _log_step(self, message: str):
-        """复用agent.py的日志格式"""
-        timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-        self.blog_file.write(f"\n{timestamp}:\n<system> {message}\n")
+        """写入结构化日志"""
+        logger.log("system", message)
 
-    def analyze_and_execute(self, complex_task: str, log_callback=None, stream_handler=None):
+    def analyze_and_execute(self, complex_task: str, log_callback=None, stream_handler=None, task_id=None):
         """分步执行：动态规划下一步 -> 执行子任务 -> 汇总结果"""
+        # 为本次任务分配id（可由调用方指定），期间的日志和追踪都会带上它
+        task_token, step_token = task_id_var.set(task_id or uuid.uuid4().hex[:12]), step_var.set(None)
+        try:
+            with tracer.span("task", task=complex_task[:100]):
+                return self._analyze_and_execute(complex_task, log_callback, stream_handler)
+        finally:
+            task_id_var.reset(task_token)
+            step_var.reset(step_token)
+
+    def _analyze_and_execute(self, complex_task: str, log_callback=None, stream_handler=None):
         def log(message):
             if log_callback:
                 log_callback(message)
@@ -36,66 +65,220 @@ class TaskAnalyzer:
             return err
         else:
             log(f"[TASK] 开始处理复杂任务: {complex_task}")
-            results = []
-            manager = ManagerAgent(self.llm, log, self.stream_handler or stream_handler)
-            messages = message_initial("系统正在处理复杂任务")
         
-        # 动态规划执行流程
-        while True:
-            log(f"开始规划下一步任务")
-            # 步骤1：规划下一步任务
-
-            trail = self.trail
-            next_task = self._plan_next_step(complex_task, messages)
-            if next_task:
-                log(f"[NEXT STEP] 预测步骤为：{next_task['description'][:100]}...")
-                log(f"[CHECK] 开始进行子任务安全检查")
-                safe, err = self.safe_check(f"{next_task['description'][:100]}")
-            while (next_task is None or not safe) and trail:
-                next_task = self._plan_next_step(complex_task, messages)
-                if next_task:
-                    log(f"[NEXT STEP] 预测步骤为：{next_task['description'][:100]}...")
-                    log(f"[CHECK] 开始进行子任务安全检查")
-                    safe, err = self.safe_check(f"{next_task['description'][:100]}")
-                trail -= 1
-            if next_task is None or not safe:
-                err = f"连续预测下一步骤{self.trail+1}次返回空或不安全，终止该任务"
-                log(err)
-                return err
-                
-            if next_task["step_num"] == "-1":  # 终止条件
-                log(f"准备结束")
-                break
-                    
-            # 步骤2：执行子任务
-            log(f"执行步骤 {next_task['step_num']}: {next_task['description'][:50]}...")
-            result, new_messages = self._execute_subtask(next_task["description"], complex_task, manager, messages)
-            
-            # 更新上下文
-            messages += new_messages
-            results.append({
-                "step": next_task["step_num"],
-                "description": next_task["description"],
-                "result": result.content if hasattr(result, 'content') else str(result)
-            })
-            self.task_history.append(next_task["description"])  # 记录历史
+        graph = None
+        if self.planner == "graph":
+            graph = self._plan_graph(complex_task)
+            if graph:
+                log(f"[GRAPH] 规划得到{len(graph)}个步骤的依赖图")
+            else:
+                log("[GRAPH] 依赖图规划失败，改用逐步规划")
+        if graph:
+            # 依赖图模式：一次规划出全部步骤，按依赖关系并发执行
+            results, err = self._run_graph(complex_task, graph, log)
+            fitted = fit_results(results)
+        else:
+            # 动态规划执行流程
+            manager = ManagerAgent(self.llm, log, self.stream_handler or stream_handler)
+            context = ContextManager(self.llm, "系统正在处理复杂任务")
+            results, err = self._run_steps(complex_task, manager, context, log)
+            fitted = context.fit_results(results)
+        if err:
+            return err
 
         # 步骤3：汇总结果
         log("[CONC] 开始汇总最终结果")
-        final_result = self._summarize_results(complex_task, results)
+        final_result = self._summarize_results(complex_task, fitted)
         
         # 正确处理final_result的长度检查
         result_content = final_result.content if hasattr(final_result, 'content') else str(final_result)
-        self.blog_file.write(f"<system> 任务完成，结果长度: {len(result_content)}\n")
+        logger.log("system", "任务完成", result_length=len(result_content))
         return result_content
 
-    def _plan_next_step(self, task: str, messages: List[Dict]) -> Dict:
-        """智能规划下一步任务，考虑历史记录和当前上下文"""
+    def _run_steps(self, complex_task: str, manager: ManagerAgent, context: ContextManager, log):
+        """逐步规划执行，返回(results, err)；规划和执行只拿到上下文管理器按预算裁剪后的消息"""
+        results = []
+        executor = ThreadPoolExecutor(max_workers=4) if self.pipeline else None
+        planned = None  # 流水线模式下预先规划好的下一步
+        try:
+            while True:
+                check_cancelled()
+                log(f"开始规划下一步任务")
+                # 步骤1：规划下一步任务
+                next_task, safe = self._next_step(complex_task, context.view("planner"), log, planned, manager)
+                planned = None
+                if next_task is None or not safe:
+                    err = f"连续预测下一步骤{self.trail+1}次返回空或不安全，终止该任务"
+                    log(err)
+                    return results, err
+
+                if next_task["step_num"] == "-1":  # 终止条件
+                    log(f"准备结束")
+                    break
+
+                # 步骤2：执行子任务，流水线模式下工具结果一返回就预先规划下一步
+                speculative = {}
+                if executor:
+                    history = self.task_history + [next_task["description"]]
+
+                    def speculate(turns, view=context.view("planner"), history=history):
+                        if "future" not in speculative:
+                            speculative["future"] = executor.submit(
+                                contextvars.copy_context().run, self._plan_step, complex_task, view + turns, lambda message: None, history, manager
+                            )
+                    manager.on_tool_results = speculate
+
+                step_var.set(next_task["step_num"])
+                log(f"执行步骤 {next_task['step_num']}: {next_task['description'][:50]}...")
+                try:
+                    result, new_messages = self._execute_subtask(
+                        next_task["description"], complex_task, manager, context.view("executor"),
+                        next_task.get("need_new_tool")
+                    )
+                finally:
+                    manager.on_tool_results = None
+
+                if result is False:
+                    # 当前步骤失败，丢弃基于它的预规划
+                    log(f"[STEP FAILED] {new_messages}")
+                    if "future" in speculative:
+                        speculative["future"].cancel()
+                        log(f"[PIPELINE] 丢弃预规划的下一步")
+                    new_messages = []
+                elif "future" in speculative:
+                    planned = speculative["future"]
+
+                # 更新上下文：只加入本步骤新增的消息，超出预算时压缩较早的步骤
+                context.add_step(new_messages)
+                results.append({
+                    "step": next_task["step_num"],
+                    "description": next_task["description"],
+                    "result": result.content if hasattr(result, 'content') else str(result)
+                })
+                self.task_history.append(next_task["description"])  # 记录历史
+        finally:
+            if executor:
+                executor.shutdown(wait=False, cancel_futures=True)
+        return results, None
+
+    @tracer.traced("next_step")
+    def _next_step(self, complex_task: str, messages: List[Dict], log, planned=None, manager=None):
+        """规划下一步并通过安全检查，失败时重试，返回(next_task, safe)"""
+        if planned is not None:
+            next_task, safe, err = planned.result()
+            if next_task:
+                log(f"[PIPELINE] 采用预规划的下一步")
+                log(f"[NEXT STEP] 预测步骤为：{next_task.get('description', '')[:100]}...")
+        else:
+            next_task, safe, err = self._plan_step(complex_task, messages, log, manager=manager)
+        trail = self.trail
+        while (next_task is None or not safe) and trail:
+            next_task, safe, err = self._plan_step(complex_task, messages, log, manager=manager)
+            tracer.retry()
+            trail -= 1
+        return next_task, safe
+
+    def _plan_step(self, complex_task: str, messages: List[Dict], log, history=None, manager=None):
+        """
+        规划一步并做安全检查，返回(next_task, safe, err)
+        规划结果以流式JSON增量解析：step_num为-1或step_num和description都已完整时即停止生成（rationale不再等待），随后做安全检查；
+        合并调用模式下先尝试_plan_fused，结果不合法时再走规划+安全检查两次调用
+        """
+        if self.fused and manager is not None:
+            fused = self._plan_fused(complex_task, messages, log, manager, history)
+            if fused is not None:
+                return fused
+            log("[FUSED] 合并调用的结果不合法，改用分步调用")
+        seen = set()
+
+        def on_field(key, value):
+            seen.add(key)
+            if key == "step_num" and value == "-1":
+                return True
+            return {"step_num", "description"} <= seen
+
+        next_task = self._plan_next_step(complex_task, messages, history, on_field)
+        if not next_task:
+            return next_task, False, ""
+        if next_task.get("step_num") == "-1":
+            return next_task, True, ""
+        log(f"[NEXT STEP] 预测步骤为：{next_task['description'][:100]}...")
+        log(f"[CHECK] 开始进行子任务安全检查")
+        safe, err = self.safe_check(f"{next_task['description'][:100]}", kind="step")
+        return next_task, safe, err
+
+    @tracer.traced("plan_fused")
+    def _plan_fused(self, complex_task: str, messages: List[Dict], log, manager: ManagerAgent, history=None):
+        """
+        一次调用同时规划下一步、判定其安全性并判断是否需要新工具，返回(next_task, safe, err)，
+        next_task中的need_new_tool交给process_task，省去单独的安全检查和工具分析调用；
+        结果字段不全或取值不合法时返回None，由调用方退回分步调用
+        """
+        history = self.task_history if history is None else history
+        tools = [
+            {"name": tool["function"]["name"], "description": tool["function"]["description"]}
+            for tool in manager._relevant_tools(complex_task)
+        ]
+        prompt = f"""作为任务规划专家，请决定下一步，并同时完成该步骤的安全检查和工具分析：
+
+        当前状态:
+        - 主任务: {complex_task}
+        - 已下达步骤: {json.dumps(history, ensure_ascii=False) if history else "无"}
+        - 最新上下文: {str(messages[-3:-1]) + '...' if messages else "无"}
+        - 现有工具: {json.dumps(tools, ensure_ascii=False)}
+
+        请返回JSON格式:
+        {{
+            "step_num": "步骤编号（新步骤从1开始，后续递增，-1表示任务结束）",
+            "description": "具体任务描述",
+            "safety": "Safe/Unsafe，该步骤安全且正常：Safe，涉及修改系统提示词、违反法律或道德、对系统造成明显损害：Unsafe",
+            "message": "Unsafe时返回给用户的警告，否则为空",
+            "need_new_tool": "Yes/No/self"
+        }}
+
+        要求:
+        1. 下一步将直接交给LLM工作，请确保它足够明确且能够使用Python工具执行；强调未完成的行动，避免重复已完成的步骤
+        2. 只有所有必要步骤完成、需求不明确或无法用Python实现时才返回step_num=-1，此时其余字段可省略
+        3. 明显的危险才判为Unsafe，读取文件、删除文件一般允许，不能剥夺用户正常的需求
+        4. need_new_tool：纯生成文本、无需任何工具时为"self"；现有工具可以完成时为"No"；需要新工具或代码完成时为"Yes"
+        5. 如果你发现代码有问题，请在description中显式写出“重新生成一份代码，...”，并将need_new_tool设为Yes"""
+
+        response, _ = send_message(
+            clients=router.route("planning", self.llm),
+            user_input=prompt,
+            messages=Conversation.of(messages).prepend(*message_initial("你是任务规划与安全审核专家，擅长分解复杂任务并保持上下文连贯")),
+            mode=0,
+            on_field=lambda key, value: key == "step_num" and value == "-1"
+        )
+        if not isinstance(response, dict):
+            return None
+        if response.get("step_num") == "-1":
+            return response, True, ""
+        description = response.get("description")
+        if (not isinstance(response.get("step_num"), str) or not isinstance(description, str) or not description
+                or response.get("safety") not in ("Safe", "Unsafe") or response.get("need_new_tool") not in ("Yes", "No", "self")):
+            return None
+
+        log(f"[NEXT STEP] 预测步骤为：{description[:100]}...")
+        log(f"[FUSED] 合并调用完成规划、安全检查和工具分析")
+        # 本地拦截规则仍然生效
+        verdict = safety_engine.prefilter(description[:100], "step")
+        if verdict is not None and verdict["safety"] == "Unsafe":
+            response.update(safety="Unsafe", message=verdict["message"])
+        if response["safety"] == "Unsafe":
+            self._log_step(str(response))
+            return response, False, f"任务未能通过安全检查：{response.get('message') or '内容未通过安全检查'}"
+        return response, True, "通过安全检查"
+
+    @tracer.traced("plan_next_step")
+    def _plan_next_step(self, task: str, messages: List[Dict], history=None, on_field=None) -> Dict:
+        """智能规划下一步任务，考虑历史记录和当前上下文；on_field见send_message"""
+        history = self.task_history if history is None else history
         prompt = f"""作为任务规划专家，你需要根据以下信息决定下一步：
         
         当前状态:
         - 主任务: {task}
-        - 已下达步骤: {json.dumps(self.task_history, ensure_ascii=False) if self.task_history else "无"}
+        - 已下达步骤: {json.dumps(history, ensure_ascii=False) if history else "无"}
         - 最新上下文: {str(messages[-3:-1]) + '...' if messages else "无"}
         
         请分析并返回JSON格式的下一步计划，你需要仔细观察历史消息确保没有遗漏步骤和已完成步骤:
@@ -124,18 +307,160 @@ class TaskAnalyzer:
         }}"""
         
         response, _ = send_message(
-            clients=("deepseek-chat", self.llm),
+            clients=router.route("planning", self.llm),
             user_input=prompt,
-            messages=message_initial("你是高级任务规划专家，擅长分解复杂任务并保持上下文连贯") + messages,
-            mode=0  # JSON模式
+            messages=Conversation.of(messages).prepend(*message_initial("你是高级任务规划专家，擅长分解复杂任务并保持上下文连贯")),
+            mode=0,  # JSON模式
+            on_field=on_field
         )
         return response
 
-    def _execute_subtask(self, subtask: str,complex_task: str, manager: ManagerAgent, messages: List[Dict]):
-        """执行子任务并返回结果和更新后的消息"""
+    @tracer.traced("plan_graph")
+    def _plan_graph(self, task: str, max_steps=8):
+        """一次规划出全部步骤及其依赖关系，返回按拓扑序排列的步骤列表，失败返回None"""
+        prompt = f"""作为任务规划专家，请把主任务分解为若干步骤，并给出步骤之间的依赖关系：
+
+        主任务: {task}
+
+        请返回JSON格式的步骤图:
+        {{
+            "steps": [
+                {{"id": "步骤编号，从1开始", "description": "具体任务描述", "depends_on": ["所依赖步骤的编号"]}}
+            ]
+        }}
+
+        要求:
+        1. 每个步骤将直接交给LLM工作，请确保它足够明确且能够使用Python工具执行，避免不必要或无意义的步骤
+        2. 只有需要用到其他步骤的结果时才写入depends_on，互不相关的步骤不要相互依赖，以便并行执行
+        3. depends_on只能引用存在的步骤编号，不能形成循环依赖
+        4. 步骤数尽量少，不超过{max_steps}个
+
+        示例:
+        输入: 主任务"分别统计A.txt、B.txt的行数并比较"
+        应返回: {{
+            "steps": [
+                {{"id": "1", "description": "统计A.txt的行数", "depends_on": []}},
+                {{"id": "2", "description": "统计B.txt的行数", "depends_on": []}},
+                {{"id": "3", "description": "比较A.txt与B.txt的行数", "depends_on": ["1", "2"]}}
+            ]
+        }}"""
+
+        response, _ = send_message(
+            clients=router.route("planning", self.llm),
+            user_input=prompt,
+            messages=message_initial("你是高级任务规划专家，擅长分解复杂任务并找出可以并行的步骤"),
+            mode=0
+        )
+        return self._order_graph(response.get("steps") if isinstance(response, dict) else None, max_steps)
+
+    @staticmethod
+    def _order_graph(steps, max_steps):
+        """校验步骤图并按拓扑序排列，格式不合法或有环时返回None"""
+        if not isinstance(steps, list) or not 0 < len(steps) <= max_steps:
+            return None
+        nodes = {}
+        for step in steps:
+            if not isinstance(step, dict) or not step.get("description"):
+                return None
+            step_id = str(step.get("id"))
+            depends_on = step.get("depends_on") or []
+            if step_id in nodes or not isinstance(depends_on, list):
+                return None
+            nodes[step_id] = {"id": step_id, "description": step["description"], "depends_on": [str(d) for d in depends_on]}
+        if any(d not in nodes or d == node["id"] for node in nodes.values() for d in node["depends_on"]):
+            return None
+
+        ordered, done = [], set()
+        while len(ordered) < len(nodes):
+            ready = [n for n in nodes.values() if n["id"] not in done and all(d in done for d in n["depends_on"])]
+            if not ready:
+                return None  # 存在循环依赖
+            for node in ready:
+                ordered.append(node)
+                done.add(node["id"])
+        return ordered
+
+    def _run_graph(self, complex_task: str, graph: List[Dict], log):
+        """
+        按依赖关系并发执行步骤图，返回(results, err)
+        每个就绪步骤从ManagerAgent池中取一个实例执行，各自使用独立的消息上下文，依赖步骤的结果作为上下文传入
+        某个步骤未通过安全检查（或出错）时取消整张图：正在执行的步骤在下一个检查点退出，不再等待它们结束
+        """
+        managers = queue.Queue()
+        for _ in range(self.graph_workers):
+            managers.put(ManagerAgent(self.llm, log))
+        outputs, failed = {}, set()
+        graph_token = CancelToken(parent=cancel_var.get())
+
+        def run_node(node):
+            cancel_var.set(graph_token)
+            check_cancelled()
+            step_var.set(node["id"])
+            with tracer.span("step", step=node["id"]):
+                safe, err = self.safe_check(node["description"][:100], kind="step")
+                if not safe:
+                    return False, err
+                context = message_initial("系统正在处理复杂任务") + [
+                    {"role": "assistant", "content": f"步骤{d}（{graph_by_id[d]['description']}）的结果：{outputs[d]}"}
+                    for d in node["depends_on"]
+                ]
+                manager = managers.get()
+                try:
+                    result, _ = manager.process_task(node["description"], complex_task, context)
+                finally:
+                    managers.put(manager)
+                if result is False:
+                    return None, _
+                return True, result.content if hasattr(result, 'content') else str(result)
+
+        graph_by_id = {node["id"]: node for node in graph}
+        pending = list(graph)
+        running = {}
+        executor = ThreadPoolExecutor(max_workers=self.graph_workers)
+        try:
+            while pending or running:
+                for node in list(pending):
+                    if any(d in failed for d in node["depends_on"]):
+                        # 依赖失败的步骤直接跳过
+                        pending.remove(node)
+                        failed.add(node["id"])
+                        outputs[node["id"]] = "依赖的步骤执行失败，已跳过"
+                        log(f"[GRAPH] 跳过步骤 {node['id']}: 依赖的步骤执行失败")
+                    elif all(d in outputs and d not in failed for d in node["depends_on"]):
+                        pending.remove(node)
+                        log(f"执行步骤 {node['id']}: {node['description'][:50]}...")
+                        running[executor.submit(contextvars.copy_context().run, run_node, node)] = node
+                if not running:
+                    break
+                finished, _ = wait(running, return_when=FIRST_COMPLETED)
+                for future in finished:
+                    node = running.pop(future)
+                    status, output = future.result()
+                    if status is False:
+                        log(output)
+                        return [], f"步骤{node['id']}未能通过安全检查，终止该任务"
+                    if status is None:
+                        failed.add(node["id"])
+                        log(f"[STEP FAILED] 步骤 {node['id']}: {output}")
+                    outputs[node["id"]] = output
+        finally:
+            if running:
+                graph_token.cancel()
+            executor.shutdown(wait=False, cancel_futures=True)
+
+        results = []
+        for node in graph:
+            results.append({"step": node["id"], "description": node["description"], "result": outputs.get(node["id"], "")})
+            self.task_history.append(node["description"])
+        return results, None
+
+    def _execute_subtask(self, subtask: str,complex_task: str, manager: ManagerAgent, messages: List[Dict], need_new_tool=None):
+        """执行子任务并返回结果和本步骤新增的消息；need_new_tool为合并调用已给出的判断"""
         manager.stream_handler = self.stream_handler
-        return manager.process_task(subtask, complex_task, messages)
+        with tracer.span("step", step=step_var.get()):
+            return manager.process_task(subtask, complex_task, messages, need_new_tool)
 
+    @tracer.traced("summarize")
     def _summarize_results(self, original_task: str, results: List[Dict]) -> str:
         """汇总结果并生成最终报告"""
         prompt = f"""请整合任务执行结果：
@@ -151,7 +476,7 @@ class TaskAnalyzer:
         4. 如果是其他类型任务，可自由发挥，但尽量简短"""
         
         response, _ = send_message(
-            clients=("deepseek-chat", self.llm),
+            clients=router.route("summary", self.llm),
             user_input=prompt,
             messages=message_initial("你是高级报告生成专家"),
             mode=2 if self.stream_handler else 1,  # 自动切换模式
@@ -159,11 +484,13 @@ class TaskAnalyzer:
         )
         return response.content if hasattr(response, 'content') else str(response)
 
-    def safe_check(self, task):
-        safe_response = task_checker(self.llm, task)
+    @tracer.traced("safe_check")
+    def safe_check(self, task, kind="task"):
+        safe_response = task_checker(self.llm, task, kind)
         trail = self.trail
         while safe_response is None and trail:
-            safe_response = task_checker(self.llm, task)
+            safe_response = task_checker(self.llm, task, kind)
+            tracer.retry()
             trail -= 1
         if safe_response is None:
             err = f"安全检查连续{self.trail+1}次返回空，终止该任务"
@@ -175,14 +502,10 @@ class TaskAnalyzer:
         return True, "通过安全检查"
         
     
+    @staticmethod
     def runner(complex_task):
-        from dotenv import load_dotenv
-        import os
-        load_dotenv()
-
-        client = OpenAI(
-            api_key=os.getenv("DEEPSEEK_API_KEY"),
-            base_url="https://api.deepseek.com"
-        )
+        """无界面执行单个任务；批量执行见core/batch.py"""
+        from core.agent import client_maker
+        _, client = client_maker()  # 进程内共享的客户端
         analyzer = TaskAnalyzer(client)
-        print("执行结果:", analyzer.analyze_and_execute(complex_task))
\ No newline at end of file
+        print("执行结果:", analyzer.analyze_and_execute(complex_task))
@@ -0,0 +1,156 @@
+"""
+无界面的批量执行：从JSONL文件（或标准输入）读取任务，多线程并发执行，
+每完成一个任务就向输出写一行JSON（结果和耗时、LLM调用次数、token用量等指标）
+
+    python main.py --batch tasks.jsonl --workers 8 --rate 5 --output results.jsonl
+    cat tasks.jsonl | python main.py --batch - > results.jsonl
+
+每行可以是字符串，或含task字段（也可用title/body，如requests.jsonl）的对象；id取id或request_id字段，缺省为行号。
+"""
+import json
+import statistics
+import sys
+import threading
+import time
+import uuid
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from typing import Dict, List
+
+from core.agent import client_maker, transport
+from core.models import router
+from core.analyze import TaskAnalyzer
+from core.trace import tracer
+
+
+def load_tasks(path: str) -> List[Dict]:
+    """读取任务文件，path为"-"时从标准输入读取"""
+    f = sys.stdin if path == "-" else open(path, "r", encoding="utf-8")
+    tasks = []
+    try:
+        for number, line in enumerate(f, 1):
+            line = line.strip()
+            if not line:
+                continue
+            item = json.loads(line)
+            if isinstance(item, str):
+                item = {"task": item}
+            task = item.get("task") or "\n".join(part for part in (item.get("title"), item.get("body")) if part)
+            if not task:
+                raise ValueError(f"第{number}行没有task、title或body字段")
+            tasks.append({"id": str(item.get("id") or item.get("request_id") or number), "task": task})
+    finally:
+        if f is not sys.stdin:
+            f.close()
+    return tasks
+
+
+class _Metrics:
+    """按trace_id汇总每个任务的span指标"""
+    FIELDS = ("steps", "llm_calls", "tool_calls", "prompt_tokens", "completion_tokens", "cached_tokens", "retries")
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._traces = defaultdict(lambda: defaultdict(int))
+
+    def __call__(self, record: dict):
+        with self._lock:
+            metrics = self._traces[record["trace_id"]]
+            if record["kind"] == "llm":
+                metrics["llm_calls"] += 1
+                metrics["prompt_tokens"] += record["prompt_tokens"]
+                metrics["completion_tokens"] += record["completion_tokens"]
+                metrics["cached_tokens"] += record["cached_tokens"]
+            elif record["kind"] == "tool":
+                metrics["tool_calls"] += 1
+            if record["name"] == "step":
+                metrics["steps"] += 1
+            metrics["retries"] += record["retries"]
+
+    def pop(self, trace_id: str) -> dict:
+        with self._lock:
+            metrics = self._traces.pop(trace_id, {})
+        return {field: metrics.get(field, 0) for field in self.FIELDS}
+
+
+class BatchRunner:
+    """
+    并发执行一批任务
+    workers: 同时执行的任务数；rate: 全局每秒LLM请求上限（0为不限），作用于进程内的全部请求
+    verbose: 把各任务的过程日志（带任务id前缀）输出到标准错误
+    """
+    def __init__(self, llm_client=None, workers=4, rate=0.0, pipeline=None, planner=None, verbose=False):
+        self.llm = llm_client or client_maker()[1]
+        self.workers = max(1, workers)
+        self.pipeline = pipeline
+        self.planner = planner
+        self.verbose = verbose
+        if rate:
+            transport.set_rate_limit(rate)
+        self._metrics = _Metrics()
+
+    def _run_one(self, item: Dict) -> Dict:
+        task_id = uuid.uuid4().hex[:12]
+        log = (lambda message: print(f"[{item['id']}] {message}", file=sys.stderr, flush=True)) if self.verbose else None
+        analyzer = TaskAnalyzer(self.llm, pipeline=self.pipeline, planner=self.planner)
+        record = {"id": item["id"], "task_id": task_id, "status": "ok", "result": None}
+        start = time.perf_counter()
+        try:
+            record["result"] = analyzer.analyze_and_execute(item["task"], log_callback=log, task_id=task_id)
+        except Exception as e:
+            record.update(status="error", error=f"{type(e).__name__}: {e}")
+        record["wall"] = round(time.perf_counter() - start, 3)
+        record.update(self._metrics.pop(task_id))
+        return record
+
+    def run(self, tasks: List[Dict], output=None) -> Dict:
+        """执行全部任务，完成一个写出一行；返回汇总统计"""
+        output = output or sys.stdout
+        walls, errors = [], 0
+        tracer.add_listener(self._metrics)
+        start = time.perf_counter()
+        try:
+            with ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="batch") as executor:
+                futures = [executor.submit(self._run_one, item) for item in tasks]
+                try:
+                    for future in as_completed(futures):
+                        record = future.result()
+                        walls.append(record["wall"])
+                        errors += record["status"] != "ok"
+                        output.write(json.dumps(record, ensure_ascii=False) + "\n")
+                        output.flush()
+                except KeyboardInterrupt:
+                    # 尚未开始的任务不再执行，已在执行的任务跑完后退出
+                    executor.shutdown(wait=False, cancel_futures=True)
+                    raise
+        finally:
+            tracer.remove_listener(self._metrics)
+        total = time.perf_counter() - start
+        return {
+            "tasks": len(walls),
+            "errors": errors,
+            "total_wall": round(total, 3),
+            "tasks_per_minute": round(len(walls) / total * 60, 2) if total else 0.0,
+            "wall_p50": round(statistics.median(walls), 3) if walls else 0.0,
+            "wall_max": round(max(walls), 3) if walls else 0.0,
+            "governor": transport.governor.metrics(),
+            "models": router.metrics(),
+        }
+
+
+def main(args):
+    """命令行入口，参数见main.py"""
+    tasks = load_tasks(args.batch)
+    runner = BatchRunner(workers=args.workers, rate=args.rate, verbose=args.verbose)
+    output = open(args.output, "w", encoding="utf-8") if args.output and args.output != "-" else sys.stdout
+    try:
+        summary = runner.run(tasks, output)
+    finally:
+        if output is not sys.stdout:
+            output.close()
+    print(f"[BATCH] 完成{summary['tasks']}个任务，失败{summary['errors']}个，总耗时{summary['total_wall']}s，"
+          f"每分钟{summary['tasks_per_minute']}个，单任务耗时中位数{summary['wall_p50']}s", file=sys.stderr)
+    governor = summary["governor"]
+    print(f"[BATCH] LLM请求{governor['requests']}次，重试{governor['retries']}次，放弃{governor['giveups']}次，"
+          f"限速排队共{governor['wait_total']}s，熔断{governor['breaker_opens']}次", file=sys.stderr)
+    return 1 if summary["errors"] else 0
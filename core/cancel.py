@@ -0,0 +1,35 @@
+import contextvars
+import threading
+
+
+class TaskCancelled(BaseException):
+    """
+    任务被取消
+    与asyncio.CancelledError一样继承BaseException，不会被重试逻辑中的except Exception吞掉，
+    一路传播到analyze_and_execute的调用方。
+    """
+
+
+# 当前任务的取消标志，由调用方（如HTTP服务的worker）设置；线程池中需通过contextvars.copy_context()传递
+cancel_var = contextvars.ContextVar("cancel", default=None)
+
+
+class CancelToken:
+    """parent为上级任务的取消标志，上级取消时本标志同样视为已取消"""
+    def __init__(self, parent=None):
+        self._event = threading.Event()
+        self.parent = parent
+
+    def cancel(self):
+        self._event.set()
+
+    @property
+    def cancelled(self):
+        return self._event.is_set() or (self.parent is not None and self.parent.cancelled)
+
+
+def check_cancelled():
+    """协作式取消的检查点：当前任务已被取消时抛出TaskCancelled"""
+    token = cancel_var.get()
+    if token is not None and token.cancelled:
+        raise TaskCancelled()
@@ -0,0 +1,117 @@
+import gzip
+import hashlib
+import json
+import os
+import threading
+from collections import defaultdict, deque
+
+from openai.types.chat import ChatCompletion, ChatCompletionChunk
+
+# 参与匹配的请求参数，stream_options等只影响传输细节的参数不计入
+_KEY_FIELDS = ("messages", "tools", "tool_choice", "response_format", "temperature")
+
+
+class CassetteMiss(KeyError):
+    pass
+
+
+def _plain(value):
+    if hasattr(value, "model_dump"):
+        return value.model_dump(exclude_none=True)
+    if isinstance(value, dict):
+        return {k: _plain(v) for k, v in value.items() if v is not None}
+    if isinstance(value, (list, tuple)):
+        return [_plain(v) for v in value]
+    return value
+
+
+def request_key(model_name: str, stream: bool, kwargs: dict) -> str:
+    """请求的内容哈希：模型、是否流式和影响结果的参数"""
+    payload = {"model": model_name, "stream": stream}
+    payload.update({field: _plain(kwargs.get(field)) for field in _KEY_FIELDS if kwargs.get(field) is not None})
+    raw = json.dumps(payload, ensure_ascii=False, sort_keys=True, separators=(",", ":"))
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+
+class Cassette:
+    """
+    请求/响应录制文件（gzip压缩的JSONL）
+    record模式下每个请求的完整响应（流式则为全部片段，含tool_calls）追加写入文件；
+    replay模式下按请求哈希取回响应，同一请求多次出现时按录制顺序依次返回，不访问网络。
+    """
+    def __init__(self, path: str, mode="replay"):
+        if mode not in ("record", "replay"):
+            raise ValueError("mode只能是record或replay")
+        self.path = path
+        self.mode = mode
+        self.hits = 0
+        self.recorded = 0
+        self._lock = threading.Lock()
+        self._entries = defaultdict(deque)
+        self._file = None
+        if mode == "replay":
+            self._load()
+        else:
+            os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+            self._file = gzip.open(path, "at", encoding="utf-8")
+
+    @property
+    def replaying(self):
+        return self.mode == "replay"
+
+    @property
+    def recording(self):
+        return self.mode == "record"
+
+    def _load(self):
+        with gzip.open(self.path, "rt", encoding="utf-8") as f:
+            for line in f:
+                if line.strip():
+                    entry = json.loads(line)
+                    self._entries[entry["key"]].append(entry)
+
+    def _take(self, model_name, stream, kwargs):
+        key = request_key(model_name, stream, kwargs)
+        with self._lock:
+            entries = self._entries.get(key)
+            if not entries:
+                raise CassetteMiss(f"录制文件{self.path}中没有匹配的请求(model={model_name}, stream={stream})")
+            self.hits += 1
+            # 只剩最后一条时保留，重复请求可反复取用
+            return entries.popleft() if len(entries) > 1 else entries[0]
+
+    def replay(self, model_name, kwargs) -> ChatCompletion:
+        return ChatCompletion.model_validate(self._take(model_name, False, kwargs)["response"])
+
+    def replay_stream(self, model_name, kwargs):
+        return [ChatCompletionChunk.model_validate(chunk) for chunk in self._take(model_name, True, kwargs)["chunks"]]
+
+    def _write(self, entry):
+        line = json.dumps(entry, ensure_ascii=False, separators=(",", ":")) + "\n"
+        with self._lock:
+            self._file.write(line)
+            self.recorded += 1
+
+    def record(self, model_name, kwargs, response):
+        self._write({"key": request_key(model_name, False, kwargs), "model": model_name, "response": response.model_dump()})
+
+    def record_stream(self, model_name, kwargs, chunks):
+        self._write({
+            "key": request_key(model_name, True, kwargs), "model": model_name,
+            "chunks": [chunk.model_dump() for chunk in chunks],
+        })
+
+    def close(self):
+        with self._lock:
+            if self._file is not None:
+                self._file.close()
+                self._file = None
+
+
+def cassette_from_env():
+    """LLM_RECORD=路径 开启录制，LLM_REPLAY=路径 开启回放"""
+    if os.getenv("LLM_REPLAY"):
+        return Cassette(os.getenv("LLM_REPLAY"), "replay")
+    if os.getenv("LLM_RECORD"):
+        return Cassette(os.getenv("LLM_RECORD"), "record")
+    return None
@@ -0,0 +1,162 @@
+import json
+import re
+from typing import Dict, List
+
+from core.agent import send_message, message_initial
+from core.models import router
+
+try:
+    import tiktoken
+    _encoding = tiktoken.get_encoding("cl100k_base")
+except Exception:  # 未安装tiktoken或缺少编码文件时使用估算
+    _encoding = None
+
+_CJK = re.compile(r"[一-鿿　-〿＀-￯]")
+
+# 各类调用携带历史上下文的token预算
+CONTEXT_BUDGETS = {"planner": 6000, "executor": 8000, "summarizer": 12000}
+# 通过view()取用历史步骤的调用类型；总量超过其中最小的预算时即压缩，任何视图都不会丢掉未进入摘要的步骤
+VIEW_KINDS = ("planner", "executor")
+
+# 工具结果中可能被后续步骤引用的片段：文件路径、网址、较长的数字
+_REFERENCE = re.compile(r"[\w:./\\-]+\.[a-zA-Z]{1,5}\b|https?://\S+|\d{3,}")
+
+
+def count_text_tokens(text: str) -> int:
+    if not text:
+        return 0
+    if _encoding is not None:
+        return len(_encoding.encode(text))
+    cjk = len(_CJK.findall(text))
+    return cjk + (len(text) - cjk + 3) // 4
+
+
+def _as_dict(message) -> dict:
+    if hasattr(message, "model_dump"):
+        return message.model_dump(exclude_none=True)
+    return dict(message)
+
+
+def _message_text(message: dict) -> str:
+    text = message.get("content") or ""
+    for call in message.get("tool_calls") or []:
+        function = call.get("function", {})
+        text += function.get("name", "") + function.get("arguments", "")
+    return text
+
+
+def count_tokens(messages) -> int:
+    """估算消息列表的token数（每条消息另计4个格式token）"""
+    return sum(count_text_tokens(_message_text(_as_dict(m))) + 4 for m in messages)
+
+
+def _truncate(text: str, max_tokens: int) -> str:
+    if count_text_tokens(text) <= max_tokens:
+        return text
+    keep = max(0, int(len(text) * max_tokens / count_text_tokens(text)) - 20)
+    return text[:keep] + "...（内容过长已截断）"
+
+
+def fit_results(results: List[dict], budget: int = CONTEXT_BUDGETS["summarizer"]) -> List[dict]:
+    """汇总前把各步骤结果截断到预算以内，较短的结果保持原样"""
+    if count_text_tokens(json.dumps(results, ensure_ascii=False)) <= budget:
+        return results
+    share = max(100, budget // max(1, len(results)))
+    return [dict(r, result=_truncate(str(r.get("result", "")), share)) for r in results]
+
+
+class ContextManager:
+    """
+    任务级的对话上下文
+    每个步骤新增的消息作为一组保存（保证tool_calls与工具结果不被拆开）。view()按调用类型的token预算
+    从最近的步骤往前取；总量超过预算时把最早的步骤压缩进滚动摘要，其中仍被后续步骤引用的工具结果原样保留。
+    """
+    def __init__(self, llm, system_prompt: str, budgets: Dict[str, int] = None, pinned_budget=1500):
+        self.llm = llm
+        self.system = message_initial(system_prompt)[0]
+        self.budgets = dict(CONTEXT_BUDGETS, **(budgets or {}))
+        self.pinned_budget = pinned_budget
+        self.groups: List[List[dict]] = []
+        self.summary = ""
+        self.pinned: Dict[str, str] = {}  # tool_call_id -> 保留的工具结果
+        self.compactions = 0
+
+    def add_step(self, turns):
+        """加入一个步骤新增的消息，必要时压缩更早的步骤"""
+        turns = [_as_dict(m) for m in turns]
+        if turns:
+            self.groups.append(turns)
+        limit = min(self.budgets[kind] for kind in VIEW_KINDS)
+        while len(self.groups) > 1 and self._tokens() > limit:
+            self._compact()
+
+    def pin(self, tool_call_id: str):
+        """显式保留某个工具结果，压缩时不进入摘要"""
+        for group in self.groups:
+            for message in group:
+                if message.get("tool_call_id") == tool_call_id:
+                    self.pinned[tool_call_id] = message.get("content") or ""
+
+    def _tokens(self):
+        return count_tokens(self._header()) + sum(count_tokens(g) for g in self.groups)
+
+    def _header(self) -> List[dict]:
+        header = [self.system]
+        if self.summary:
+            header.append({"role": "assistant", "content": f"[此前步骤摘要] {self.summary}"})
+        if self.pinned:
+            pinned = "\n".join(f"- {content}" for content in self.pinned.values())
+            header.append({"role": "assistant", "content": f"[保留的工具结果]\n{_truncate(pinned, self.pinned_budget)}"})
+        return header
+
+    def _compact(self):
+        """把最早的一组消息并入滚动摘要"""
+        oldest = self.groups.pop(0)
+        later_text = " ".join(_message_text(m) for g in self.groups for m in g)
+        for message in oldest:
+            if message.get("role") == "tool" and message.get("tool_call_id") not in self.pinned:
+                references = _REFERENCE.findall(message.get("content") or "")
+                if any(ref in later_text for ref in references):
+                    self.pinned[message["tool_call_id"]] = _truncate(message.get("content") or "", self.pinned_budget // 2)
+
+        transcript = "\n".join(f"{m.get('role')}: {_message_text(m)}" for m in oldest)
+        prompt = f"""请把已有摘要和新的对话记录合并为一份简短摘要，保留已完成的步骤、关键数据、文件路径和结论，不要编造内容：
+
+        已有摘要: {self.summary or "无"}
+        新的对话记录:
+        {_truncate(transcript, max(self.budgets.values()) // 2)}"""
+        try:
+            response, _ = send_message(
+                clients=router.route("summary", self.llm),
+                user_input=prompt,
+                messages=message_initial("你是对话摘要助手"),
+                mode=1,
+                temperature=0.3
+            )
+            summary = response.content if hasattr(response, 'content') else str(response)
+        except Exception:
+            summary = None
+        # 摘要失败时退化为截断拼接
+        self.summary = _truncate(summary or f"{self.summary}\n{transcript}", self.budgets["planner"] // 4)
+        self.compactions += 1
+
+    def view(self, kind="planner") -> List[dict]:
+        """返回不超过该类调用预算的消息列表：系统提示、摘要、保留结果加上尽量多的最近步骤"""
+        header = self._header()
+        budget = self.budgets[kind] - count_tokens(header)
+        selected = []
+        for group in reversed(self.groups):
+            size = count_tokens(group)
+            if size > budget:
+                if not selected:
+                    # 最近一步本身就超出预算时截断其内容
+                    per_message = max(50, budget // max(1, len(group)))
+                    selected = [dict(m, content=_truncate(m["content"], per_message)) if m.get("content") else m for m in group]
+                break
+            selected = group + selected
+            budget -= size
+        return header + selected
+
+    def fit_results(self, results: List[dict], kind="summarizer") -> List[dict]:
+        """按本上下文的预算截断各步骤结果，见fit_results()"""
+        return fit_results(results, self.budgets[kind])
@@ -0,0 +1,106 @@
+from collections.abc import Sequence
+from typing import Iterable, List, Optional
+
+
+class _Node:
+    """链表节点，保存一条消息和指向之前历史的引用，多个对话可以共享同一段前缀"""
+    __slots__ = ("message", "parent", "length")
+
+    def __init__(self, message, parent: Optional["_Node"]):
+        self.message = message
+        self.parent = parent
+        self.length = parent.length + 1 if parent else 1
+
+
+class Conversation(Sequence):
+    """
+    不可变的对话历史
+    开头的系统提示单独保存，其余消息存放在共享前缀的链表中：append/extend只新建节点，fork不复制任何内容，
+    替换系统提示也不影响已有历史。只在发送时通过to_wire()展开为OpenAI格式的消息列表。
+    消息加入后视为只读，不要原地修改其中的字典。
+    """
+    __slots__ = ("_head", "_tail", "_wire")
+
+    def __init__(self, head: tuple = (), tail: Optional[_Node] = None):
+        self._head = head
+        self._tail = tail
+        self._wire = None
+
+    @classmethod
+    def of(cls, messages) -> "Conversation":
+        """由消息列表构造；已经是Conversation时直接返回"""
+        if isinstance(messages, Conversation):
+            return messages
+        messages = list(messages or [])
+        split = 0
+        while split < len(messages) and _role(messages[split]) == "system":
+            split += 1
+        return cls(tuple(messages[:split])).extend(messages[split:])
+
+    def append(self, message) -> "Conversation":
+        return Conversation(self._head, _Node(message, self._tail))
+
+    def extend(self, messages: Iterable) -> "Conversation":
+        tail = self._tail
+        for message in messages:
+            tail = _Node(message, tail)
+        return Conversation(self._head, tail)
+
+    def fork(self) -> "Conversation":
+        """对话不可变，分支即共享同一份历史"""
+        return self
+
+    def with_system(self, prompt: str) -> "Conversation":
+        """把开头的系统提示替换为prompt，历史消息共享"""
+        return Conversation(({"role": "system", "content": prompt},), self._tail)
+
+    def prepend(self, *messages) -> "Conversation":
+        """在最前面加入消息（如另一条系统提示），历史消息共享"""
+        return Conversation(tuple(messages) + self._head, self._tail)
+
+    def since(self, base: "Conversation") -> List:
+        """返回base之后追加的消息；base须是本对话的祖先"""
+        added, node = [], self._tail
+        while node is not None and node is not base._tail:
+            added.append(node.message)
+            node = node.parent
+        if node is not base._tail:
+            raise ValueError("base不是该对话的祖先")
+        added.reverse()
+        return added
+
+    def to_wire(self) -> List:
+        """展开为发送用的消息列表（每次返回新列表，消息对象本身共享）"""
+        if self._wire is None:
+            body, node = [], self._tail
+            while node is not None:
+                body.append(node.message)
+                node = node.parent
+            body.reverse()
+            self._wire = self._head + tuple(body)
+        return list(self._wire)
+
+    def __len__(self):
+        return len(self._head) + (self._tail.length if self._tail else 0)
+
+    def __getitem__(self, index):
+        if self._wire is None:
+            self.to_wire()
+        if isinstance(index, slice):
+            return list(self._wire[index])
+        return self._wire[index]
+
+    def __iter__(self):
+        if self._wire is None:
+            self.to_wire()
+        return iter(self._wire)
+
+    def __add__(self, messages) -> "Conversation":
+        return self.extend(messages)
+
+    def __repr__(self):
+        return f"Conversation({self.to_wire()!r})"
+
+
+def _role(message):
+    return message.get("role") if isinstance(message, dict) else getattr(message, "role", None)
@@ -0,0 +1,102 @@
+import json
+from typing import Callable, Optional
+
+
+class JSONStreamParser:
+    """
+    增量解析流式输出的JSON对象
+    每次feed新片段只扫描新增的字符，顶层字段的值（字符串、数字、嵌套对象或数组）一完整就放入fields并回调on_field(key, value)；
+    回调返回True表示调用方已拿到所需字段，feed随即返回True，调用方可以提前结束读取。
+    """
+    def __init__(self, on_field: Optional[Callable[[str, object], bool]] = None):
+        self.on_field = on_field
+        self.fields = {}
+        self.done = False       # 顶层对象已闭合
+        self.stopped = False    # 回调要求提前结束
+        self._text = ""
+        self._pos = 0
+        self._depth = 0
+        self._in_string = False
+        self._escape = False
+        self._state = "key"     # 顶层对象内：key -> colon -> value -> comma
+        self._key = None
+        self._start = None      # 当前键或值在_text中的起始位置
+        self._scalar = False    # 当前值是数字、true/false/null
+
+    def feed(self, text: str) -> bool:
+        """追加片段，返回是否应提前结束"""
+        if self.done or self.stopped:
+            return self.stopped
+        self._text += text
+        source = self._text
+        for i in range(self._pos, len(source)):
+            if self._step(source, i, source[i]):
+                self._pos = i + 1
+                return True
+            if self.done:
+                break
+        self._pos = len(source)
+        return False
+
+    def _step(self, source, i, c) -> bool:
+        if self._in_string:
+            if self._escape:
+                self._escape = False
+            elif c == "\\":
+                self._escape = True
+            elif c == '"':
+                self._in_string = False
+                if self._depth == 1:
+                    if self._state == "key":
+                        self._key = json.loads(source[self._start:i + 1])
+                        self._state = "colon"
+                    elif self._state == "value":
+                        return self._emit(source[self._start:i + 1])
+            return False
+
+        if self._depth == 0:
+            if c == "{":
+                self._depth = 1
+                self._state = "key"
+            return False
+
+        if self._depth == 1 and self._scalar and (c in ",}" or c.isspace()):
+            self._scalar = False
+            if self._emit(source[self._start:i]):
+                return True
+
+        if c == '"':
+            self._in_string = True
+            if self._depth == 1 and self._state in ("key", "value"):
+                self._start = i
+        elif c in "{[":
+            if self._depth == 1 and self._state == "value":
+                self._start = i
+            self._depth += 1
+        elif c in "}]":
+            self._depth -= 1
+            if self._depth == 1 and self._state == "value":
+                return self._emit(source[self._start:i + 1])
+            if self._depth == 0:
+                self.done = True
+        elif self._depth == 1:
+            if c == ":" and self._state == "colon":
+                self._state = "value"
+            elif c == "," and self._state == "comma":
+                self._state = "key"
+            elif self._state == "value" and not c.isspace() and not self._scalar:
+                self._scalar = True
+                self._start = i
+        return False
+
+    def _emit(self, raw: str) -> bool:
+        self._state = "comma"
+        try:
+            value = json.loads(raw)
+        except json.JSONDecodeError:
+            return False
+        self.fields[self._key] = value
+        if self.on_field is not None and self.on_field(self._key, value):
+            self.stopped = True
+            return True
+        return False
@@ -0,0 +1,125 @@
+import atexit
+import contextvars
+import json
+import os
+import queue
+import threading
+import time
+from datetime import datetime
+
+LOG_PATH = os.getenv("LOG_PATH", "blogs/log.jsonl")
+LOG_MAX_BYTES = int(os.getenv("LOG_MAX_BYTES", str(10 * 1024 * 1024)))  # 单个日志文件大小上限，超出后轮转
+LOG_BACKUPS = int(os.getenv("LOG_BACKUPS", "5"))
+LOG_QUEUE_SIZE = 10000
+LOG_FSYNC_INTERVAL = 1.0  # 两次fsync之间的最短间隔(秒)
+
+# 当前任务和步骤，由TaskAnalyzer设置，线程池中需通过contextvars.copy_context()传递
+task_id_var = contextvars.ContextVar("task_id", default=None)
+step_var = contextvars.ContextVar("step", default=None)
+
+
+class StructuredLogger:
+    """
+    后台线程写入的JSONL日志
+    调用方只把记录放入有界队列，序列化、写文件、按大小轮转和批量fsync都在写线程中完成；
+    队列满时丢弃新记录并计数，不阻塞调用方。
+    """
+    def __init__(self, path=LOG_PATH, max_bytes=LOG_MAX_BYTES, backups=LOG_BACKUPS,
+                 queue_size=LOG_QUEUE_SIZE, fsync_interval=LOG_FSYNC_INTERVAL):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.backups = backups
+        self.fsync_interval = fsync_interval
+        self.dropped = 0
+        self._queue = queue.Queue(queue_size)
+        self._lock = threading.Lock()
+        self._thread = None
+        self._file = None
+
+    def log(self, role: str, content="", **fields):
+        """记录一条日志，自动带上时间戳、任务id和步骤"""
+        record = {
+            "ts": datetime.now().isoformat(timespec="milliseconds"),
+            "task_id": task_id_var.get(),
+            "step": step_var.get(),
+            "role": role,
+            "content": content,
+        }
+        record.update(fields)
+        self.write(record)
+
+    def write(self, record: dict):
+        """把一条已组装好的记录放入写入队列"""
+        self._ensure_thread()
+        try:
+            self._queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+    def _ensure_thread(self):
+        if self._thread is None:
+            with self._lock:
+                if self._thread is None:
+                    self._thread = threading.Thread(target=self._run, name="log-writer", daemon=True)
+                    self._thread.start()
+
+    def _open(self):
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        self._file = open(self.path, "a", encoding="utf-8")
+
+    def _rotate(self):
+        self._file.close()
+        for i in range(self.backups - 1, 0, -1):
+            if os.path.exists(f"{self.path}.{i}"):
+                os.replace(f"{self.path}.{i}", f"{self.path}.{i + 1}")
+        if self.backups:
+            os.replace(self.path, f"{self.path}.1")
+        else:
+            os.remove(self.path)
+        self._open()
+
+    def _run(self):
+        self._open()
+        last_sync = time.monotonic()
+        while True:
+            batch = [self._queue.get()]
+            while True:
+                try:
+                    batch.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+            stop = False
+            try:
+                for record in batch:
+                    if record is None:
+                        stop = True
+                        continue
+                    self._file.write(json.dumps(record, ensure_ascii=False, default=str) + "\n")
+                self._file.flush()
+                if stop or time.monotonic() - last_sync >= self.fsync_interval:
+                    os.fsync(self._file.fileno())
+                    last_sync = time.monotonic()
+                if self._file.tell() >= self.max_bytes:
+                    self._rotate()
+            except OSError:
+                self.dropped += len(batch)
+            finally:
+                for _ in batch:
+                    self._queue.task_done()
+            if stop:
+                self._file.close()
+                return
+
+    def flush(self):
+        """等待已入队的记录全部写入"""
+        if self._thread is not None and self._thread.is_alive():
+            self._queue.join()
+
+    def close(self):
+        if self._thread is not None and self._thread.is_alive():
+            self._queue.put(None)
+            self._thread.join(5)
+
+
+logger = StructuredLogger()
+atexit.register(logger.close)
@@ -1,22 +1,45 @@
 import json
 import os
-import importlib.util
 from typing import Dict, List, Callable
 from openai import OpenAI
 from core.agent import send_message, message_initial
+from core.models import router
+from core.conversation import Conversation
+from core.tool_loader import LazyImplementations, tool_modules
+from core.tool_registry import get_registry, similarity, describe
+from core.sandbox import ToolThreadPool, get_sandbox
+from core.trace import tracer
 import re
-import copy
+import time
+import contextvars
+import concurrent.futures
+
+TOOL_TOP_K = int(os.getenv("TOOL_TOP_K", "8"))  # 每次调用最多携带的相关工具数
+REUSE_CANDIDATES = 5          # 复用检查最多交给LLM确认的候选数
+REUSE_MIN_SIMILARITY = 0.15   # 任务与工具描述的词法相似度达到该值才作为复用候选
+DUPLICATE_SIMILARITY = 0.8    # 新工具定义与已有工具相似度达到该值视为重复
+TOOL_TIMEOUT = float(os.getenv("TOOL_TIMEOUT", "60"))  # 单个工具调用的时限(秒)
+SANDBOX_GRACE = 5.0  # 沙箱模式下等待工具线程时在沙箱自身时限之外多等的秒数
+TOOL_STREAM = os.getenv("TOOL_STREAM", "1") != "0"     # 流式function calling，参数完整的工具调用提前执行
+# 工具多为文件/网络I/O，用共享线程池并发执行同一批tool_calls；超时调用占用的线程会被替换
+_tool_executor = ToolThreadPool(int(os.getenv("TOOL_WORKERS", "8")), "tool")
 
 class ManagerAgent:
-    def __init__(self, llm_client: OpenAI, log=None, trails=2, stream_handler=None):
+    def __init__(self, llm_client: OpenAI, log=None, trails=2, stream_handler=None, tool_timeout=TOOL_TIMEOUT, sandbox=None, stream_tools=TOOL_STREAM):
         self.llm = llm_client
-        self.tool_registry = "tools.json"  # 仍然保留工具定义的JSON文件
+        self.tool_registry = "tools.json"  # 工具定义的JSON文件：变化时批量导入注册表，新注册的工具也写回该文件
         self.tools_dir = "tools"  # 工具代码存放目录
-        self.tools = self._load_tools()
+        self.tools = get_registry("tools.db", self.tool_registry)  # name -> 工具定义，带检索索引
+        self.tool_top_k = TOOL_TOP_K
         self.tool_implementations = self._load_implementations()
         self.log = log
         self.trails = trails
         self.stream_handler = stream_handler
+        self.tool_timeout = tool_timeout
+        # 沙箱模式下工具在常驻的隔离进程中执行，默认读取环境变量TOOL_SANDBOX
+        self.sandbox = os.getenv("TOOL_SANDBOX") == "1" if sandbox is None else sandbox
+        self.stream_tools = stream_tools
+        self.on_tool_results = None  # 工具结果返回、步骤总结开始前的回调，参数为本步骤截至工具结果新增的消息
         
         # 确保工具目录存在
         os.makedirs(self.tools_dir, exist_ok=True)
@@ -35,50 +58,15 @@ class ManagerAgent:
                 code = code[match.start():]
         return code
 
-    def _load_tools(self) -> Dict[str, dict]:
-        """加载工具定义"""
-        try:
-            with open(self.tool_registry, 'r', encoding='utf-8') as f:
-                data = json.load(f)
-                return {tool["function"]["name"]: tool for tool in data.get("tools", [])}
-        except (FileNotFoundError, json.JSONDecodeError):
-            return self._init_default_tools()
-
     def _load_implementations(self) -> Dict[str, Callable]:
-        """动态加载工具实现"""
-        implementations = {}
-        for tool_name in self.tools.keys():
-            try:
-                # 从单独的Python文件加载工具
-                module_path = os.path.join(self.tools_dir, f"{tool_name}.py")
-                if not os.path.exists(module_path):
-                    continue
-                
-                # 动态导入模块
-                spec = importlib.util.spec_from_file_location(tool_name, module_path)
-                module = importlib.util.module_from_spec(spec)
-                spec.loader.exec_module(module)
-                
-                # 获取执行函数
-                func_name = f"execute_{tool_name}"
-                if hasattr(module, func_name):
-                    implementations[tool_name] = getattr(module, func_name)
-                else:
-                    print(f"工具{tool_name}缺少执行函数{func_name}")
-            except Exception as e:
-                print(f"加载工具{tool_name}失败: {str(e)}")
-        return implementations
+        """动态加载工具实现：返回惰性映射，模块在首次调用时导入并按文件修改时间缓存"""
+        return LazyImplementations(self.tools, self.tools_dir)
 
-    def _init_default_tools(self) -> Dict[str, dict]:
-        """初始化默认工具定义"""
-        default_tools = {}
-        self._save_tools(default_tools)
-        return default_tools
-    
-    def _save_tools(self, tools: Dict[str, dict]):
-        """保存工具定义"""
-        with open(self.tool_registry, 'w', encoding='utf-8') as f:
-            json.dump({"tools": list(tools.values())}, f, indent=2, ensure_ascii=False)
+    def _relevant_tools(self, task: str) -> List[dict]:
+        """从注册表中检索与子任务最相关的工具定义，数量不超过tool_top_k"""
+        if len(self.tools) <= self.tool_top_k:
+            return list(self.tools.values())
+        return [tool_def for _, tool_def in self.tools.search(task, self.tool_top_k)]
 
     def _save_tool_code(self, tool_name: str, code: str):
         """保存工具代码到单独的Python文件"""
@@ -86,45 +74,60 @@ class ManagerAgent:
         with open(file_path, 'w', encoding='utf-8') as f:
             f.write(code)
 
-    def process_task(self, task: str,complex_task: str, init_messages=None) -> str:
-        """处理任务主流程"""
-        system_messages = message_initial("""你是一个智能助手，已经通过function_calling的方法从用户端python工具调用获取了信息，
+    @tracer.traced("process_task")
+    def process_task(self, task: str,complex_task: str, init_messages=None, need_new_tool=None) -> str:
+        """
+        处理任务主流程，返回(结果, 本步骤新增的消息)；失败时返回(False, 错误信息)
+        need_new_tool: 调用方已判断出的"Yes"/"No"/"self"（如合并调用模式），给出时跳过工具分析调用
+        """
+        system_prompt = """你是一个智能助手，已经通过function_calling的方法从用户端python工具调用获取了信息，
 你的任务是总结之前的对话内容和信息与工作，而不是完成用户的任务：
 1. 你的总结应尽量简短，最好是只返回前一步任务和Function Calling的结果，例如："加法计算结果：12"，或"成功获取信息，为："（信息过长可省略）
 2. 你已经获取了足够的信息，请细致检查历史记录进行总结
 3. 请使用中文回答
 4. 如果工具返回乱码，你需要提醒是否是工具在编码上出现了问题，若总是如此，则应当认为工具的返回是正确的
-""")
-        if init_messages is None:
-            init_messages = system_messages
-        else:
-            init_messages = copy.deepcopy(init_messages)
-            init_messages[0] = system_messages[0]
+"""
+        # 只替换系统提示，历史消息与调用方共享
+        init_messages = Conversation.of(init_messages or []).with_system(system_prompt)
 
-        self.log(f"[CHECK] 检测该任务是否需要新工具")
-        need_new_tool = self._analyze_task(task)
+        tools = self._relevant_tools(task)
+        if need_new_tool is None:
+            self.log(f"[CHECK] 检测该任务是否需要新工具")
+            need_new_tool = self._analyze_task(task, tools)
         
         if need_new_tool == "Yes":
-            self.log(f"[TOOL NEED] 该任务需要新工具，分析生成工具格式")
-            tool_def = self._generate_tool(task, complex_task)
-
-            self.log(f"[TOOL GENERATE] 开始生成工具{tool_def["function"]["name"]}:{tool_def["function"]["description"]}")
-            tool_code = self._generate_tool_code(tool_def)
+            # 要求重新生成代码时说明现有工具不可用，不做复用
+            regenerate = "重新生成" in task
+            tool_def = None if regenerate else self._find_reusable_tool(task)
+            if tool_def is None:
+                self.log(f"[TOOL NEED] 该任务需要新工具，分析生成工具格式")
+                tool_def = self._generate_tool(task, complex_task)
+                duplicate = None if regenerate else self._find_duplicate_tool(tool_def)
+                if duplicate is not None:
+                    tool_def = duplicate
+                else:
+                    self.log(f"[TOOL GENERATE] 开始生成工具{tool_def["function"]["name"]}:{tool_def["function"]["description"]}")
+                    tool_code = self._generate_tool_code(tool_def)
 
-            self.log(f"[TOOL REGISTER] 已生成工具，正在注册工具")
-            self._register_tool(tool_def, tool_code)
+                    self.log(f"[TOOL REGISTER] 已生成工具，正在注册工具")
+                    self._register_tool(tool_def, tool_code)
+            tools = [tool_def] + [t for t in tools if t["function"]["name"] != tool_def["function"]["name"]]
         else:
             self.log(f"该任务无需新工具")
         
         self.log(f"[EXECUTE] 开始执行")
-        response, messages =  self._execute_task(task, init_messages, need_new_tool=='self')
+        self_solve = need_new_tool == 'self'
+        base = 1 if self_solve else len(init_messages)  # 自行解答时使用独立的系统提示
+        response, messages =  self._execute_task(task, init_messages, self_solve, tools)
+        if response is False:
+            return response, messages
+        return response, messages[base:]
 
-        return response, messages
-
-    def _analyze_task(self, task: str) -> bool:
-        """分析任务是否需要新工具"""
+    @tracer.traced("analyze_task")
+    def _analyze_task(self, task: str, tools: List[dict]) -> bool:
+        """分析任务是否需要新工具，tools为检索出的相关工具"""
         prompt = f"""
-        分析任务是否需要新工具(现有工具: {self.tools})。
+        分析任务是否需要新工具(现有工具: {tools})。
         任务: {task}。
         注意：如果你收到的任务包含"重新生成一份代码"之类的，表示所指的现有工具不可用，在此基础上再分析。
         如果你可以生成用户所需内容（你只能生成文本内容），无需任何工具或用户操作，则need_new_tool字段返回"self"
@@ -139,13 +142,64 @@ class ManagerAgent:
         """
         
         response, _ = send_message(
-            clients=("deepseek-chat", self.llm),
+            clients=router.route("analysis", self.llm),
             user_input=prompt,
             messages=message_initial("你是一个任务分析器"),
-            mode=0
+            mode=0,
+            on_field=lambda key, value: key == "need_new_tool"  # 拿到结论即停止，reason不再等待
         )
         return response["need_new_tool"]
 
+    def _find_reusable_tool(self, task: str):
+        """
+        生成新工具前，在注册表中寻找换个参数就能完成任务的已有工具
+        只有词法上足够接近的候选才请LLM确认，找不到返回None
+        """
+        candidates = [
+            tool_def for _, tool_def in self.tools.search(task, REUSE_CANDIDATES)
+            if similarity(task, describe(tool_def)) >= REUSE_MIN_SIMILARITY
+            and tool_def["function"]["name"] in self.tool_implementations
+        ]
+        if not candidates:
+            return None
+
+        prompt = f"""
+        判断以下已有工具中是否有工具可以完成任务，只需传入合适的参数即可完成也视为可以。
+        任务: {task}
+        已有工具: {json.dumps(candidates, ensure_ascii=False)}
+
+        返回JSON格式: {{"reuse": "可以完成任务的工具名，没有则为None", "reason": str}}
+        """
+        response, _ = send_message(
+            clients=router.route("analysis", self.llm),
+            user_input=prompt,
+            messages=message_initial("你是一个工具复用分析器，尽量复用已有工具，避免生成重复工具"),
+            mode=0,
+            temperature=0,
+            on_field=lambda key, value: key == "reuse"
+        )
+        name = response.get("reuse") if isinstance(response, dict) else None
+        for tool_def in candidates:
+            if tool_def["function"]["name"] == name:
+                self.log(f"[TOOL REUSE] 复用已有工具{name}，无需生成新工具")
+                return tool_def
+        return None
+
+    def _find_duplicate_tool(self, tool_def: dict):
+        """新生成的工具定义与已有工具同名或描述高度相似时返回已有工具，从而跳过代码生成"""
+        name = tool_def["function"]["name"]
+        if name in self.tool_implementations:
+            self.log(f"[TOOL REUSE] 已存在同名工具{name}，直接复用")
+            return self.tools[name]
+        for _, existing in self.tools.search(describe(tool_def), 1):
+            existing_name = existing["function"]["name"]
+            if (similarity(describe(tool_def), describe(existing)) >= DUPLICATE_SIMILARITY
+                    and existing_name in self.tool_implementations):
+                self.log(f"[TOOL REUSE] 新工具{name}与已有工具{existing_name}几乎相同，直接复用")
+                return existing
+        return None
+
+    @tracer.traced("generate_tool")
     def _generate_tool(self, task: str, complex_task: str) -> dict:
         """生成新工具定义"""
         prompt = f"""
@@ -169,13 +223,14 @@ class ManagerAgent:
 """
         
         response, _ = send_message(
-            clients=("deepseek-chat", self.llm),
+            clients=router.route("codegen", self.llm),
             user_input=prompt,
             messages=message_initial("你是一个工具定义生成器"),
             mode=0
         )
         return response
 
+    @tracer.traced("generate_tool_code")
     def _generate_tool_code(self, tool_def: dict) -> str:
         """生成工具实现代码"""
         tool_name = tool_def["function"]["name"]
@@ -196,7 +251,7 @@ class ManagerAgent:
         只需返回代码，无需解释："""
         
         response = send_message(
-            clients=("deepseek-chat", self.llm),
+            clients=router.route("codegen", self.llm),
             user_input=prompt,
             messages=message_initial("你是一个Python函数生成器，函数所需要的库必须在函数内部import"),
             mode=1,
@@ -206,12 +261,13 @@ class ManagerAgent:
         trail = self.trails
         while response is None and trail:
             response = send_message(
-                clients=("deepseek-chat", self.llm),
+                clients=router.route("codegen", self.llm),
                 user_input=prompt,
                 messages=message_initial("你是一个Python函数生成器"),
                 mode=1,
                 temperature=0.0
             )[0]
+            tracer.retry()
             trail -= 1
         if response is None:
             err = f"function_calling连续{self.trail+1}次返回空，终止该任务"
@@ -226,45 +282,134 @@ class ManagerAgent:
         tool_name = tool_def["function"]["name"]
         
         # 保存工具定义
-        self.tools[tool_name] = tool_def
-        self._save_tools(self.tools)
-        
+        self.tools.upsert(tool_def)
+
         # 保存工具代码到单独的文件
         self._save_tool_code(tool_name, tool_code)
-        
-        # 重新加载实现
+
+        # 只重新加载新注册的工具；沙箱模式下在工作进程中导入和检查，生成代码的顶层语句不在本进程运行
+        tool_modules.invalidate(tool_name, self.tools_dir)
         self.tool_implementations = self._load_implementations()
-        
+        try:
+            if self.sandbox:
+                get_sandbox().load(tool_name, self.tools_dir, timeout=self.tool_timeout,
+                                   deadline=time.perf_counter() + self.tool_timeout)
+            else:
+                tool_modules.get(tool_name, self.tools_dir)
+        except Exception as e:
+            self.log(f"[TOOL REGISTER] 工具加载失败：{str(e)}")
+            return
+
         self.log(f"成功注册工具，可前往tools文件夹查看")
 
-    def _execute_task(self, task: str, init_messages, self_solve) -> str:
+    def _run_tool(self, call):
+        """执行单个工具调用，返回(结果字符串, 耗时)"""
+        start = time.perf_counter()
+        tool_name = call.function.name
+        if tool_name not in self.tool_implementations:
+            self.log(f"工具未实现")
+            return f"工具{tool_name}未实现", time.perf_counter() - start
+        self.log(f"执行工具：{tool_name}")
+        with tracer.span(f"tool:{tool_name}", "tool", sandbox=self.sandbox) as span:
+            try:
+                args = json.loads(call.function.arguments)
+                # 执行工具并确保结果为字符串
+                if self.sandbox:
+                    result = get_sandbox().call(tool_name, self.tools_dir, args, timeout=self.tool_timeout,
+                                                deadline=start + self.tool_timeout)
+                else:
+                    result = self.tool_implementations[tool_name](args)
+                if not isinstance(result, str):
+                    result = str(result)
+                # 显式编码为UTF-8，再解码为字符串，确保中文等字符正确处理
+                result = result.encode('utf-8').decode('utf-8')
+                elapsed = time.perf_counter() - start
+                self.log(f"[TOOL RESULT] 成功执行({elapsed:.2f}s)，输出结果：{result}")
+            except Exception as e:
+                elapsed = time.perf_counter() - start
+                self.log(f"工具执行错误({elapsed:.2f}s)：{str(e)}")
+                result = f"工具执行错误: {str(e)}"
+                span.status = "error"
+                span.set(error=str(e))
+        return result, elapsed
+
+    def _dispatch_tool(self, call, context=None):
+        """把工具调用提交到线程池，context为执行时使用的contextvars（默认取当前上下文）"""
+        context = context.copy() if context is not None else contextvars.copy_context()
+        return _tool_executor.submit(context.run, self._run_tool, call)
+
+    def _run_tools(self, calls, dispatched=None) -> List[dict]:
+        """
+        并发执行一批工具调用，每个调用从开始执行起限时self.tool_timeout秒，结果按tool_calls顺序返回
+        dispatched为流式阶段已提前提交的调用（tool_call_id -> future），其余调用在此提交
+        超时的调用返回超时信息；沙箱模式下其工作进程被终止，线程模式下线程无法强行终止，记为泄漏并补充新线程
+        """
+        dispatched = dispatched or {}
+        futures = [(call, dispatched.get(call.id) or self._dispatch_tool(call)) for call in calls]
+        # 沙箱自行限制等待空闲进程(至多tool_timeout)和执行(取得进程后tool_timeout)的时间并报告超时，这里只作兜底
+        timeout = 2 * self.tool_timeout + SANDBOX_GRACE if self.sandbox else self.tool_timeout
+        tool_results = []
+        for call, future in futures:
+            try:
+                result, _ = _tool_executor.result(future, timeout)
+            except concurrent.futures.TimeoutError:
+                thread = _tool_executor.abandon(future, call.function.name)
+                if thread and not self.sandbox:
+                    self.log(
+                        f"[TOOL TIMEOUT] 工具{call.function.name}超过{self.tool_timeout}s未返回，线程{thread}仍在后台运行，"
+                        f"已补充新线程（当前泄漏{len(_tool_executor.leaked)}个线程）"
+                    )
+                else:
+                    self.log(f"[TOOL TIMEOUT] 工具{call.function.name}超过{self.tool_timeout}s未返回")
+                result = f"工具执行超时: 超过{self.tool_timeout}秒未返回"
+            tool_results.append({
+                "tool_call_id": call.id,
+                "content": result  # 已经是正确处理编码后的字符串
+            })
+        return tool_results
+
+    @tracer.traced("execute_task")
+    def _execute_task(self, task: str, init_messages, self_solve, tools=None) -> str:
         """执行任务"""
+        dispatched = {}  # 流式阶段参数已完整、提前开始执行的工具调用
 
         if self_solve:
+            base = 1
             response, messages = send_message(
-                clients=("deepseek-chat", self.llm),
+                clients=router.route("execute", self.llm),
                 user_input=task,
                 messages=message_initial("你是一个智能助手，完成用户给的任务或回答用户问题"),
                 mode=2 if self.stream_handler else 1,
                 stream_handler=self.stream_handler,
             )
         else:
+            base = len(init_messages)
             trail = self.trails
+            on_tool_call = None
+            if self.stream_tools:
+                context = contextvars.copy_context()
+
+                def on_tool_call(call):
+                    self.log(f"[TOOL DISPATCH] {call.function.name}参数已完整，提前执行")
+                    dispatched[call.id] = self._dispatch_tool(call, context)
             response, messages = send_message(
-                clients=("deepseek-chat", self.llm),
+                clients=router.route("execute", self.llm),
                 user_input=task,
                 messages=init_messages,
-                tools=list(self.tools.values()),
-                mode=1
+                tools=tools,
+                mode=1,
+                on_tool_call=on_tool_call
             )
             while response is None and trail:
                 response, messages = send_message(
-                    clients=("deepseek-chat", self.llm),
+                    clients=router.route("execute", self.llm),
                     user_input=task,
                     messages=init_messages,
-                    tools=list(self.tools.values()),
-                    mode=1
+                    tools=tools,
+                    mode=1,
+                    on_tool_call=on_tool_call
                 )
+                tracer.retry()
                 trail -= 1
             if response is None:
                 err = f"function_calling连续{self.trail+1}次返回空，终止该任务"
@@ -273,37 +418,17 @@ class ManagerAgent:
         # 处理工具调用
         try:
             if response and hasattr(response, 'tool_calls'):
-                tool_results = []
-                for call in response.tool_calls:
-                    tool_name = call.function.name
-                    args = json.loads(call.function.arguments)
-                    
-                    if tool_name in self.tool_implementations:
-                        self.log(f"执行工具：{tool_name}")
-                        try:
-                            # 执行工具并确保结果为字符串
-                            result = self.tool_implementations[tool_name](args)
-                            if not isinstance(result, str):
-                                result = str(result)
-                            # 显式编码为UTF-8，再解码为字符串，确保中文等字符正确处理
-                            result = result.encode('utf-8').decode('utf-8')
-                            self.log(f"[TOOL RESULT] 成功执行，输出结果：{result}")
-                        except Exception as e:
-                            self.log(f"工具执行错误：{str(e)}")
-                            result = f"工具执行错误: {str(e)}"
-                    else:
-                        self.log(f"工具未实现")
-                        result = f"工具{tool_name}未实现"
-                    
-                    tool_results.append({
-                        "tool_call_id": call.id,
-                        "content": result  # 已经是正确处理编码后的字符串
-                    })
-                
+                tool_results = self._run_tools(response.tool_calls, dispatched)
+
+                if self.on_tool_results:
+                    self.on_tool_results(messages[base:] + [response] + [
+                        {"role": "tool", "tool_call_id": r["tool_call_id"], "content": r["content"]} for r in tool_results
+                    ])
+
                 # 发送工具结果
                 self.log(f"[STEP RESULT]步骤分析")
                 final_response, messages = send_message(
-                    clients=("deepseek-chat", self.llm),
+                    clients=router.route("execute", self.llm),
                     messages=messages + [response],
                     tool_results=tool_results,
                     mode=2 if self.stream_handler else 1,  # 自动切换模式
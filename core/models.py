@@ -0,0 +1,195 @@
+"""
+模型注册表与路由：按调用角色选择模型档位，档位内在多个OpenAI兼容端点（含本地模型）之间按延迟路由
+
+配置为JSON，环境变量LLM_MODELS给出文件路径或直接写JSON（可放在.env中）：
+    {
+        "endpoints": {
+            "deepseek": {"model": "deepseek-chat", "base_url": "https://api.deepseek.com", "api_key_env": "DEEPSEEK_API_KEY"},
+            "local": {"model": "qwen2.5:7b", "base_url": "http://127.0.0.1:11434/v1", "api_key": "ollama"}
+        },
+        "roles": {"safety": ["local", "deepseek"], "analysis": ["local", "deepseek"], "default": ["deepseek"]}
+    }
+角色见ROLES，未配置的角色使用default档位；LLM_ROLE_<角色>=local,deepseek 可单独覆盖某个角色的端点列表。
+未配置时只有内置的deepseek端点（即client_maker()的客户端），行为与原来相同。
+"""
+import json
+import os
+import random
+import threading
+import time
+from typing import Dict, List, Optional
+
+from dotenv import load_dotenv
+from openai import OpenAI
+
+from core.agent import DEFAULT_BASE_URL, client_maker, transport
+
+ROLES = ("safety", "analysis", "planning", "codegen", "execute", "summary")
+DEFAULT_ENDPOINT = "deepseek"
+EWMA_ALPHA = 0.2        # 延迟和错误率的滑动平均系数
+ERROR_THRESHOLD = 0.5   # 错误率达到该值时端点暂时下线
+DOWN_SECONDS = 30.0     # 下线时长(秒)，到期后重新参与路由
+EXPLORE_RATE = 0.05     # 按此比例随机选择健康端点，使较慢的端点也能更新延迟统计
+
+
+class Endpoint:
+    """一个OpenAI兼容端点及其滚动统计"""
+    def __init__(self, name: str, model: str, client: OpenAI):
+        self.name = name
+        self.model = model
+        self.client = client
+        self.latency = None     # 延迟的滑动平均(秒)，未调用过为None
+        self.error_rate = 0.0
+        self.calls = 0
+        self.errors = 0
+        self.down_until = 0.0
+
+    @property
+    def key(self):
+        return self.model, str(self.client.base_url)
+
+    @property
+    def healthy(self) -> bool:
+        return time.monotonic() >= self.down_until
+
+    @property
+    def score(self) -> float:
+        """每次成功调用的期望耗时，越小越优先；未调用过的端点为0（优先试用），只失败过的排在最后"""
+        if self.latency is None:
+            return 0.0 if self.errors == 0 else float("inf")
+        return self.latency / max(1.0 - self.error_rate, 0.05)
+
+    def observe(self, latency: float, failed: bool):
+        self.calls += 1
+        self.errors += failed
+        self.error_rate = EWMA_ALPHA * failed + (1 - EWMA_ALPHA) * self.error_rate
+        if failed:
+            if self.error_rate >= ERROR_THRESHOLD:
+                self.down_until = time.monotonic() + DOWN_SECONDS
+        else:
+            self.latency = latency if self.latency is None else EWMA_ALPHA * latency + (1 - EWMA_ALPHA) * self.latency
+
+    def to_dict(self) -> dict:
+        return {
+            "model": self.model,
+            "base_url": str(self.client.base_url),
+            "latency": None if self.latency is None else round(self.latency, 3),
+            "error_rate": round(self.error_rate, 3),
+            "calls": self.calls,
+            "errors": self.errors,
+            "healthy": self.healthy,
+        }
+
+
+class Route(tuple):
+    """route()的结果，即send_message所需的(model_name, client)；请求失败重试时传输层调用reroute()换用同角色的其他端点"""
+    def __new__(cls, router: "ModelRouter", endpoint: Endpoint, client, role: str, llm=None, tried=()):
+        route = super().__new__(cls, (endpoint.model, client))
+        route.router, route.role, route.llm = router, role, llm
+        route.tried = tuple(tried) + (endpoint.name,)
+        return route
+
+    def reroute(self) -> "Route":
+        return self.router.route(self.role, self.llm, self.tried)
+
+
+class ModelRouter:
+    """
+    角色 -> 端点列表；route()在健康的端点中选择按错误率折算后延迟最低的一个，没有统计的端点优先试用；
+    全部下线时选择最早恢复的一个。统计来自传输层的请求回调，线程安全。
+    未给出config时在首次路由时读取load_config()，导入本模块不会创建客户端。
+    """
+    def __init__(self, config: Optional[dict] = None):
+        self._lock = threading.Lock()
+        self.endpoints: Dict[str, Endpoint] = {}
+        self.roles: Dict[str, List[str]] = {}
+        self._by_key: Dict[tuple, Endpoint] = {}
+        if config is not None:
+            self.configure(config)
+        transport.add_listener(self._observe)
+
+    def _ensure(self):
+        if not self.roles:
+            self.configure(load_config())
+
+    def configure(self, config: dict):
+        """按配置重建端点和角色表，格式见模块说明；配置有误时抛出ValueError"""
+        model_name, client = client_maker()
+        endpoints = {DEFAULT_ENDPOINT: Endpoint(DEFAULT_ENDPOINT, model_name, client)}
+        for name, spec in (config.get("endpoints") or {}).items():
+            if not isinstance(spec, dict) or not spec.get("model"):
+                raise ValueError(f"端点{name}缺少model")
+            api_key = spec.get("api_key") or os.getenv(spec.get("api_key_env", ""), "") or "none"
+            client = OpenAI(api_key=api_key, base_url=spec.get("base_url", DEFAULT_BASE_URL))
+            endpoints[name] = Endpoint(name, spec["model"], client)
+
+        roles = {role: list(names) for role, names in (config.get("roles") or {}).items()}
+        for role in ROLES + ("default",):
+            override = os.getenv(f"LLM_ROLE_{role.upper()}")
+            if override:
+                roles[role] = [name.strip() for name in override.split(",") if name.strip()]
+        roles.setdefault("default", [DEFAULT_ENDPOINT])
+        for role, names in roles.items():
+            unknown = [name for name in names if name not in endpoints]
+            if unknown or not names:
+                raise ValueError(f"角色{role}的端点列表为空或包含未定义的端点: {unknown}")
+
+        with self._lock:
+            self.endpoints = endpoints
+            self.roles = roles
+            self._by_key = {endpoint.key: endpoint for endpoint in endpoints.values()}
+
+    def candidates(self, role: str) -> List[Endpoint]:
+        return [self.endpoints[name] for name in self.roles.get(role) or self.roles["default"]]
+
+    def pick(self, role: str, exclude=()) -> Endpoint:
+        """exclude为本次请求已失败的端点名，同角色没有其他端点时仍从全部端点中选择"""
+        self._ensure()
+        with self._lock:
+            candidates = self.candidates(role)
+            candidates = [endpoint for endpoint in candidates if endpoint.name not in exclude] or candidates
+            healthy = [endpoint for endpoint in candidates if endpoint.healthy]
+            if not healthy:
+                return min(candidates, key=lambda endpoint: endpoint.down_until)
+            if len(healthy) > 1 and random.random() < EXPLORE_RATE:
+                return random.choice(healthy)
+            return min(healthy, key=lambda endpoint: endpoint.score)
+
+    def route(self, role: str, llm: OpenAI = None, tried=()) -> Route:
+        """
+        返回send_message所需的(model_name, client)
+        选中内置端点且调用方传入了自己的客户端（如TaskAnalyzer的llm_client）时沿用调用方的客户端
+        """
+        endpoint = self.pick(role, tried)
+        client = llm if endpoint.name == DEFAULT_ENDPOINT and llm is not None else endpoint.client
+        return Route(self, endpoint, client, role, llm, tried)
+
+    def _observe(self, model_name, client, latency, error):
+        base_url = getattr(client, "base_url", None)
+        with self._lock:
+            endpoint = self._by_key.get((model_name, str(base_url)))
+            if endpoint is not None:
+                endpoint.observe(latency, error is not None)
+
+    def metrics(self) -> dict:
+        self._ensure()
+        with self._lock:
+            return {
+                "endpoints": {name: endpoint.to_dict() for name, endpoint in self.endpoints.items()},
+                "roles": {role: list(names) for role, names in self.roles.items()},
+            }
+
+
+def load_config(source: Optional[str] = None) -> dict:
+    """读取模型配置：source（默认环境变量LLM_MODELS）为JSON文本或文件路径，未设置时返回空配置"""
+    load_dotenv()
+    source = source if source is not None else os.getenv("LLM_MODELS", "")
+    if not source.strip():
+        return {}
+    if source.lstrip().startswith("{"):
+        return json.loads(source)
+    with open(source, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+router = ModelRouter()
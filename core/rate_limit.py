@@ -0,0 +1,212 @@
+import asyncio
+import random
+import threading
+import time
+from typing import Callable, Optional
+
+
+class TokenBucket:
+    """
+    令牌桶限速：每秒补充rate个令牌，最多积攒burst个
+    reserve()先预占令牌并返回需要等待的秒数，令牌可以透支，排队的调用依次顺延，
+    因此可以在任意线程中调用，也可以在事件循环里await acquire()。
+    """
+    def __init__(self, rate: float, burst: float = None):
+        if rate <= 0:
+            raise ValueError("rate必须大于0")
+        self.rate = rate
+        self.capacity = burst or max(1.0, rate)
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _refill(self):
+        now = time.monotonic()
+        self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def reserve(self, tokens=1.0) -> float:
+        with self._lock:
+            self._refill()
+            self._tokens -= tokens
+            return max(0.0, -self._tokens / self.rate)
+
+    def adjust(self, tokens: float):
+        """事后修正预占量：正数补扣，负数退还"""
+        with self._lock:
+            self._refill()
+            self._tokens = min(self.capacity, self._tokens - tokens)
+
+    async def acquire(self, tokens=1.0):
+        wait = self.reserve(tokens)
+        if wait > 0:
+            await asyncio.sleep(wait)
+
+
+class CircuitOpenError(RuntimeError):
+    pass
+
+
+class CircuitBreaker:
+    """
+    熔断器：连续threshold次可重试的失败后断开，cooldown秒内的请求原地等待而不是继续冲击服务；
+    冷却结束后只放行一个探测请求，成功则恢复，失败则冷却时间翻倍（不超过max_cooldown）。
+    等待超过max_wait秒仍未恢复时抛出CircuitOpenError。只在单个事件循环内使用。
+    """
+    def __init__(self, threshold=5, cooldown=10.0, max_cooldown=120.0, max_wait=300.0):
+        self.threshold = threshold
+        self.base_cooldown = cooldown
+        self.max_cooldown = max_cooldown
+        self.max_wait = max_wait
+        self.failures = 0
+        self.opens = 0
+        self._cooldown = cooldown
+        self._open_until = None
+        self._probing = False
+
+    @property
+    def state(self) -> str:
+        if self._open_until is None:
+            return "closed"
+        return "open" if time.monotonic() < self._open_until or self._probing else "half_open"
+
+    async def wait(self):
+        deadline = time.monotonic() + self.max_wait
+        while True:
+            state = self.state
+            if state == "closed":
+                return
+            if state == "half_open":
+                self._probing = True
+                return
+            now = time.monotonic()
+            if now >= deadline:
+                raise CircuitOpenError(f"LLM服务连续失败，熔断已持续{self.max_wait:.0f}秒")
+            # 探测请求进行中时轮询等待其结果
+            delay = 0.2 if self._probing else self._open_until - now
+            await asyncio.sleep(min(max(delay, 0.01), deadline - now))
+
+    def success(self):
+        self.failures = 0
+        self._open_until = None
+        self._probing = False
+        self._cooldown = self.base_cooldown
+
+    def release(self):
+        """探测请求被取消（既未成功也未失败）时，把探测机会让给下一个请求"""
+        self._probing = False
+
+    def failure(self):
+        self.failures += 1
+        if self._probing:
+            self._probing = False
+            self._cooldown = min(self._cooldown * 2, self.max_cooldown)
+            self._trip()
+        elif self._open_until is None and self.failures >= self.threshold:
+            self._trip()
+
+    def _trip(self):
+        self._open_until = time.monotonic() + self._cooldown
+        self.opens += 1
+
+
+class CallGovernor:
+    """
+    所有LLM调用共用的调度器：每分钟请求数(rpm)和token数(tpm)两个令牌桶限速，
+    可重试错误按带抖动的指数退避重试，连续失败时由熔断器暂停发送，并统计排队和重试指标。
+    retryable(exc)判断异常能否重试，retry_after(exc)返回服务端建议的等待秒数（没有则为None）。
+    """
+    BURST_SECONDS = 10  # 令牌桶最多积攒10秒的额度
+
+    def __init__(self, rpm=0.0, tpm=0.0, max_retries=4, backoff_base=0.5, backoff_max=30.0,
+                 breaker: CircuitBreaker = None,
+                 retryable: Callable[[BaseException], bool] = None,
+                 retry_after: Callable[[BaseException], Optional[float]] = None):
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.breaker = breaker or CircuitBreaker()
+        self.retryable = retryable or (lambda exc: False)
+        self.retry_after = retry_after or (lambda exc: None)
+        self.rpm_bucket = self.tpm_bucket = None
+        self.configure(rpm, tpm)
+        self.requests = 0
+        self.retries = 0
+        self.failures = 0
+        self.giveups = 0
+        self.throttled = 0
+        self.waiting = 0
+        self.wait_total = 0.0
+        self.wait_max = 0.0
+
+    def configure(self, rpm=None, tpm=None):
+        """调整限额，0为不限，None为保持不变"""
+        if rpm is not None:
+            self.rpm_bucket = TokenBucket(rpm / 60, rpm / 60 * self.BURST_SECONDS) if rpm > 0 else None
+        if tpm is not None:
+            self.tpm_bucket = TokenBucket(tpm / 60, tpm / 60 * self.BURST_SECONDS) if tpm > 0 else None
+
+    async def admit(self, tokens: float):
+        """发送前排队：熔断器 -> 请求数限额 -> token限额"""
+        start = time.monotonic()
+        self.waiting += 1
+        try:
+            await self.breaker.wait()
+            if self.rpm_bucket is not None:
+                await self.rpm_bucket.acquire()
+            if self.tpm_bucket is not None:
+                await self.tpm_bucket.acquire(tokens)
+        finally:
+            self.waiting -= 1
+        waited = time.monotonic() - start
+        self.requests += 1
+        if waited > 0.001:
+            self.throttled += 1
+            self.wait_total += waited
+            self.wait_max = max(self.wait_max, waited)
+
+    def settle(self, estimated: float, actual: float):
+        """按实际用量修正token桶"""
+        if self.tpm_bucket is not None and actual != estimated:
+            self.tpm_bucket.adjust(actual - estimated)
+
+    def backoff(self, attempt: int, exc: BaseException) -> float:
+        """第attempt次重试前的等待：优先采用服务端的Retry-After，否则为全抖动指数退避"""
+        hint = self.retry_after(exc)
+        if hint is not None:
+            return min(max(hint, 0.0), self.backoff_max)
+        return random.uniform(0, min(self.backoff_max, self.backoff_base * 2 ** attempt))
+
+    def on_success(self):
+        self.breaker.success()
+
+    def on_error(self, exc: BaseException, attempt: int) -> Optional[float]:
+        """记录一次失败，返回重试前应等待的秒数；不可重试或次数用尽时返回None"""
+        if not self.retryable(exc):
+            # 服务端能正常拒绝请求，说明服务本身可用
+            self.breaker.success()
+            return None
+        self.failures += 1
+        self.breaker.failure()
+        if attempt >= self.max_retries:
+            self.giveups += 1
+            return None
+        self.retries += 1
+        return self.backoff(attempt, exc)
+
+    def on_abort(self):
+        self.breaker.release()
+
+    def metrics(self) -> dict:
+        return {
+            "requests": self.requests,
+            "retries": self.retries,
+            "failures": self.failures,
+            "giveups": self.giveups,
+            "throttled": self.throttled,
+            "waiting": self.waiting,
+            "wait_total": round(self.wait_total, 3),
+            "wait_max": round(self.wait_max, 3),
+            "breaker": self.breaker.state,
+            "breaker_opens": self.breaker.opens,
+        }
@@ -0,0 +1,281 @@
+import atexit
+import concurrent.futures
+import inspect
+import multiprocessing
+import os
+import queue
+import threading
+import time
+
+from core.cancel import TaskCancelled, check_cancelled
+
+try:
+    import resource  # 仅POSIX系统可用
+except ImportError:
+    resource = None
+
+SANDBOX_WORKERS = int(os.getenv("TOOL_SANDBOX_WORKERS", "4"))
+SANDBOX_MEMORY_MB = int(os.getenv("TOOL_SANDBOX_MEMORY_MB", "1024"))  # 单个工作进程的内存上限
+SANDBOX_CPU_SECONDS = int(os.getenv("TOOL_SANDBOX_CPU_SECONDS", "60"))  # 单次调用的CPU时间上限
+
+
+class ToolTimeout(Exception):
+    pass
+
+
+class ToolCrashed(Exception):
+    pass
+
+
+def _apply_limits(memory_mb):
+    if resource is None:
+        return
+    if memory_mb:
+        limit = memory_mb * 1024 * 1024
+        try:
+            resource.setrlimit(resource.RLIMIT_AS, (limit, limit))
+        except (ValueError, OSError):
+            pass
+
+
+def _limit_cpu(cpu_seconds):
+    """把CPU软上限设为已用时间+本次额度，超出时进程收到SIGXCPU退出"""
+    if resource is None or not cpu_seconds:
+        return
+    used = resource.getrusage(resource.RUSAGE_SELF)
+    _, hard = resource.getrlimit(resource.RLIMIT_CPU)
+    soft = int(used.ru_utime + used.ru_stime) + cpu_seconds
+    if hard != resource.RLIM_INFINITY:
+        soft = min(soft, hard)
+    try:
+        resource.setrlimit(resource.RLIMIT_CPU, (soft, hard))
+    except (ValueError, OSError):
+        pass
+
+
+def _worker_main(conn, memory_mb, cpu_seconds):
+    """
+    工作进程主循环：常驻并缓存已导入的工具模块，逐个执行管道发来的请求
+    请求为(action, 工具名, 工具目录, 参数)：action为call时执行工具，为load时只导入模块并检查执行函数能否以一个参数调用
+    """
+    from core.tool_loader import tool_modules
+
+    _apply_limits(memory_mb)
+    while True:
+        try:
+            request = conn.recv()
+        except (EOFError, OSError):
+            break
+        if request is None:
+            break
+        action, tool_name, tools_dir, args = request
+        _limit_cpu(cpu_seconds)
+        try:
+            if action == "load":
+                tool_modules.invalidate(tool_name, tools_dir)
+            func = tool_modules.get(tool_name, tools_dir)
+            if action == "load":
+                try:
+                    inspect.signature(func).bind({})
+                except TypeError:
+                    raise TypeError(f"执行函数execute_{tool_name}须接受一个参数(args)")
+                result = ""
+            else:
+                result = func(args)
+            conn.send(("ok", result if isinstance(result, str) else str(result)))
+        except MemoryError:
+            conn.send(("error", "工具超出内存限制"))
+        except Exception as e:
+            conn.send(("error", str(e)))
+
+
+class _Worker:
+    def __init__(self, context, memory_mb, cpu_seconds):
+        self.conn, child_conn = context.Pipe()
+        self.process = context.Process(
+            target=_worker_main, args=(child_conn, memory_mb, cpu_seconds), daemon=True
+        )
+        self.process.start()
+        child_conn.close()
+
+    def kill(self):
+        try:
+            self.process.kill()
+            self.process.join(1)
+        finally:
+            self.conn.close()
+
+
+class ToolWorkerPool:
+    """
+    预先启动的工具沙箱进程池
+    工具在独立进程中执行，进程常驻以复用已导入的模块和第三方库；超时、崩溃或超出资源限制时
+    只结束该进程并自动补充新进程，主进程不受影响。结果通过管道返回。
+    内存/CPU限制依赖resource模块，Windows上只有超时和崩溃隔离生效。
+    """
+    def __init__(self, size=SANDBOX_WORKERS, memory_mb=SANDBOX_MEMORY_MB, cpu_seconds=SANDBOX_CPU_SECONDS):
+        self.size = size
+        self.memory_mb = memory_mb
+        self.cpu_seconds = cpu_seconds
+        self._context = multiprocessing.get_context("spawn")
+        self._idle = queue.Queue()
+        self._lock = threading.Lock()
+        self._closed = False
+        self.respawns = 0
+        for _ in range(size):
+            self._idle.put(self._spawn())
+
+    def _spawn(self):
+        return _Worker(self._context, self.memory_mb, self.cpu_seconds)
+
+    def _replace(self, worker):
+        worker.kill()
+        with self._lock:
+            self.respawns += 1
+            if self._closed:
+                return
+        self._idle.put(self._spawn())
+
+    def call(self, tool_name: str, tools_dir: str, args: dict, timeout=None, deadline=None) -> str:
+        """
+        在空闲工作进程中执行工具，返回结果字符串
+        deadline为取得空闲进程的最晚时间(time.perf_counter())，到时仍没有空闲进程则抛出ToolTimeout，工具不会执行；
+        timeout从取得进程后开始计时，超时抛出ToolTimeout，进程异常退出抛出ToolCrashed
+        """
+        return self._request("call", tool_name, tools_dir, args, timeout, deadline)
+
+    def load(self, tool_name: str, tools_dir: str, timeout=None, deadline=None):
+        """在工作进程中导入工具模块并检查执行函数，失败时抛出异常；模块顶层代码不会在本进程中运行"""
+        self._request("load", tool_name, tools_dir, None, timeout, deadline)
+
+    def _request(self, action, tool_name, tools_dir, args, timeout, deadline) -> str:
+        try:
+            worker = self._idle.get(timeout=None if deadline is None else max(0.0, deadline - time.perf_counter()))
+        except queue.Empty:
+            raise ToolTimeout(f"等待空闲沙箱进程超时，工具{tool_name}未执行")
+        try:
+            check_cancelled()
+        except TaskCancelled:
+            self._idle.put(worker)
+            raise
+        start = time.perf_counter()
+        try:
+            worker.conn.send((action, tool_name, os.path.abspath(tools_dir), args))
+            if not worker.conn.poll(timeout):
+                self._replace(worker)
+                raise ToolTimeout(f"工具{tool_name}超过{timeout}s未返回，已终止其工作进程")
+            status, result = worker.conn.recv()
+        except (EOFError, OSError):
+            worker.process.join(0.5)
+            exitcode = worker.process.exitcode
+            self._replace(worker)
+            raise ToolCrashed(f"工具{tool_name}的工作进程异常退出(exitcode={exitcode}, {time.perf_counter() - start:.2f}s)")
+        self._idle.put(worker)
+        if status == "error":
+            raise RuntimeError(result)
+        return result
+
+    def shutdown(self):
+        with self._lock:
+            self._closed = True
+        while True:
+            try:
+                worker = self._idle.get_nowait()
+            except queue.Empty:
+                break
+            try:
+                worker.conn.send(None)
+            except OSError:
+                pass
+            worker.kill()
+
+
+class ToolThreadPool:
+    """
+    并发执行工具调用的线程池
+    线程无法强行终止，调用超时后由abandon()把执行它的线程记为泄漏并不再计入线程数，
+    需要时补充新线程，挂起的工具不会占满线程池；泄漏的线程在工具返回后自行退出。
+    """
+    def __init__(self, size: int, name="tool"):
+        self.size = size
+        self.name = name
+        self.leaked = {}  # 泄漏的线程名 -> 工具调用说明
+        self._tasks = queue.SimpleQueue()
+        self._lock = threading.Lock()
+        self._idle = threading.Semaphore(0)
+        self._running = {}  # future -> 执行它的线程
+        self._threads = 0
+        self._serial = 0
+
+    def submit(self, fn, *args) -> concurrent.futures.Future:
+        future = concurrent.futures.Future()
+        future.started = threading.Event()  # 调用开始执行（或被取消）时置位
+        future.started_at = None
+        self._tasks.put((future, fn, args))
+        if not self._idle.acquire(blocking=False):
+            with self._lock:
+                if self._threads < self.size:
+                    self._start()
+        return future
+
+    def _start(self):
+        self._serial += 1
+        self._threads += 1
+        threading.Thread(target=self._work, name=f"{self.name}-{self._serial}", daemon=True).start()
+
+    def _work(self):
+        thread = threading.current_thread()
+        while True:
+            future, fn, args = self._tasks.get()
+            if not future.set_running_or_notify_cancel():
+                future.started.set()
+            else:
+                with self._lock:
+                    self._running[future] = thread
+                future.started_at = time.perf_counter()
+                future.started.set()
+                try:
+                    future.set_result(fn(*args))
+                except BaseException as e:
+                    future.set_exception(e)
+                with self._lock:
+                    self._running.pop(future, None)
+                    if self.leaked.pop(thread.name, None) is not None:
+                        return
+            self._idle.release()
+
+    def result(self, future, timeout: float):
+        """等待调用结果，时限从调用实际开始执行时算起，排队等待线程的时间不计入；超时抛出concurrent.futures.TimeoutError"""
+        future.started.wait()
+        if future.started_at is None:
+            return future.result(timeout=0)
+        return future.result(timeout=max(0.0, future.started_at + timeout - time.perf_counter()))
+
+    def abandon(self, future, description="") -> str:
+        """放弃等待超时的调用，返回执行它的线程名；调用尚未开始时直接取消，返回空字符串"""
+        if future.cancel():
+            return ""
+        with self._lock:
+            thread = self._running.get(future)
+            if thread is None:
+                return ""
+            if thread.name not in self.leaked:
+                self.leaked[thread.name] = description
+                self._threads -= 1
+                if not self._tasks.empty():
+                    self._start()
+        return thread.name
+
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def get_sandbox() -> ToolWorkerPool:
+    """进程内共享的沙箱进程池，首次使用时启动"""
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = ToolWorkerPool()
+            atexit.register(_pool.shutdown)
+        return _pool
@@ -0,0 +1,355 @@
+"""
+本地HTTP服务：提交任务得到id，由有界的worker池执行，过程日志和流式输出通过SSE推送
+
+    python main.py --serve --port 8080 --workers 4
+
+    POST   /jobs               {"task": "...", "pipeline": true, "planner": "graph", "fused": true}  -> 202 {"id": ..., "status": "queued"}
+    GET    /jobs               全部任务的状态
+    GET    /jobs/<id>          单个任务的状态和结果
+    GET    /jobs/<id>/events   SSE事件流：status、log、stream、final，结束时为done；断线重连可带Last-Event-ID
+    POST   /jobs/<id>/cancel   取消任务（DELETE /jobs/<id> 同义）；运行中的任务在下一个检查点停止
+    GET    /health             各状态的任务数、LLM调用的排队、重试、熔断指标和各模型端点的延迟、错误率
+"""
+import json
+import queue
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Callable, List, Optional
+from urllib.parse import urlparse
+
+from core.agent import client_maker, transport
+from core.analyze import TaskAnalyzer
+from core.cancel import CancelToken, TaskCancelled, cancel_var
+from core.models import router
+
+MAX_BODY = 1024 * 1024
+KEEPALIVE_INTERVAL = 15  # SSE空闲时发送注释行的间隔(秒)，顺便发现已断开的客户端
+
+
+class CallbackSignal:
+    """与pyqtSignal接口相同（connect/emit）的回调列表，用于没有Qt事件循环的场景"""
+    def __init__(self):
+        self._slots: List[Callable] = []
+
+    def connect(self, slot: Callable):
+        self._slots.append(slot)
+
+    def emit(self, *args):
+        for slot in list(self._slots):
+            slot(*args)
+
+
+class CallbackStreamHandler:
+    """不依赖Qt的StreamHandler，可直接传给TaskAnalyzer/ManagerAgent"""
+    def __init__(self):
+        self.stream_received = CallbackSignal()
+        self.final_received = CallbackSignal()
+
+
+class Job:
+    FINISHED = ("done", "failed", "cancelled")
+
+    def __init__(self, task: str, options: dict):
+        self.id = uuid.uuid4().hex[:12]
+        self.task = task
+        self.options = options
+        self.status = "queued"
+        self.result = None
+        self.error = None
+        self.created = time.time()
+        self.started = None
+        self.finished = None
+        self.token = CancelToken()
+        self.events = [("status", {"status": "queued"})]  # (事件类型, 数据)，下标即SSE的事件id
+        self._cond = threading.Condition()
+
+    @property
+    def done(self):
+        return self.status in self.FINISHED
+
+    def emit(self, event: str, data):
+        with self._cond:
+            self.events.append((event, data))
+            self._cond.notify_all()
+
+    def set_status(self, status: str, expected=None, **fields) -> bool:
+        """切换状态；指定expected时只有当前状态与之相同才切换，返回是否切换"""
+        with self._cond:
+            if expected is not None and self.status != expected:
+                return False
+            self.status = status
+            for key, value in fields.items():
+                setattr(self, key, value)
+            self.events.append(("status", {"status": status}))
+            if self.done:
+                self.finished = time.time()
+                self.events.append(("done", self.to_dict()))
+            self._cond.notify_all()
+            return True
+
+    def wait_events(self, since: int, timeout: float):
+        """返回下标since之后的事件，没有新事件时最多等待timeout秒"""
+        with self._cond:
+            if since >= len(self.events) and not self.done:
+                self._cond.wait(timeout)
+            return self.events[since:]
+
+    def to_dict(self) -> dict:
+        return {
+            "id": self.id, "task": self.task, "status": self.status,
+            "result": self.result, "error": self.error,
+            "created": self.created, "started": self.started, "finished": self.finished,
+        }
+
+
+class JobManager:
+    """
+    任务队列和worker池
+    workers: 同时执行的任务数；queue_size: 排队上限，满了之后拒绝新任务；history: 保留的已结束任务数
+    """
+    def __init__(self, llm_client=None, workers=4, queue_size=100, history=200):
+        self.llm = llm_client or client_maker()[1]
+        self.history = history
+        self._queue = queue.Queue(queue_size)
+        self._jobs: "OrderedDict[str, Job]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._threads = [
+            threading.Thread(target=self._worker, name=f"job-worker-{i}", daemon=True) for i in range(max(1, workers))
+        ]
+        for thread in self._threads:
+            thread.start()
+
+    def submit(self, task: str, **options) -> Job:
+        """加入队列，队列已满时抛出queue.Full"""
+        job = Job(task, options)
+        with self._lock:
+            self._jobs[job.id] = job
+            self._evict()
+        try:
+            self._queue.put_nowait(job)
+        except queue.Full:
+            with self._lock:
+                self._jobs.pop(job.id, None)
+            raise
+        return job
+
+    def _evict(self):
+        finished = [job_id for job_id, job in self._jobs.items() if job.done]
+        for job_id in finished[:max(0, len(finished) - self.history)]:
+            del self._jobs[job_id]
+
+    def get(self, job_id: str) -> Optional[Job]:
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def jobs(self) -> List[Job]:
+        with self._lock:
+            return list(self._jobs.values())
+
+    def cancel(self, job_id: str) -> Optional[Job]:
+        job = self.get(job_id)
+        if job is None or job.done:
+            return job
+        job.token.cancel()
+        job.set_status("cancelled", expected="queued")
+        return job
+
+    def stats(self) -> dict:
+        jobs = self.jobs()
+        return {status: sum(job.status == status for job in jobs) for status in ("queued", "running", *Job.FINISHED)}
+
+    def _worker(self):
+        while True:
+            job = self._queue.get()
+            # 排队时已取消的任务直接跳过
+            if job.set_status("running", expected="queued", started=time.time()):
+                self._run(job)
+            self._queue.task_done()
+
+    def _run(self, job: Job):
+        handler = CallbackStreamHandler()
+        handler.stream_received.connect(lambda text: job.emit("stream", {"text": text}))
+        handler.final_received.connect(lambda text: job.emit("final", {"text": text}))
+        analyzer = TaskAnalyzer(self.llm, stream_handler=handler,
+                                pipeline=job.options.get("pipeline"), planner=job.options.get("planner"),
+                                fused=job.options.get("fused"))
+        token = cancel_var.set(job.token)
+        try:
+            result = analyzer.analyze_and_execute(
+                job.task, log_callback=lambda message: job.emit("log", {"message": message}), task_id=job.id
+            )
+            job.set_status("done", result=result)
+        except TaskCancelled:
+            job.set_status("cancelled")
+        except Exception as e:
+            job.set_status("failed", error=f"{type(e).__name__}: {e}")
+        finally:
+            cancel_var.reset(token)
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    manager: JobManager = None
+
+    def log_message(self, format, *args):
+        pass
+
+    def _send_json(self, status: int, body):
+        data = json.dumps(body, ensure_ascii=False).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json; charset=utf-8")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def _route(self):
+        parts = [part for part in urlparse(self.path).path.split("/") if part]
+        job = self.manager.get(parts[1]) if len(parts) >= 2 and parts[0] == "jobs" else None
+        return parts, job
+
+    def do_GET(self):
+        parts, job = self._route()
+        if parts == ["health"]:
+            self._send_json(200, {"status": "ok", "jobs": self.manager.stats(), "llm": transport.governor.metrics(),
+                                  "models": router.metrics()})
+        elif parts == ["jobs"]:
+            self._send_json(200, [job.to_dict() for job in self.manager.jobs()])
+        elif job is None:
+            self._send_json(404, {"error": "任务不存在"})
+        elif len(parts) == 2:
+            self._send_json(200, job.to_dict())
+        elif len(parts) == 3 and parts[2] == "events":
+            self._stream_events(job)
+        else:
+            self._send_json(404, {"error": "未知的路径"})
+
+    def do_POST(self):
+        parts, job = self._route()
+        if parts == ["jobs"]:
+            self._submit()
+        elif len(parts) == 3 and parts[2] == "cancel" and job is not None:
+            self._send_json(200, self.manager.cancel(job.id).to_dict())
+        else:
+            self._send_json(404, {"error": "任务不存在" if len(parts) == 3 else "未知的路径"})
+
+    def do_DELETE(self):
+        parts, job = self._route()
+        if len(parts) == 2 and job is not None:
+            self._send_json(200, self.manager.cancel(job.id).to_dict())
+        else:
+            self._send_json(404, {"error": "任务不存在"})
+
+    def _int_header(self, name: str):
+        """读取非负整数请求头，缺失返回None，格式不合法时抛出ValueError"""
+        value = self.headers.get(name)
+        if value is None:
+            return None
+        value = int(value.strip())
+        if value < 0:
+            raise ValueError(f"{name}不能为负数")
+        return value
+
+    def _submit(self):
+        try:
+            length = self._int_header("Content-Length")
+        except ValueError:
+            length = -1
+        if length is None or length < 0 or length > MAX_BODY:
+            # 请求体未读取，不能继续复用该连接
+            self.close_connection = True
+            if length is None:
+                self._send_json(411, {"error": "缺少Content-Length"})
+            elif length < 0:
+                self._send_json(400, {"error": "Content-Length不合法"})
+            else:
+                self._send_json(413, {"error": "请求体过大"})
+            return
+        try:
+            body = json.loads(self.rfile.read(length) or b"{}")
+        except json.JSONDecodeError:
+            self._send_json(400, {"error": "请求体不是合法的JSON"})
+            return
+        task = body.get("task") if isinstance(body, dict) else None
+        if not isinstance(task, str) or not task.strip():
+            self._send_json(400, {"error": "缺少task字段"})
+            return
+        try:
+            job = self.manager.submit(task, pipeline=body.get("pipeline"), planner=body.get("planner"), fused=body.get("fused"))
+        except queue.Full:
+            self._send_json(503, {"error": "任务队列已满，请稍后重试"})
+            return
+        self._send_json(202, {"id": job.id, "status": job.status})
+
+    def _stream_events(self, job: Job):
+        # 在发送响应头之前校验，格式不合法时返回400
+        try:
+            last_id = self._int_header("Last-Event-ID")
+        except ValueError:
+            self._send_json(400, {"error": "Last-Event-ID不合法"})
+            return
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream; charset=utf-8")
+        self.send_header("Cache-Control", "no-cache")
+        self.send_header("Connection", "close")
+        self.end_headers()
+        self.close_connection = True
+        since = 0 if last_id is None else last_id + 1
+        try:
+            while True:
+                events = job.wait_events(since, KEEPALIVE_INTERVAL)
+                if not events:
+                    if job.done:
+                        break
+                    self.wfile.write(b": keep-alive\n\n")
+                    self.wfile.flush()
+                    continue
+                lines = []
+                for offset, (event, data) in enumerate(events):
+                    lines.append(f"id: {since + offset}\nevent: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n")
+                since += len(events)
+                self.wfile.write("".join(lines).encode("utf-8"))
+                self.wfile.flush()
+                if events[-1][0] == "done":
+                    break
+        except (BrokenPipeError, ConnectionResetError):
+            pass  # 客户端断开，任务继续执行
+
+
+class TaskServer:
+    """HTTP服务，请求处理在各自的线程中进行，任务执行在JobManager的worker中进行"""
+    def __init__(self, manager: JobManager, host="127.0.0.1", port=8080):
+        self.manager = manager
+        handler = type("Handler", (_Handler,), {"manager": manager})
+        self._server = ThreadingHTTPServer((host, port), handler)
+        self._server.daemon_threads = True
+
+    @property
+    def base_url(self):
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def serve_forever(self):
+        self._server.serve_forever()
+
+    def start(self):
+        """在后台线程中运行，返回服务地址"""
+        threading.Thread(target=self._server.serve_forever, name="task-server", daemon=True).start()
+        return self.base_url
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+
+def main(args):
+    """命令行入口，参数见main.py"""
+    server = TaskServer(JobManager(workers=args.workers, queue_size=args.queue_size), args.host, args.port)
+    print(f"[SERVE] 服务已启动: {server.base_url}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        server.stop()
+    return 0
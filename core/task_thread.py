@@ -1,16 +1,32 @@
-from PyQt5.QtCore import QThread, pyqtSignal
+from PyQt5.QtCore import QObject, QThread, pyqtSignal
+
+from core.cancel import CancelToken, TaskCancelled, cancel_var
+
+
+class StreamHandler(QObject):
+    """处理流式输出的信号类"""
+    stream_received = pyqtSignal(str)  # 流式内容信号
+    final_received = pyqtSignal(str)   # 最终结果信号
+
 
 class TaskThread(QThread):
     log_received = pyqtSignal(str)
     task_completed = pyqtSignal(str)
+    task_cancelled = pyqtSignal()
     
     def __init__(self, task_func, task_args=(), stream_handler=None):
         super().__init__()
         self.task_func = task_func
         self.task_args = task_args
         self.stream_handler = stream_handler
+        self.cancel_token = CancelToken()
+
+    def cancel(self):
+        """协作式取消：任务在下一次LLM请求或下一步骤前停止"""
+        self.cancel_token.cancel()
     
     def run(self):
+        token = cancel_var.set(self.cancel_token)
         try:
             def log(message):
                 self.log_received.emit(message)
@@ -22,6 +38,10 @@ class TaskThread(QThread):
                 result = self.task_func(*self.task_args, log_callback=log)
                 
             self.task_completed.emit(result)
+        except TaskCancelled:
+            self.task_cancelled.emit()
         except Exception as e:
             self.log_received.emit(f"[ERROR] {str(e)}")
-            self.task_completed.emit("")
\ No newline at end of file
+            self.task_completed.emit("")
+        finally:
+            cancel_var.reset(token)
@@ -0,0 +1,99 @@
+import importlib.util
+import os
+import threading
+import time
+from collections.abc import Mapping
+from typing import Callable, Iterable
+
+
+class ToolModuleCache:
+    """
+    进程级的工具模块缓存
+    以文件路径为键，记录(mtime, 大小)签名；文件未变化时直接复用已导入的执行函数，变化后只重新导入这一个模块
+    """
+    def __init__(self):
+        self._entries = {}  # path -> (signature, func 或 异常)
+        self._locks = {}
+        self._lock = threading.Lock()
+        self.timings = {}   # tool_name -> 最近一次导入耗时(秒)
+        self.loads = 0
+        self.hits = 0
+
+    @staticmethod
+    def module_path(tool_name: str, tools_dir: str) -> str:
+        return os.path.join(tools_dir, f"{tool_name}.py")
+
+    def _path_lock(self, path):
+        with self._lock:
+            return self._locks.setdefault(path, threading.Lock())
+
+    def get(self, tool_name: str, tools_dir: str) -> Callable:
+        """取得工具的执行函数，必要时导入模块；缺少文件或执行函数时抛出异常"""
+        path = self.module_path(tool_name, tools_dir)
+        stat = os.stat(path)
+        signature = (stat.st_mtime_ns, stat.st_size)
+        with self._path_lock(path):
+            entry = self._entries.get(path)
+            if entry is None or entry[0] != signature:
+                entry = (signature, self._import(tool_name, path))
+                self._entries[path] = entry
+            else:
+                self.hits += 1
+        if isinstance(entry[1], Exception):
+            raise entry[1]
+        return entry[1]
+
+    def _import(self, tool_name, path):
+        start = time.perf_counter()
+        try:
+            spec = importlib.util.spec_from_file_location(tool_name, path)
+            module = importlib.util.module_from_spec(spec)
+            spec.loader.exec_module(module)
+            func_name = f"execute_{tool_name}"
+            if not hasattr(module, func_name):
+                return AttributeError(f"工具{tool_name}缺少执行函数{func_name}")
+            return getattr(module, func_name)
+        except Exception as e:
+            return ImportError(f"加载工具{tool_name}失败: {str(e)}")
+        finally:
+            self.loads += 1
+            self.timings[tool_name] = time.perf_counter() - start
+
+    def invalidate(self, tool_name: str, tools_dir: str):
+        """丢弃某个工具的缓存，下次调用时重新导入"""
+        with self._path_lock(self.module_path(tool_name, tools_dir)):
+            self._entries.pop(self.module_path(tool_name, tools_dir), None)
+
+    def stats(self) -> dict:
+        return {
+            "modules": len(self._entries),
+            "loads": self.loads,
+            "hits": self.hits,
+            "total_load_time": sum(self.timings.values()),
+            "slowest": sorted(self.timings.items(), key=lambda item: item[1], reverse=True)[:5],
+        }
+
+
+tool_modules = ToolModuleCache()
+
+
+class LazyImplementations(Mapping):
+    """工具名到执行函数的惰性映射，首次取用某个工具时才导入其模块"""
+    def __init__(self, tool_names: Iterable[str], tools_dir: str, cache: ToolModuleCache = tool_modules):
+        self._names = tool_names  # 只需支持in和迭代，可以是工具注册表
+        self._tools_dir = tools_dir
+        self._cache = cache
+
+    def __contains__(self, tool_name):
+        return tool_name in self._names and os.path.exists(ToolModuleCache.module_path(tool_name, self._tools_dir))
+
+    def __getitem__(self, tool_name):
+        if tool_name not in self:
+            raise KeyError(tool_name)
+        return self._cache.get(tool_name, self._tools_dir)
+
+    def __iter__(self):
+        return (name for name in self._names if name in self)
+
+    def __len__(self):
+        return sum(1 for _ in self)
@@ -0,0 +1,209 @@
+import json
+import math
+import os
+import re
+import sqlite3
+import threading
+from collections import Counter
+from collections.abc import Mapping
+from typing import Dict, List, Tuple
+
+_WORD = re.compile(r"[a-z0-9]+")
+_CJK_RUN = re.compile(r"[一-鿿]+")
+
+
+def tokenize(text: str) -> List[str]:
+    """词法切分：英文/数字按单词（snake_case按下划线拆开），中文取单字和相邻二字"""
+    text = text.lower()
+    tokens = _WORD.findall(text)
+    for run in _CJK_RUN.findall(text):
+        tokens.extend(run)
+        tokens.extend(run[i:i + 2] for i in range(len(run) - 1))
+    return tokens
+
+
+def similarity(a: str, b: str) -> float:
+    """两段文本词法向量的余弦相似度"""
+    va, vb = Counter(tokenize(a)), Counter(tokenize(b))
+    if not va or not vb:
+        return 0.0
+    dot = sum(count * vb[term] for term, count in va.items())
+    return dot / (math.sqrt(sum(c * c for c in va.values())) * math.sqrt(sum(c * c for c in vb.values())))
+
+
+def describe(tool_def: dict) -> str:
+    """工具的名称+描述文本"""
+    function = tool_def["function"]
+    return f"{function['name']} {function.get('description', '')}"
+
+
+class ToolRegistry(Mapping):
+    """
+    基于sqlite的工具注册表，name -> 工具定义
+    工具名和描述建立倒排索引，search()按BM25返回与子任务最相关的k个工具，无需把全部定义放进提示词
+    tools.json与注册表保持一致：文件有变化时批量导入，upsert()的新工具同时写回文件
+    """
+    K1 = 1.5
+    B = 0.75
+
+    def __init__(self, path="tools.db", json_path="tools.json"):
+        self.path = path
+        self.json_path = json_path
+        self._lock = threading.Lock()
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._db.executescript("""
+            CREATE TABLE IF NOT EXISTS tools (name TEXT PRIMARY KEY, definition TEXT, length INTEGER);
+            CREATE TABLE IF NOT EXISTS postings (term TEXT, name TEXT, tf INTEGER);
+            CREATE INDEX IF NOT EXISTS postings_term ON postings (term);
+            CREATE INDEX IF NOT EXISTS postings_name ON postings (name);
+            CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT);
+        """)
+        self._db.commit()
+        if json_path:
+            self._sync_json(json_path)
+
+    def _sync_json(self, json_path):
+        """tools.json有变化（或首次使用）时批量导入"""
+        if not os.path.exists(json_path):
+            return
+        mtime = str(os.stat(json_path).st_mtime_ns)
+        with self._lock:
+            row = self._db.execute("SELECT value FROM meta WHERE key = ?", (json_path,)).fetchone()
+        if row is None or row[0] != mtime:
+            self.import_json(json_path)
+            with self._lock:
+                self._remember_mtime(json_path)
+                self._db.commit()
+
+    def _remember_mtime(self, json_path):
+        mtime = str(os.stat(json_path).st_mtime_ns)
+        self._db.execute("INSERT OR REPLACE INTO meta VALUES (?, ?)", (json_path, mtime))
+
+    def _write_json(self, tool_def: dict):
+        """把工具定义写回tools.json（同名替换，否则追加），先写临时文件再替换，并记下新的mtime以免重复导入"""
+        try:
+            with open(self.json_path, 'r', encoding='utf-8') as f:
+                tools = json.load(f).get("tools", [])
+        except (FileNotFoundError, json.JSONDecodeError):
+            tools = []
+        name = tool_def["function"]["name"]
+        index = next((i for i, tool in enumerate(tools) if tool["function"]["name"] == name), None)
+        if index is None:
+            tools.append(tool_def)
+        else:
+            tools[index] = tool_def
+        os.makedirs(os.path.dirname(self.json_path) or ".", exist_ok=True)
+        tmp_path = f"{self.json_path}.{os.getpid()}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump({"tools": tools}, f, indent=2, ensure_ascii=False)
+        os.replace(tmp_path, self.json_path)
+        self._remember_mtime(self.json_path)
+
+    def import_json(self, json_path="tools.json") -> int:
+        """从tools.json批量导入工具定义，文件中已删除的工具同时从注册表删除，返回导入数量"""
+        try:
+            with open(json_path, 'r', encoding='utf-8') as f:
+                tools = json.load(f).get("tools", [])
+        except (FileNotFoundError, json.JSONDecodeError):
+            return 0
+        names = {tool_def["function"]["name"] for tool_def in tools}
+        with self._lock:
+            for tool_def in tools:
+                self._upsert(tool_def)
+            removed = [row[0] for row in self._db.execute("SELECT name FROM tools") if row[0] not in names]
+            for name in removed:
+                self._delete(name)
+            self._db.commit()
+        return len(tools)
+
+    @staticmethod
+    def _document(tool_def: dict) -> List[str]:
+        return tokenize(describe(tool_def))
+
+    def _upsert(self, tool_def: dict):
+        name = tool_def["function"]["name"]
+        terms = Counter(self._document(tool_def))
+        self._db.execute("DELETE FROM postings WHERE name = ?", (name,))
+        self._db.execute(
+            "INSERT OR REPLACE INTO tools VALUES (?, ?, ?)",
+            (name, json.dumps(tool_def, ensure_ascii=False), sum(terms.values()))
+        )
+        self._db.executemany("INSERT INTO postings VALUES (?, ?, ?)", [(t, name, tf) for t, tf in terms.items()])
+
+    def _delete(self, name: str):
+        self._db.execute("DELETE FROM postings WHERE name = ?", (name,))
+        self._db.execute("DELETE FROM tools WHERE name = ?", (name,))
+
+    def upsert(self, tool_def: dict):
+        """新增或更新一个工具定义，设置了json_path时同时写回tools.json"""
+        with self._lock:
+            self._upsert(tool_def)
+            if self.json_path:
+                self._write_json(tool_def)
+            self._db.commit()
+
+    def __getitem__(self, name):
+        with self._lock:
+            row = self._db.execute("SELECT definition FROM tools WHERE name = ?", (name,)).fetchone()
+        if row is None:
+            raise KeyError(name)
+        return json.loads(row[0])
+
+    def __contains__(self, name):
+        with self._lock:
+            return self._db.execute("SELECT 1 FROM tools WHERE name = ?", (name,)).fetchone() is not None
+
+    def __iter__(self):
+        with self._lock:
+            names = [row[0] for row in self._db.execute("SELECT name FROM tools")]
+        return iter(names)
+
+    def __len__(self):
+        with self._lock:
+            return self._db.execute("SELECT COUNT(*) FROM tools").fetchone()[0]
+
+    def search(self, query: str, k=8) -> List[Tuple[float, dict]]:
+        """按BM25返回与query最相关的k个工具，结果为(score, 工具定义)"""
+        terms = set(tokenize(query))
+        if not terms:
+            return []
+        with self._lock:
+            total, avg_length = self._db.execute("SELECT COUNT(*), AVG(length) FROM tools").fetchone()
+            if not total:
+                return []
+            scores = Counter()
+            for term in terms:
+                postings = self._db.execute(
+                    "SELECT p.name, p.tf, t.length FROM postings p JOIN tools t ON t.name = p.name WHERE p.term = ?",
+                    (term,)
+                ).fetchall()
+                if not postings:
+                    continue
+                idf = math.log(1 + (total - len(postings) + 0.5) / (len(postings) + 0.5))
+                for name, tf, length in postings:
+                    norm = self.K1 * (1 - self.B + self.B * length / (avg_length or 1))
+                    scores[name] += idf * tf * (self.K1 + 1) / (tf + norm)
+            best = scores.most_common(k)
+            definitions = {
+                name: json.loads(definition) for name, definition in self._db.execute(
+                    f"SELECT name, definition FROM tools WHERE name IN ({','.join('?' * len(best))})",
+                    [name for name, _ in best]
+                ).fetchall()
+            } if best else {}
+        return [(score, definitions[name]) for name, score in best]
+
+
+_registries: Dict[str, ToolRegistry] = {}
+_registries_lock = threading.Lock()
+
+
+def get_registry(path="tools.db", json_path="tools.json") -> ToolRegistry:
+    """同一路径的注册表在进程内共享"""
+    key = os.path.abspath(path)
+    with _registries_lock:
+        if key not in _registries:
+            _registries[key] = ToolRegistry(path, json_path)
+        elif json_path:
+            _registries[key]._sync_json(json_path)
+        return _registries[key]
@@ -0,0 +1,154 @@
+import atexit
+import contextvars
+import functools
+import os
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from typing import Callable, List, Optional
+
+from core.logger import StructuredLogger, task_id_var
+
+TRACE_PATH = os.getenv("TRACE_PATH", "blogs/trace.jsonl")
+
+_current_span = contextvars.ContextVar("span", default=None)
+
+
+class Span:
+    """一次计时区间：墙钟时间、首token时间、token用量和重试次数"""
+    __slots__ = ("trace_id", "span_id", "parent_id", "name", "kind", "start", "_perf", "duration",
+                 "ttft", "prompt_tokens", "completion_tokens", "cached_tokens", "attempts", "retries",
+                 "status", "attrs")
+
+    def __init__(self, name: str, kind: str, parent: Optional["Span"], attrs: dict):
+        self.trace_id = parent.trace_id if parent else (task_id_var.get() or uuid.uuid4().hex[:12])
+        self.span_id = uuid.uuid4().hex[:16]
+        self.parent_id = parent.span_id if parent else None
+        self.name = name
+        self.kind = kind
+        self.start = time.time()
+        self._perf = time.perf_counter()
+        self.duration = None
+        self.ttft = None
+        self.prompt_tokens = 0
+        self.completion_tokens = 0
+        self.cached_tokens = 0
+        self.attempts = 0   # 实际发出的HTTP请求数，大于1说明客户端做了重试
+        self.retries = 0    # 业务层重试次数（如结果为空后重新请求）
+        self.status = "ok"
+        self.attrs = attrs
+
+    def set(self, **attrs):
+        self.attrs.update(attrs)
+
+    def first_token(self):
+        if self.ttft is None:
+            self.ttft = time.perf_counter() - self._perf
+
+    def add_usage(self, usage):
+        """累加response.usage中的token数，兼容OpenAI和DeepSeek的缓存命中字段"""
+        if usage is None:
+            return
+        self.prompt_tokens += getattr(usage, "prompt_tokens", 0) or 0
+        self.completion_tokens += getattr(usage, "completion_tokens", 0) or 0
+        details = getattr(usage, "prompt_tokens_details", None)
+        cached = getattr(details, "cached_tokens", 0) if details else getattr(usage, "prompt_cache_hit_tokens", 0)
+        self.cached_tokens += cached or 0
+
+    def to_dict(self) -> dict:
+        record = {
+            "trace_id": self.trace_id,
+            "span_id": self.span_id,
+            "parent_id": self.parent_id,
+            "name": self.name,
+            "kind": self.kind,
+            "start": self.start,
+            "duration": self.duration,
+            "ttft": self.ttft,
+            "prompt_tokens": self.prompt_tokens,
+            "completion_tokens": self.completion_tokens,
+            "cached_tokens": self.cached_tokens,
+            "retries": self.retries + max(0, self.attempts - 1),
+            "status": self.status,
+        }
+        record.update(self.attrs)
+        return record
+
+
+class Tracer:
+    """
+    基于contextvars的span追踪
+    span通过上下文自动形成父子关系（TaskAnalyzer -> ManagerAgent -> send_message -> 工具执行），
+    结束时写入JSONL文件并通知监听者（如界面的TracePanel）。跨线程时需用contextvars.copy_context()传递。
+    """
+    def __init__(self, path=TRACE_PATH, enabled=True):
+        self.enabled = enabled
+        self._exporter = StructuredLogger(path)
+        self._listeners: List[Callable[[dict], None]] = []
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def span(self, name: str, kind="internal", **attrs):
+        if not self.enabled:
+            yield Span(name, kind, None, attrs)
+            return
+        span = Span(name, kind, _current_span.get(), attrs)
+        token = _current_span.set(span)
+        try:
+            yield span
+        except BaseException as e:
+            span.status = "error"
+            span.attrs["error"] = f"{type(e).__name__}: {e}"
+            raise
+        finally:
+            _current_span.reset(token)
+            span.duration = time.perf_counter() - span._perf
+            self._finish(span)
+
+    def traced(self, name: str = None, kind="internal"):
+        """装饰器形式的span"""
+        def decorator(func):
+            @functools.wraps(func)
+            def wrapper(*args, **kwargs):
+                with self.span(name or func.__name__, kind):
+                    return func(*args, **kwargs)
+            return wrapper
+        return decorator
+
+    @staticmethod
+    def current() -> Optional[Span]:
+        return _current_span.get()
+
+    def retry(self):
+        """当前span的业务层重试次数加一"""
+        span = _current_span.get()
+        if span is not None:
+            span.retries += 1
+
+    def add_listener(self, listener: Callable[[dict], None]):
+        with self._lock:
+            self._listeners.append(listener)
+
+    def remove_listener(self, listener):
+        with self._lock:
+            if listener in self._listeners:
+                self._listeners.remove(listener)
+
+    def _finish(self, span: Span):
+        record = span.to_dict()
+        self._exporter.write(record)
+        with self._lock:
+            listeners = list(self._listeners)
+        for listener in listeners:
+            try:
+                listener(record)
+            except Exception:
+                pass
+
+    def close(self):
+        self._exporter.close()
+
+
+tracer = Tracer(enabled=os.getenv("TRACE") != "0")
+atexit.register(tracer.close)
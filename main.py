@@ -1,25 +1,44 @@
+import argparse
 import sys
-from PyQt5.QtWidgets import QApplication
-from ui.main_window import MainWindow
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="任务执行系统；不带参数时启动图形界面")
+    parser.add_argument("--batch", metavar="FILE", help="无界面批量执行JSONL任务文件，\"-\"表示从标准输入读取")
+    parser.add_argument("--serve", action="store_true", help="以HTTP服务方式运行，见core/service.py")
+    parser.add_argument("--host", default="127.0.0.1", help="服务模式的监听地址")
+    parser.add_argument("--port", type=int, default=8080, help="服务模式的端口")
+    parser.add_argument("--queue-size", type=int, default=100, help="服务模式下排队任务数上限")
+    parser.add_argument("--workers", type=int, default=4, help="批量/服务模式下同时执行的任务数")
+    parser.add_argument("--rate", type=float, default=0.0, help="批量模式下全局每秒LLM请求上限，0为不限")
+    parser.add_argument("--output", default="-", help="批量模式的结果文件(JSONL)，默认输出到标准输出")
+    parser.add_argument("--verbose", action="store_true", help="批量模式下把各任务的过程日志输出到标准错误")
+    return parser.parse_args(argv)
+
 
 def main():
-    app = QApplication(sys.argv)
-    
-    # 初始化LLM客户端
-    from openai import OpenAI
-    from dotenv import load_dotenv
-    import os
-    
-    load_dotenv()
-    llm_client = OpenAI(
-        api_key=os.getenv("DEEPSEEK_API_KEY"),
-        base_url="https://api.deepseek.com"
-    )
-    
+    args = parse_args()
+    # 批量和服务模式不导入PyQt
+    if args.batch:
+        from core.batch import main as batch_main
+        sys.exit(batch_main(args))
+    if args.serve:
+        from core.service import main as serve_main
+        sys.exit(serve_main(args))
+
+    from PyQt5.QtWidgets import QApplication
+    from ui.main_window import MainWindow
+
+    app = QApplication(sys.argv[:1])
+
+    # 初始化LLM客户端（进程内共享）
+    from core.agent import client_maker
+    _, llm_client = client_maker()
+
     window = MainWindow()
     window.llm_client = llm_client  # 传递LLM客户端
     window.show()
     sys.exit(app.exec_())
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
@@ -0,0 +1,10 @@
+import os
+import sys
+import tempfile
+
+# 测试直接导入core下的模块；日志和追踪写到临时目录，不在仓库中生成blogs/
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+_logs = tempfile.mkdtemp(prefix="agent-tests-")
+os.environ.setdefault("LOG_PATH", os.path.join(_logs, "log.jsonl"))
+os.environ.setdefault("TRACE_PATH", os.path.join(_logs, "trace.jsonl"))
+os.environ.setdefault("DEEPSEEK_API_KEY", "test")
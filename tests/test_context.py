@@ -0,0 +1,29 @@
+from core import context as context_module
+from core.context import ContextManager, count_tokens
+
+
+def _step(i):
+    return [
+        {"role": "user", "content": f"步骤{i}：" + "处理数据" * 30},
+        {"role": "assistant", "content": f"步骤{i}完成，结果为{i * 1111}"},
+    ]
+
+
+def test_planner_view_keeps_every_step(monkeypatch):
+    summarized = []
+
+    def fake_send(clients, user_input, messages, mode, temperature):
+        summarized.append(user_input)
+        return type("Response", (), {"content": f"摘要{len(summarized)}"})(), []
+
+    monkeypatch.setattr(context_module, "send_message", fake_send)
+    context = ContextManager(None, "系统", budgets={"planner": 400, "executor": 600, "summarizer": 2000})
+    for i in range(8):
+        context.add_step(_step(i))
+        view = context.view("planner")
+        assert count_tokens(view) <= 400
+        # 视图放不下的步骤都已并入摘要，而不是被静默丢弃
+        assert view[-len(context.groups) * 2:] == [m for g in context.groups for m in g]
+    assert context.compactions > 0
+    assert len(context.groups) + context.compactions == 8
+    assert "步骤0" in summarized[0]
@@ -0,0 +1,57 @@
+import pytest
+
+from core.conversation import Conversation
+
+SYSTEM = {"role": "system", "content": "系统提示"}
+
+
+def _user(text):
+    return {"role": "user", "content": text}
+
+
+def test_of_splits_system_prompt():
+    messages = [SYSTEM, _user("a"), _user("b")]
+    conversation = Conversation.of(messages)
+    assert len(conversation) == 3
+    assert conversation.to_wire() == messages
+    assert conversation[0] is SYSTEM and conversation[-1] == _user("b")
+    assert conversation[1:] == [_user("a"), _user("b")]
+    assert Conversation.of(conversation) is conversation
+
+
+def test_branches_share_history():
+    base = Conversation.of([SYSTEM, _user("a")])
+    left = base.append(_user("left"))
+    right = base + [_user("right"), _user("more")]
+    assert base.to_wire() == [SYSTEM, _user("a")]
+    assert left.to_wire() == [SYSTEM, _user("a"), _user("left")]
+    assert right.to_wire()[2:] == [_user("right"), _user("more")]
+    assert left[1] is right[1]
+    assert base.fork() is base
+
+
+def test_to_wire_returns_new_list():
+    conversation = Conversation.of([_user("a")])
+    wire = conversation.to_wire()
+    wire.append(_user("b"))
+    assert len(conversation) == 1 and conversation.to_wire() == [_user("a")]
+
+
+def test_with_system_and_prepend():
+    conversation = Conversation.of([SYSTEM, _user("a")])
+    replaced = conversation.with_system("新的提示")
+    assert replaced.to_wire() == [{"role": "system", "content": "新的提示"}, _user("a")]
+    extra = {"role": "system", "content": "补充"}
+    assert conversation.prepend(extra).to_wire() == [extra, SYSTEM, _user("a")]
+    assert conversation.to_wire() == [SYSTEM, _user("a")]
+
+
+def test_since():
+    base = Conversation.of([SYSTEM, _user("a")])
+    later = base.extend([_user("b"), _user("c")])
+    assert later.since(base) == [_user("b"), _user("c")]
+    assert later.since(later) == []
+    with pytest.raises(ValueError):
+        base.since(later)
+    with pytest.raises(ValueError):
+        later.since(Conversation.of([_user("x")]))
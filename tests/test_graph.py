@@ -0,0 +1,46 @@
+import threading
+import time
+
+from openai import OpenAI
+
+from core.analyze import TaskAnalyzer
+from core.cancel import TaskCancelled, check_cancelled
+from core.manager_agent import ManagerAgent
+
+
+def test_unsafe_node_cancels_running_nodes(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    started, stopped = threading.Event(), threading.Event()
+
+    def process_task(self, task, complex_task, messages, need_new_tool=None):
+        # 模拟长时间运行的步骤，只在取消检查点退出
+        started.set()
+        try:
+            for _ in range(500):
+                check_cancelled()
+                time.sleep(0.01)
+        except TaskCancelled:
+            stopped.set()
+            raise
+        return "完成", []
+
+    def safe_check(task, kind="task"):
+        if task == "危险步骤":
+            started.wait(1)
+            return False, "不安全"
+        return True, None
+
+    monkeypatch.setattr(ManagerAgent, "process_task", process_task)
+    analyzer = TaskAnalyzer(OpenAI(api_key="test", base_url="http://127.0.0.1:9"), planner="graph")
+    monkeypatch.setattr(analyzer, "safe_check", safe_check)
+    graph = [
+        {"id": "1", "description": "耗时步骤", "depends_on": []},
+        {"id": "2", "description": "危险步骤", "depends_on": []},
+    ]
+
+    start = time.monotonic()
+    results, err = analyzer._run_graph("任务", graph, lambda message: None)
+
+    assert results == [] and "步骤2" in err
+    assert time.monotonic() - start < 2
+    assert stopped.wait(1)
@@ -0,0 +1,59 @@
+import json
+
+import pytest
+
+from core.json_stream import JSONStreamParser
+
+DOCUMENT = {"safety": "Safe", "score": 0.75, "ok": True, "steps": [{"id": 1}, {"id": 2}], "message": ""}
+
+
+def _feed(parser, text, size):
+    for i in range(0, len(text), size):
+        if parser.feed(text[i:i + size]):
+            return True
+    return False
+
+
+@pytest.mark.parametrize("size", [1, 2, 5, 1000])
+def test_object_split_across_chunks(size):
+    parser = JSONStreamParser()
+    assert not _feed(parser, json.dumps(DOCUMENT, ensure_ascii=False, indent=1), size)
+    assert parser.done
+    assert parser.fields == DOCUMENT
+
+
+def test_fields_complete_in_order():
+    seen = []
+    parser = JSONStreamParser(lambda key, value: seen.append((key, value)))
+    text = json.dumps(DOCUMENT)
+    parser.feed(text[:text.index('"ok"')])
+    # 数字要等到后面的分隔符才算完整
+    assert seen == [("safety", "Safe"), ("score", 0.75)]
+    parser.feed(text[text.index('"ok"'):])
+    assert [key for key, _ in seen] == list(DOCUMENT)
+
+
+@pytest.mark.parametrize("value", ['引号"和反斜杠\\', "换行\n制表\t", "结尾的反斜杠\\", "{不是对象}", "中文"])
+def test_escaped_characters(value):
+    document = {"message": value, "next": "x"}
+    parser = JSONStreamParser()
+    _feed(parser, json.dumps(document), 1)
+    assert parser.fields == document
+
+
+def test_on_field_stops_early():
+    parser = JSONStreamParser(lambda key, value: key == "safety")
+    text = '{"safety": "Unsafe", "message": "很长的说明'
+    assert _feed(parser, text, 3)
+    assert parser.stopped and not parser.done
+    assert parser.fields == {"safety": "Unsafe"}
+    # 停止后继续feed不再解析
+    assert parser.feed('"}')
+    assert parser.fields == {"safety": "Unsafe"}
+
+
+def test_text_around_object_is_ignored():
+    parser = JSONStreamParser()
+    parser.feed('```json\n{"a": 1, "b": [1, "]"]}\n```')
+    assert parser.done
+    assert parser.fields == {"a": 1, "b": [1, "]"]}
@@ -0,0 +1,108 @@
+import asyncio
+
+import pytest
+
+from core import rate_limit
+from core.rate_limit import CallGovernor, CircuitBreaker, CircuitOpenError, TokenBucket
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = FakeClock()
+    monkeypatch.setattr(rate_limit.time, "monotonic", clock)
+    return clock
+
+
+def test_bucket_burst_then_wait(clock):
+    bucket = TokenBucket(rate=2, burst=4)
+    assert [bucket.reserve() for _ in range(4)] == [0, 0, 0, 0]
+    # 令牌可以透支，排队的调用依次顺延
+    assert bucket.reserve() == pytest.approx(0.5)
+    assert bucket.reserve() == pytest.approx(1.0)
+    clock.now += 1.0
+    assert bucket.reserve() == pytest.approx(0.5)
+
+
+def test_bucket_refill_is_capped(clock):
+    bucket = TokenBucket(rate=1, burst=3)
+    bucket.reserve(3)
+    clock.now += 100
+    bucket.reserve(3)
+    assert bucket.reserve() == pytest.approx(1.0)
+
+
+def test_bucket_adjust(clock):
+    bucket = TokenBucket(rate=10, burst=100)
+    bucket.reserve(80)
+    bucket.adjust(-50)  # 实际用量比预占少50
+    assert bucket.reserve(70) == 0
+    bucket.adjust(20)   # 实际用量比预占多20
+    assert bucket.reserve(10) == pytest.approx(3.0)
+
+
+def test_bucket_rejects_non_positive_rate():
+    with pytest.raises(ValueError):
+        TokenBucket(0)
+
+
+def test_breaker_state_transitions(clock):
+    breaker = CircuitBreaker(threshold=2, cooldown=10, max_cooldown=15)
+    breaker.failure()
+    assert breaker.state == "closed"
+    breaker.failure()
+    assert breaker.state == "open" and breaker.opens == 1
+
+    clock.now += 10
+    assert breaker.state == "half_open"
+    asyncio.run(breaker.wait())  # 放行一个探测请求
+    assert breaker.state == "open"
+
+    # 探测失败：冷却时间翻倍，但不超过max_cooldown
+    breaker.failure()
+    assert breaker.opens == 2
+    clock.now += 14.9
+    assert breaker.state == "open"
+    clock.now += 0.1
+    assert breaker.state == "half_open"
+
+    asyncio.run(breaker.wait())
+    breaker.success()
+    assert breaker.state == "closed" and breaker.failures == 0
+
+
+def test_cancelled_probe_is_released(clock):
+    breaker = CircuitBreaker(threshold=1, cooldown=5)
+    breaker.failure()
+    clock.now += 5
+    asyncio.run(breaker.wait())
+    breaker.release()
+    assert breaker.state == "half_open"
+
+
+def test_breaker_gives_up_after_max_wait(clock):
+    breaker = CircuitBreaker(threshold=1, cooldown=60, max_wait=0)
+    breaker.failure()
+    with pytest.raises(CircuitOpenError):
+        asyncio.run(breaker.wait())
+
+
+def test_governor_retry_decisions():
+    governor = CallGovernor(max_retries=2, backoff_base=1, backoff_max=4, retryable=lambda exc: isinstance(exc, TimeoutError))
+    assert governor.on_error(ValueError(), 0) is None
+    assert 0 <= governor.on_error(TimeoutError(), 0) <= 1
+    assert 0 <= governor.on_error(TimeoutError(), 1) <= 2
+    assert governor.on_error(TimeoutError(), 2) is None
+    assert (governor.retries, governor.failures, governor.giveups) == (2, 3, 1)
+
+
+def test_governor_prefers_retry_after():
+    governor = CallGovernor(backoff_max=30, retryable=lambda exc: True, retry_after=lambda exc: 60)
+    assert governor.on_error(RuntimeError(), 0) == 30
@@ -0,0 +1,53 @@
+import pytest
+from openai import OpenAI
+
+from bench.mock_server import MockLLMServer
+from core.agent import response_cache, send_message
+
+
+@pytest.fixture
+def server():
+    server = MockLLMServer(
+        lambda request: {"json": {"safety": "Safe", "rationale": "测试", "message": ""}},
+        latency=0, tokens_per_second=10000,
+    )
+    server.start()
+    yield server
+    server.stop()
+
+
+@pytest.fixture
+def cache(tmp_path):
+    response_cache.configure(enabled=True, path=str(tmp_path / "cache.sqlite"))
+    response_cache.clear()
+    yield response_cache
+    response_cache.configure(enabled=False)
+
+
+def _check(server, on_field):
+    clients = ("mock-model", OpenAI(api_key="test", base_url=server.base_url))
+    response, _ = send_message(clients, [], user_input="检查内容", mode=0, temperature=0, on_field=on_field)
+    return response
+
+
+def _stop_on_safety(key, value):
+    return key == "safety"
+
+
+def test_short_circuited_call_hits_cache(server, cache):
+    assert _check(server, _stop_on_safety) == {"safety": "Safe"}
+    assert _check(server, _stop_on_safety) == {"safety": "Safe"}
+    assert server.requests == 1
+
+
+def test_partial_entry_not_reused_when_more_fields_needed(server, cache):
+    _check(server, _stop_on_safety)
+    seen = []
+    response = _check(server, lambda key, value: seen.append(key) and False)
+    assert response == {"safety": "Safe", "rationale": "测试", "message": ""}
+    assert server.requests == 2
+    # 部分字段先交给了回调，随后的完整请求又逐字段回调一次
+    assert seen == ["safety", "safety", "rationale", "message"]
+    # 完整结果写入缓存后，任何调用方都直接命中
+    _check(server, _stop_on_safety)
+    assert server.requests == 2
@@ -0,0 +1,163 @@
+import concurrent.futures
+import os
+import threading
+import time
+from types import SimpleNamespace
+
+import pytest
+from openai import OpenAI
+
+from core import manager_agent
+from core.cancel import CancelToken, TaskCancelled, cancel_var
+from core.sandbox import ToolThreadPool, ToolTimeout, ToolWorkerPool
+
+
+def test_timed_out_thread_is_replaced():
+    pool = ToolThreadPool(1, "test-tool")
+    release = threading.Event()
+    hung = pool.submit(release.wait)
+    with pytest.raises(concurrent.futures.TimeoutError):
+        hung.result(timeout=0.1)
+
+    thread = pool.abandon(hung, "hung_tool")
+    assert thread.startswith("test-tool-")
+    assert pool.leaked == {thread: "hung_tool"}
+    # 唯一的线程挂起后仍能执行新的调用
+    assert pool.submit(lambda: "ok").result(timeout=1) == "ok"
+
+    release.set()
+    hung.result(timeout=1)
+    assert pool.submit(lambda: "again").result(timeout=1) == "again"
+    assert pool.leaked == {}
+
+
+def test_timeout_counts_from_start():
+    pool = ToolThreadPool(1, "test-tool")
+    first = pool.submit(time.sleep, 0.3)
+    queued = pool.submit(lambda: time.sleep(0.1) or "ok")
+    # 排在后面的调用有完整的时限，不受前一个调用耗时的影响
+    pool.result(first, 0.5)
+    assert pool.result(queued, 0.25) == "ok"
+
+
+def test_abandon_cancels_queued_call():
+    pool = ToolThreadPool(1, "test-tool")
+    release = threading.Event()
+    pool.submit(release.wait)
+    queued = pool.submit(lambda: "never")
+    assert pool.abandon(queued) == ""
+    assert queued.cancelled()
+    release.set()
+
+
+def test_sandbox_kills_hung_tool(tmp_path):
+    (tmp_path / "hang.py").write_text("import time\n\ndef execute_hang(args):\n    time.sleep(60)\n", encoding="utf-8")
+    (tmp_path / "echo.py").write_text("def execute_echo(args):\n    return args['text']\n", encoding="utf-8")
+    pool = ToolWorkerPool(size=1, memory_mb=0, cpu_seconds=0)
+    try:
+        with pytest.raises(ToolTimeout):
+            pool.call("hang", str(tmp_path), {}, timeout=0.5)
+        assert pool.respawns == 1
+        assert pool.call("echo", str(tmp_path), {"text": "ok"}, timeout=30) == "ok"
+    finally:
+        pool.shutdown()
+
+
+def test_manager_reports_leaked_thread(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(manager_agent, "_tool_executor", ToolThreadPool(1, "test-tool"))
+    (tmp_path / "tools").mkdir()
+    (tmp_path / "tools" / "hang.py").write_text(
+        "import time\n\ndef execute_hang(args):\n    time.sleep(1)\n    return 'late'\n", encoding="utf-8"
+    )
+    logs = []
+    manager = manager_agent.ManagerAgent(
+        OpenAI(api_key="test", base_url="http://127.0.0.1:9"), logs.append, tool_timeout=0.2, sandbox=False
+    )
+    manager.tools.upsert({"type": "function", "function": {"name": "hang", "description": "挂起", "parameters": {}}})
+    manager.tool_implementations = manager._load_implementations()
+    call = SimpleNamespace(id="call-1", function=SimpleNamespace(name="hang", arguments="{}"))
+
+    results = manager._run_tools([call])
+
+    assert "超时" in results[0]["content"]
+    assert any("仍在后台运行" in message for message in logs)
+    assert len(manager_agent._tool_executor.leaked) == 1
+
+
+@pytest.fixture
+def sandbox_tools(tmp_path):
+    (tmp_path / "hang.py").write_text("import time\n\ndef execute_hang(args):\n    time.sleep(60)\n", encoding="utf-8")
+    (tmp_path / "touch.py").write_text(
+        "def execute_touch(args):\n    open(args['path'], 'w').close()\n    return 'done'\n", encoding="utf-8"
+    )
+    pool = ToolWorkerPool(size=1, memory_mb=0, cpu_seconds=0)
+    yield tmp_path, pool
+    pool.shutdown()
+
+
+def test_no_idle_worker_before_deadline(sandbox_tools):
+    tools_dir, pool = sandbox_tools
+    marker = tools_dir / "touched"
+    hung = threading.Thread(target=lambda: pytest.raises(ToolTimeout, pool.call, "hang", str(tools_dir), {}, timeout=1))
+    hung.start()
+    time.sleep(0.2)
+    with pytest.raises(ToolTimeout):
+        pool.call("touch", str(tools_dir), {"path": str(marker)}, timeout=30, deadline=time.perf_counter() + 0.2)
+    hung.join()
+    # 等待超时的调用在进程空闲后也不会执行
+    assert pool.call("touch", str(tools_dir), {"path": str(tools_dir / "later")}, timeout=30) == "done"
+    assert not marker.exists()
+
+
+def test_cancelled_call_returns_worker(sandbox_tools):
+    tools_dir, pool = sandbox_tools
+    token = CancelToken()
+    token.cancel()
+    reset = cancel_var.set(token)
+    try:
+        with pytest.raises(TaskCancelled):
+            pool.call("touch", str(tools_dir), {"path": str(tools_dir / "touched")}, timeout=30)
+    finally:
+        cancel_var.reset(reset)
+    assert not (tools_dir / "touched").exists()
+    assert pool.call("touch", str(tools_dir), {"path": str(tools_dir / "touched")}, timeout=30) == "done"
+    assert pool.respawns == 0
+
+
+def test_load_runs_in_worker(sandbox_tools):
+    tools_dir, pool = sandbox_tools
+    (tools_dir / "noisy.py").write_text(
+        "import os\nopen(os.path.join(os.path.dirname(__file__), 'pid'), 'w').write(str(os.getpid()))\n\n"
+        "def execute_noisy(args):\n    return 'ok'\n", encoding="utf-8"
+    )
+    (tools_dir / "no_args.py").write_text("def execute_no_args():\n    return 'ok'\n", encoding="utf-8")
+    (tools_dir / "loops.py").write_text("while True:\n    pass\n", encoding="utf-8")
+
+    pool.load("noisy", str(tools_dir), timeout=30)
+    assert int((tools_dir / "pid").read_text()) != os.getpid()
+    with pytest.raises(RuntimeError, match="一个参数"):
+        pool.load("no_args", str(tools_dir), timeout=30)
+    with pytest.raises(ToolTimeout):
+        pool.load("loops", str(tools_dir), timeout=0.5)
+
+
+def test_register_tool_loads_in_sandbox(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    pool = ToolWorkerPool(size=1, memory_mb=0, cpu_seconds=0)
+    monkeypatch.setattr(manager_agent, "get_sandbox", lambda: pool)
+    logs = []
+    manager = manager_agent.ManagerAgent(
+        OpenAI(api_key="test", base_url="http://127.0.0.1:9"), logs.append, tool_timeout=30, sandbox=True
+    )
+    code = (
+        "import os\nopen('loaded_by', 'w').write(str(os.getpid()))\n\n"
+        "def execute_noisy(args):\n    return 'ok'\n"
+    )
+    try:
+        manager._register_tool({"type": "function", "function": {"name": "noisy", "description": "", "parameters": {}}}, code)
+    finally:
+        pool.shutdown()
+    # 生成代码的顶层语句只在工作进程中运行
+    assert int((tmp_path / "loaded_by").read_text()) != os.getpid()
+    assert not any("加载失败" in message for message in logs)
@@ -0,0 +1,72 @@
+import http.client
+import json
+
+import pytest
+from openai import OpenAI
+
+from core.service import Job, JobManager, TaskServer
+
+
+@pytest.fixture(scope="module")
+def server():
+    manager = JobManager(OpenAI(api_key="test", base_url="http://127.0.0.1:9"), workers=1)
+    server = TaskServer(manager, port=0)
+    server.start()
+    yield server
+    server.stop()
+
+
+def _finished_job(server):
+    """直接登记一个已结束的任务，避免worker真的去请求LLM"""
+    job = Job("任务", {})
+    job.set_status("cancelled")
+    server.manager._jobs[job.id] = job
+    return job
+
+
+def _request(server, method, path, body=None, headers=None):
+    host, port = server.base_url.rsplit("//", 1)[1].split(":")
+    conn = http.client.HTTPConnection(host, int(port), timeout=5)
+    conn.putrequest(method, path, skip_accept_encoding=True)
+    for name, value in (headers or {}).items():
+        conn.putheader(name, value)
+    conn.endheaders(body)
+    response = conn.getresponse()
+    data = response.read()
+    conn.close()
+    return response.status, json.loads(data) if data else None
+
+
+@pytest.mark.parametrize("value", ["abc", "-5", "1.5"])
+def test_submit_rejects_bad_content_length(server, value):
+    status, body = _request(server, "POST", "/jobs", headers={"Content-Length": value})
+    assert status == 400 and "Content-Length" in body["error"]
+
+
+def test_submit_requires_content_length(server):
+    status, _ = _request(server, "POST", "/jobs")
+    assert status == 411
+
+
+def test_submit_rejects_oversized_body(server):
+    status, _ = _request(server, "POST", "/jobs", headers={"Content-Length": str(10 ** 9)})
+    assert status == 413
+
+
+@pytest.mark.parametrize("value", ["abc", "-3"])
+def test_events_rejects_bad_last_event_id(server, value):
+    job = _finished_job(server)
+    status, body = _request(server, "GET", f"/jobs/{job.id}/events", headers={"Last-Event-ID": value})
+    assert status == 400 and "Last-Event-ID" in body["error"]
+
+
+def test_events_resume_from_last_event_id(server):
+    job = _finished_job(server)
+    host, port = server.base_url.rsplit("//", 1)[1].split(":")
+    conn = http.client.HTTPConnection(host, int(port), timeout=5)
+    conn.request("GET", f"/jobs/{job.id}/events", headers={"Last-Event-ID": "0"})
+    response = conn.getresponse()
+    text = response.read().decode("utf-8")
+    conn.close()
+    assert response.status == 200
+    assert "id: 0\n" not in text and "id: 1\n" in text and "event: done" in text
@@ -0,0 +1,61 @@
+import json
+import os
+
+from core.tool_registry import ToolRegistry
+
+
+def _tool(name, description):
+    return {"type": "function", "function": {"name": name, "description": description, "parameters": {}}}
+
+
+def _json_tools(path):
+    with open(path, "r", encoding="utf-8") as f:
+        return {tool["function"]["name"]: tool for tool in json.load(f)["tools"]}
+
+
+def test_upsert_writes_back_to_json(tmp_path):
+    json_path = str(tmp_path / "tools.json")
+    with open(json_path, "w", encoding="utf-8") as f:
+        json.dump({"tools": [_tool("read_file", "读取文件")]}, f)
+    registry = ToolRegistry(str(tmp_path / "tools.db"), json_path)
+
+    registry.upsert(_tool("read_file", "读取文本文件"))
+    registry.upsert(_tool("word_count", "统计字数"))
+
+    tools = _json_tools(json_path)
+    assert list(tools) == ["read_file", "word_count"]
+    assert tools["read_file"]["function"]["description"] == "读取文本文件"
+
+
+def test_reimport_keeps_registered_tools(tmp_path):
+    json_path = str(tmp_path / "tools.json")
+    with open(json_path, "w", encoding="utf-8") as f:
+        json.dump({"tools": [_tool("read_file", "读取文件")]}, f)
+    registry = ToolRegistry(str(tmp_path / "tools.db"), json_path)
+    registry.upsert(_tool("read_file", "读取文本文件"))
+
+    # 之后手动编辑tools.json：批量导入不会覆盖新注册的定义
+    tools = list(_json_tools(json_path).values()) + [_tool("word_count", "统计字数")]
+    with open(json_path, "w", encoding="utf-8") as f:
+        json.dump({"tools": tools}, f)
+    os.utime(json_path, ns=(0, os.stat(json_path).st_mtime_ns + 1))
+    registry = ToolRegistry(str(tmp_path / "tools.db"), json_path)
+
+    assert set(registry) == {"read_file", "word_count"}
+    assert registry["read_file"]["function"]["description"] == "读取文本文件"
+
+
+def test_tools_removed_from_json_are_deleted(tmp_path):
+    json_path = str(tmp_path / "tools.json")
+    with open(json_path, "w", encoding="utf-8") as f:
+        json.dump({"tools": [_tool("read_file", "读取文件"), _tool("word_count", "统计文件字数")]}, f)
+    registry = ToolRegistry(str(tmp_path / "tools.db"), json_path)
+    assert set(registry) == {"read_file", "word_count"}
+
+    with open(json_path, "w", encoding="utf-8") as f:
+        json.dump({"tools": [_tool("read_file", "读取文件")]}, f)
+    os.utime(json_path, ns=(0, os.stat(json_path).st_mtime_ns + 1))
+    registry = ToolRegistry(str(tmp_path / "tools.db"), json_path)
+
+    assert set(registry) == {"read_file"}
+    assert [tool["function"]["name"] for _, tool in registry.search("统计 字数 文件")] == ["read_file"]
@@ -0,0 +1,88 @@
+import asyncio
+import concurrent.futures
+
+import httpx
+import openai
+import pytest
+from openai import OpenAI
+
+from bench.mock_server import MockLLMServer
+from core.agent import LLMTransport
+from core.cassette import Cassette
+from core.rate_limit import CallGovernor
+
+
+def _status_error(status):
+    request = httpx.Request("POST", "http://test/chat/completions")
+    return openai.APIStatusError("error", response=httpx.Response(status, request=request), body=None)
+
+
+@pytest.fixture
+def transport():
+    transport = LLMTransport()
+    transport.governor = CallGovernor(tpm=60, max_retries=1, backoff_base=0.01, retryable=lambda e: e.status_code == 503)
+    observed = []
+    transport.add_listener(lambda model, client, latency, error: observed.append((model, error)))
+    transport.observed = observed
+    yield transport
+    transport.close()
+
+
+def _open(transport, error):
+    async def request(clients):
+        raise error
+    return transport.run(transport._open(("model", None), 5, request))
+
+
+@pytest.mark.parametrize("status", [400, 503])
+def test_failed_request_releases_reservation(transport, status):
+    bucket = transport.governor.tpm_bucket
+    with pytest.raises(openai.APIStatusError):
+        _open(transport, _status_error(status))
+    # 预占的5个token全部退还（桶容量为10）
+    assert bucket._tokens == pytest.approx(bucket.capacity, abs=0.1)
+    assert transport._semaphore._value == transport.max_concurrency
+
+
+def test_every_failure_is_observed(transport):
+    with pytest.raises(openai.APIStatusError):
+        _open(transport, _status_error(400))
+    with pytest.raises(openai.APIStatusError):
+        _open(transport, _status_error(503))
+    # 400一次；503重试一次后放弃，共两次
+    assert [error.status_code for _, error in transport.observed] == [400, 503, 503]
+
+
+def test_cancelled_request_releases_reservation(transport):
+    bucket = transport.governor.tpm_bucket
+    with pytest.raises(concurrent.futures.CancelledError):
+        _open(transport, asyncio.CancelledError())
+    assert bucket._tokens == pytest.approx(bucket.capacity, abs=0.1)
+
+
+def test_replayed_calls_are_counted(tmp_path):
+    server = MockLLMServer(lambda request: {"json": {"safety": "Safe"}}, latency=0, tokens_per_second=10000)
+    server.start()
+    path = str(tmp_path / "calls.jsonl.gz")
+    messages = [{"role": "user", "content": "检查内容"}]
+
+    async def consume(transport, clients):
+        async for _ in transport.stream(clients, messages=messages):
+            pass
+
+    counts = []
+    try:
+        for mode in ("record", "replay"):
+            transport = LLMTransport()
+            transport.cassette = Cassette(path, mode)
+            clients = ("mock-model", OpenAI(api_key="test", base_url=server.base_url))
+            transport.run(transport.create(clients, messages=messages))
+            transport.run(consume(transport, clients))
+            transport.cassette.close()
+            transport.close()
+            counts.append(transport.calls)
+    finally:
+        server.stop()
+    # 回放不访问模拟服务，但调用数与录制时相同
+    assert counts == [2, 2]
+    assert server.requests == 2
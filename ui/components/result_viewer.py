@@ -1,48 +1,106 @@
-from PyQt5.QtWidgets import QGroupBox, QVBoxLayout, QTextBrowser, QApplication
-import time
+from PyQt5.QtWidgets import QGroupBox, QVBoxLayout, QTextBrowser
+from PyQt5.QtGui import QTextCursor, QTextDocument, QTextDocumentFragment, QTextBlockFormat, QTextCharFormat
+from PyQt5.QtCore import QTimer
+
+RENDER_FPS = 30  # 流式输出的刷新帧率
+
 
 class ResultViewer(QGroupBox):
-    def __init__(self):
+    """
+    任务结果视图
+    流式片段先进入缓冲区，由固定帧率的定时器统一刷新：已完整的Markdown块（空行分隔且不在代码块内）
+    渲染一次后不再变动，尚未完整的尾部以纯文本显示，直到成块。
+    """
+    def __init__(self, fps=RENDER_FPS):
         super().__init__("任务结果")
+        self._pending = []         # 尚未刷新的片段
+        self._tail = ""            # 已显示但尚未成块的尾部文本
+        self._committed_end = 0    # 已渲染Markdown部分在文档中的结束位置
+        self._timer = QTimer(self)
+        self._timer.setInterval(max(1, 1000 // fps))
+        self._timer.timeout.connect(self._flush)
         self.setup_ui()
-    
+
     def setup_ui(self):
         layout = QVBoxLayout()
         self.result_browser = QTextBrowser()
         self.result_browser.setOpenExternalLinks(True)  # 允许打开超链接
         layout.addWidget(self.result_browser)
         self.setLayout(layout)
-    
+
     def set_result(self, result: str):
         """设置任务结果（支持Markdown格式）"""
+        self._reset()
         self.result_browser.setMarkdown(result if result else "无结果")
-    
+
     def set_error(self, error_msg: str):
         """设置错误信息（红色显示）"""
+        self._reset()
         self.result_browser.setHtml(f'<span style="color:red">{error_msg}</span>')
-    
+
     def clear(self):
         """清空结果"""
+        self._reset()
         self.result_browser.clear()
-    
+
+    def _reset(self):
+        self._timer.stop()
+        self._pending.clear()
+        self._tail = ""
+        self._committed_end = 0
+
     def append(self, text):
-        """真正的逐词追加实现"""
-        cursor = self.result_browser.textCursor()
-        cursor.movePosition(cursor.End)
-        
-        # 针对流式输出的特殊处理
-        if len(text) == 1:  # 单字符
+        """追加流式片段，在下一帧统一刷新"""
+        if not text:
+            return
+        self._pending.append(text)
+        if not self._timer.isActive():
+            self._timer.start()
+
+    @staticmethod
+    def _split_blocks(text):
+        """返回text中可以提交为Markdown的前缀长度：最后一个不在代码块内的空行之后"""
+        split, position, fence_open = 0, 0, False
+        for line in text.splitlines(keepends=True):
+            position += len(line)
+            if line.lstrip().startswith("```"):
+                fence_open = not fence_open
+            elif not line.strip() and not fence_open and line.endswith("\n"):
+                split = position
+        return split
+
+    def _flush(self):
+        """把缓冲的片段一次性写入文档"""
+        if not self._pending:
+            self._timer.stop()
+            return
+        text = "".join(self._pending)
+        self._pending.clear()
+
+        scrollbar = self.result_browser.verticalScrollBar()
+        at_bottom = scrollbar.value() >= scrollbar.maximum() - 4
+        cursor = QTextCursor(self.result_browser.document())
+        cursor.beginEditBlock()
+
+        tail = self._tail + text
+        split = self._split_blocks(tail)
+        if split:
+            # 用渲染后的Markdown块替换原先以纯文本显示的尾部
+            cursor.setPosition(self._committed_end)
+            cursor.movePosition(QTextCursor.End, QTextCursor.KeepAnchor)
+            cursor.removeSelectedText()
+            block = QTextDocument()
+            block.setMarkdown(tail[:split])
+            cursor.insertFragment(QTextDocumentFragment(block))
+            cursor.insertBlock(QTextBlockFormat(), QTextCharFormat())
+            self._committed_end = cursor.position()
+            self._tail = tail[split:]
+            cursor.insertText(self._tail)
+        else:
+            cursor.movePosition(QTextCursor.End)
             cursor.insertText(text)
-            # 中文等宽字符特殊处理
-            if ord(text) > 255:  
-                self.result_browser.setTextCursor(cursor)
-                QApplication.processEvents()
-        else:  # 多字符（可能来自非流式调用）
-            for char in text:  # 模拟逐字输出
-                cursor.insertText(char)
-                cursor.movePosition(cursor.End)
-                self.result_browser.setTextCursor(cursor)
-                QApplication.processEvents()
-                time.sleep(0.01)  # 控制输出速度
-        
-        self.result_browser.ensureCursorVisible()
\ No newline at end of file
+            self._tail = tail
+        cursor.endEditBlock()
+
+        if at_bottom:
+            scrollbar.setValue(scrollbar.maximum())
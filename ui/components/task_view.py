@@ -0,0 +1,94 @@
+import re
+import uuid
+
+from PyQt5.QtWidgets import QWidget, QVBoxLayout, QHBoxLayout, QLabel, QProgressBar, QTabWidget
+from PyQt5.QtCore import pyqtSignal
+
+from core.task_thread import StreamHandler
+from ui.components.log_panel import LogPanel
+from ui.components.trace_panel import TracePanel
+from ui.components.result_viewer import ResultViewer
+
+_STEP_PATTERN = re.compile(r"^执行步骤 (\S+?):")
+STATUS_TEXT = {"queued": "排队中", "running": "执行中", "done": "已完成", "failed": "失败", "cancelling": "取消中", "cancelled": "已取消"}
+
+
+class TaskView(QWidget):
+    """
+    单个任务的结果页：自己的日志、调用追踪、结果视图和StreamHandler，
+    task_id同时用作日志和追踪中的任务id，MainWindow据此把span分发到对应的页面
+    """
+    status_changed = pyqtSignal(object)
+
+    def __init__(self, number: int, task_description: str):
+        super().__init__()
+        self.number = number
+        self.task_description = task_description
+        self.task_id = uuid.uuid4().hex[:12]
+        self.status = "queued"
+        self.step = None
+        self.thread = None
+        self.stream_handler = StreamHandler()
+        self.setup_ui()
+        self.stream_handler.stream_received.connect(self.result_viewer.append)
+        self.stream_handler.final_received.connect(self._handle_final_result)
+
+    def setup_ui(self):
+        layout = QVBoxLayout()
+        layout.setContentsMargins(0, 0, 0, 0)
+
+        header = QHBoxLayout()
+        self.status_label = QLabel()
+        self.progress = QProgressBar()
+        self.progress.setRange(0, 0)  # 步骤总数事先未知，运行中显示忙碌状态
+        self.progress.setMaximumHeight(12)
+        self.progress.setTextVisible(False)
+        header.addWidget(self.status_label)
+        header.addWidget(self.progress)
+
+        self.log_panel = LogPanel()
+        self.trace_panel = TracePanel()
+        self.result_viewer = ResultViewer()
+        log_tabs = QTabWidget()
+        log_tabs.addTab(self.log_panel, "日志")
+        log_tabs.addTab(self.trace_panel, "追踪")
+
+        layout.addLayout(header)
+        layout.addWidget(log_tabs)
+        layout.addWidget(self.result_viewer)
+        self.setLayout(layout)
+        self._refresh()
+
+    @property
+    def finished(self):
+        return self.status in ("done", "failed", "cancelled")
+
+    @property
+    def title(self):
+        short = self.task_description if len(self.task_description) <= 12 else self.task_description[:12] + "…"
+        return f"#{self.number} {STATUS_TEXT[self.status]} {short}"
+
+    def set_status(self, status: str):
+        self.status = status
+        self._refresh()
+        self.status_changed.emit(self)
+
+    def _refresh(self):
+        text = STATUS_TEXT[self.status]
+        if self.status == "running" and self.step:
+            text += f" · 步骤 {self.step}"
+        self.status_label.setText(text)
+        self.progress.setVisible(self.status in ("running", "cancelling"))
+
+    def add_log(self, message: str):
+        self.log_panel.add_log(message)
+        match = _STEP_PATTERN.match(message)
+        if match:
+            self.step = match.group(1)
+            self._refresh()
+            self.status_changed.emit(self)
+
+    def _handle_final_result(self, result):
+        """最终结果格式化显示"""
+        self.result_viewer.set_result(result)
+        self.log_panel.add_log("[INFO] 生成完成")
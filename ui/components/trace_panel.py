@@ -0,0 +1,107 @@
+from PyQt5.QtWidgets import QGroupBox, QVBoxLayout, QTreeWidget, QTreeWidgetItem, QStyledItemDelegate
+from PyQt5.QtCore import Qt, pyqtSignal, QRectF
+from PyQt5.QtGui import QColor
+
+_KIND_COLORS = {"llm": QColor("#4a90d9"), "tool": QColor("#e0a030"), "internal": QColor("#9aa5b1")}
+_TIMELINE_COLUMN = 5
+
+
+class _WaterfallDelegate(QStyledItemDelegate):
+    """按任务的起止时间绘制span所在的时间段"""
+    def __init__(self, panel):
+        super().__init__(panel)
+        self.panel = panel
+
+    def paint(self, painter, option, index):
+        super().paint(painter, option, index)
+        data = index.data(Qt.UserRole)
+        if not data:
+            return
+        trace_id, start, duration, kind, status = data
+        begin, end = self.panel.bounds.get(trace_id, (start, start + duration))
+        total = max(end - begin, 1e-6)
+        rect = option.rect.adjusted(2, 4, -2, -4)
+        x = rect.x() + rect.width() * (start - begin) / total
+        width = max(2.0, rect.width() * duration / total)
+        color = QColor("#d9534f") if status == "error" else _KIND_COLORS.get(kind, _KIND_COLORS["internal"])
+        painter.save()
+        painter.fillRect(QRectF(x, rect.y(), width, rect.height()), color)
+        painter.restore()
+
+
+class TracePanel(QGroupBox):
+    """调用追踪面板：按任务展示span树和时间瀑布图"""
+    span_received = pyqtSignal(dict)
+
+    def __init__(self):
+        super().__init__("调用追踪")
+        self.bounds = {}   # trace_id -> (最早开始, 最晚结束)
+        self._items = {}   # span_id -> QTreeWidgetItem
+        self.setup_ui()
+        self.span_received.connect(self._add_span)
+
+    def setup_ui(self):
+        layout = QVBoxLayout()
+        self.tree = QTreeWidget()
+        self.tree.setHeaderLabels(["名称", "耗时(ms)", "首token(ms)", "token 输入/输出/缓存", "重试", "时间线"])
+        self.tree.setColumnWidth(0, 220)
+        self.tree.setColumnWidth(_TIMELINE_COLUMN, 260)
+        self.tree.setItemDelegateForColumn(_TIMELINE_COLUMN, _WaterfallDelegate(self))
+        layout.addWidget(self.tree)
+        self.setLayout(layout)
+
+    def on_span(self, record: dict):
+        """供tracer.add_listener使用，可在任意线程调用"""
+        self.span_received.emit(record)
+
+    def clear(self):
+        self.tree.clear()
+        self.bounds.clear()
+        self._items.clear()
+
+    def _item(self, span_id):
+        # 子span先于父span结束，父节点未到时先建占位项
+        if span_id not in self._items:
+            item = QTreeWidgetItem(["…"])
+            self.tree.addTopLevelItem(item)
+            self._items[span_id] = item
+        return self._items[span_id]
+
+    @staticmethod
+    def _start(item):
+        data = item.data(_TIMELINE_COLUMN, Qt.UserRole)
+        return data[1] if data else 0.0
+
+    def _add_span(self, record: dict):
+        item = self._item(record["span_id"])
+        duration = record.get("duration") or 0.0
+        ttft = record.get("ttft")
+        name = record["name"]
+        if record.get("model"):
+            name += f" ({record['model']})"
+        item.setText(0, name)
+        item.setText(1, f"{duration * 1000:.0f}")
+        item.setText(2, f"{ttft * 1000:.0f}" if ttft is not None else "")
+        if record.get("prompt_tokens") or record.get("completion_tokens"):
+            item.setText(3, f"{record['prompt_tokens']}/{record['completion_tokens']}/{record['cached_tokens']}")
+        item.setText(4, str(record["retries"]) if record.get("retries") else "")
+        item.setData(_TIMELINE_COLUMN, Qt.UserRole, (
+            record["trace_id"], record["start"], duration, record.get("kind"), record.get("status")
+        ))
+        if record.get("error"):
+            item.setToolTip(0, record["error"])
+
+        if record.get("parent_id"):
+            parent = self._item(record["parent_id"])
+            if item.parent() is not parent:
+                index = self.tree.indexOfTopLevelItem(item)
+                if index >= 0:
+                    self.tree.takeTopLevelItem(index)
+                # 子span按开始时间排列
+                position = 0
+                while position < parent.childCount() and self._start(parent.child(position)) <= record["start"]:
+                    position += 1
+                parent.insertChild(position, item)
+        begin, end = self.bounds.get(record["trace_id"], (record["start"], record["start"]))
+        self.bounds[record["trace_id"]] = (min(begin, record["start"]), max(end, record["start"] + duration))
+        self.tree.viewport().update()
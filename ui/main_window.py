@@ -1,13 +1,19 @@
+import os
+from collections import deque
+from functools import partial
+
 from PyQt5.QtWidgets import (QMainWindow, QWidget, QVBoxLayout, 
-                            QHBoxLayout, QSplitter, QStatusBar, QMessageBox, QApplication)
+                            QHBoxLayout, QSplitter, QStatusBar, QTabWidget, QLabel)
 from PyQt5.QtCore import Qt
 from core.task_thread import TaskThread
 from core.analyze import TaskAnalyzer
-from ui.components.log_panel import LogPanel  # 新增导入
-from core.agent import StreamHandler
+from ui.components.task_view import TaskView
+from core.trace import tracer
+
+MAX_CONCURRENT_TASKS = int(os.getenv("UI_MAX_TASKS", "3"))  # 同时执行的任务数，其余任务排队
 
 class MainWindow(QMainWindow):
-    def __init__(self):
+    def __init__(self, max_concurrent=MAX_CONCURRENT_TASKS):
         super().__init__()
         self.setWindowTitle("任务执行系统")
         self.setGeometry(100, 100, 1200, 800)
@@ -17,12 +23,13 @@ class MainWindow(QMainWindow):
         
         # 初始化任务系统
         self.llm_client = None  # 会在main.py中设置
-        self.task_thread = None
-        self.analyzer = None
-
-        self.stream_handler = StreamHandler()
-        self.stream_handler.stream_received.connect(self._handle_stream_chunk)
-        self.stream_handler.final_received.connect(self._handle_final_result)
+        self.max_concurrent = max(1, max_concurrent)
+        self._queue = deque()   # 等待执行的TaskView
+        self._running = set()   # 正在执行的TaskView
+        self._closing = set()   # 已请求关闭、等待取消完成的TaskView
+        self._views = {}        # task_id -> TaskView，用于分发追踪span
+        self._task_count = 0
+        tracer.add_listener(self._dispatch_span)
         
         # 连接信号
         self._connect_signals()
@@ -42,7 +49,7 @@ class MainWindow(QMainWindow):
         left_layout = QVBoxLayout(left_panel)
         left_layout.setContentsMargins(5, 5, 5, 5)
         
-        # 右侧面板(日志和结果)
+        # 右侧面板(每个任务一页：日志、追踪和结果)
         right_panel = QWidget()
         right_layout = QVBoxLayout(right_panel)
         right_layout.setContentsMargins(5, 5, 5, 5)
@@ -50,19 +57,17 @@ class MainWindow(QMainWindow):
         # 初始化组件
         from ui.components.task_input import TaskInput
         from ui.components.history_panel import HistoryPanel
-        from ui.components.result_viewer import ResultViewer
         
         self.task_input = TaskInput()
         self.history_panel = HistoryPanel()
-        self.log_panel = LogPanel()  # 替换原来的progress_panel
-        self.result_viewer = ResultViewer()
+        self.task_tabs = QTabWidget()
+        self.task_tabs.setTabsClosable(True)
+        self.task_tabs.setMovable(True)
         
         # 添加到布局
         left_layout.addWidget(self.task_input)
         left_layout.addWidget(self.history_panel)
-        
-        right_layout.addWidget(self.log_panel)
-        right_layout.addWidget(self.result_viewer)
+        right_layout.addWidget(self.task_tabs)
         
         splitter.addWidget(left_panel)
         splitter.addWidget(right_panel)
@@ -70,66 +75,112 @@ class MainWindow(QMainWindow):
         
         main_layout.addWidget(splitter)
         
-        # 状态栏
+        # 状态栏，常驻显示运行和排队的任务数
         self.status_bar = QStatusBar()
         self.setStatusBar(self.status_bar)
+        self.queue_label = QLabel()
+        self.status_bar.addPermanentWidget(self.queue_label)
 
     def _connect_signals(self):
         """连接信号和槽"""
         self.task_input.execute_signal.connect(self.execute_task)
+        self.task_tabs.tabCloseRequested.connect(self._close_tab)
 
     def execute_task(self, task_description: str):
-        """执行任务"""
-        if self.task_thread and self.task_thread.isRunning():
-            self.log_panel.add_log("[WARN] 请等待当前任务完成")
+        """新建任务页并加入队列，有空闲名额时立即执行"""
+        self._task_count += 1
+        view = TaskView(self._task_count, task_description)
+        view.status_changed.connect(self._update_tab)
+        self._views[view.task_id] = view
+        self.task_tabs.addTab(view, view.title)
+        self.task_tabs.setCurrentWidget(view)
+        self.history_panel.add_history(task_description)
+        view.add_log(f"[INFO] 任务已加入队列: {task_description}")
+        self._queue.append(view)
+        self._start_next()
+
+    def _start_next(self):
+        """按提交顺序启动排队的任务，直到占满并发名额"""
+        while self._queue and len(self._running) < self.max_concurrent:
+            view = self._queue.popleft()
+            # 每个任务使用独立的分析器，task_history等状态不会在任务之间串用
+            analyzer = TaskAnalyzer(self.llm_client, stream_handler=view.stream_handler)
+            view.thread = TaskThread(
+                task_func=partial(analyzer.analyze_and_execute, task_id=view.task_id),
+                task_args=(view.task_description,),
+                stream_handler=view.stream_handler
+            )
+            view.thread.log_received.connect(view.add_log)
+            view.thread.task_completed.connect(partial(self._on_task_completed, view))
+            view.thread.task_cancelled.connect(partial(self._on_task_cancelled, view))
+            self._running.add(view)
+            view.add_log(f"[INFO] 开始执行任务: {view.task_description}")
+            view.set_status("running")
+            view.thread.start()
+        self._update_queue_label()
+
+    def _dispatch_span(self, record: dict):
+        """tracer监听者，在工作线程中调用：按trace_id交给对应任务页"""
+        view = self._views.get(record["trace_id"])
+        if view is not None:
+            view.trace_panel.on_span(record)
+
+    def _update_tab(self, view):
+        index = self.task_tabs.indexOf(view)
+        if index >= 0:
+            self.task_tabs.setTabText(index, view.title)
+            self.task_tabs.setTabToolTip(index, view.task_description)
+
+    def _update_queue_label(self):
+        self.queue_label.setText(f"运行中 {len(self._running)} / 排队 {len(self._queue)}")
+
+    def _close_tab(self, index):
+        """关闭任务页：排队中的任务直接移出队列，运行中的任务先取消，结束后再关闭"""
+        view = self.task_tabs.widget(index)
+        if view in self._queue:
+            self._queue.remove(view)
+            view.set_status("cancelled")
+            self._update_queue_label()
+        elif view in self._running:
+            self._closing.add(view)
+            if view.status != "cancelling":
+                view.thread.cancel()
+                view.set_status("cancelling")
+                view.add_log("[INFO] 正在取消任务，将在当前请求结束后停止并关闭该页")
             return
-            
-        # 初始化分析器
-        if not self.analyzer:
-                self.analyzer = TaskAnalyzer(
-                    self.llm_client, 
-                    log_callback=self.log_panel.add_log,
-                    stream_handler=self.stream_handler
-                )
-        
-        # 准备执行
-        self.log_panel.clear_logs()
-        self.log_panel.add_log(f"[INFO] 开始执行任务: {task_description}")
-        self.task_input.setEnabled(False)
-        
-        # 创建并启动线程，传递流式处理器
-        self.task_thread = TaskThread(
-            task_func=self.analyzer.analyze_and_execute,
-            task_args=(task_description,),
-            stream_handler=self.stream_handler  # 传递流式处理器
-        )
-        
-        # 连接信号
-        self.task_thread.log_received.connect(self.log_panel.add_log)
-        self.task_thread.task_completed.connect(self._on_task_completed)
-        self.task_thread.start()
-
-    def _handle_stream_chunk(self, chunk):
-        """流式片段只显示在结果视图"""
-        self.result_viewer.append(chunk)
-        # 可选：自动滚动到底部
-        QApplication.processEvents()  # 确保UI及时更新
-    
-    def _handle_final_result(self, result):
-        """最终结果格式化显示"""
-        self.result_viewer.set_result(result)
-        self.log_panel.add_log("[INFO] 生成完成")
-
-    def _on_task_completed(self, result: str):
+        self._remove_view(view)
+
+    def _remove_view(self, view):
+        index = self.task_tabs.indexOf(view)
+        if index >= 0:
+            self.task_tabs.removeTab(index)
+        self._views.pop(view.task_id, None)
+        view.deleteLater()
+
+    def _finish(self, view, status):
+        self._running.discard(view)
+        view.set_status(status)
+        if view in self._closing:
+            # 任务结束（取消完成或恰好先完成）后关闭已请求关闭的页面
+            self._closing.discard(view)
+            self._remove_view(view)
+        self._start_next()
+
+    def _on_task_completed(self, view, result: str):
         """任务完成处理"""
-        self.result_viewer.set_result(result)
-        self.task_input.setEnabled(True)
-        self.status_bar.showMessage("任务完成", 3000)
-        self.task_thread = None
+        if result:
+            view.result_viewer.set_result(result)
+            self._finish(view, "done")
+            self.status_bar.showMessage(f"任务#{view.number}完成", 3000)
+        else:
+            self._on_task_failed(view, "任务执行失败，详见日志")
 
-    def _on_task_failed(self, error_msg: str):
+    def _on_task_failed(self, view, error_msg: str):
         """任务失败处理"""
-        self.result_viewer.set_error(error_msg)
-        self.task_input.setEnabled(True)
-        self.status_bar.showMessage("任务失败", 5000)
-        self.task_thread = None
\ No newline at end of file
+        view.result_viewer.set_error(error_msg)
+        self._finish(view, "failed")
+        self.status_bar.showMessage(f"任务#{view.number}失败", 5000)
+
+    def _on_task_cancelled(self, view):
+        view.add_log("[INFO] 任务已取消")
+        self._finish(view, "cancelled")